@@ -0,0 +1,82 @@
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Optional
+import base64
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    # An empty sort value stands for NULL
+    raw = f"{sort_value.isoformat() if sort_value is not None else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        sort_value, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(sort_value) if sort_value else None, int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(model, fields: Optional[str]):
+    """Columns named in a comma-separated `fields` parameter, or None for all"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    valid = set(model.__table__.columns.keys())
+    unknown = [name for name in names if name not in valid]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+async def paginate(db: AsyncSession, stmt: Select, model, sort_column, response: Response,
+                   cursor: Optional[str], limit: int, fields: Optional[str] = None):
+    """Keyset-paginate `stmt` newest first on (sort_column, id).
+
+    Rows whose sort_column is NULL come where a backward scan of the
+    (sort_column, id) index puts them: first on Postgres, last on SQLite.
+
+    The cursor for the next page is returned in the X-Next-Cursor header so
+    the body stays a plain list. With `fields`, only those columns are loaded
+    and rows are returned as dicts.
+    """
+    columns = parse_fields(model, fields)
+    nulls_first = db.get_bind().dialect.name == "postgresql"
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if sort_value is None:
+            after = [and_(sort_column.is_(None), model.id < row_id)]
+            if nulls_first:
+                after.append(sort_column.isnot(None))
+        else:
+            after = [sort_column < sort_value, and_(sort_column == sort_value, model.id < row_id)]
+            if not nulls_first:
+                after.append(sort_column.is_(None))
+        stmt = stmt.where(or_(*after))
+
+    sort_order = sort_column.desc().nulls_first() if nulls_first else sort_column.desc().nulls_last()
+    stmt = stmt.order_by(sort_order, model.id.desc()).limit(limit + 1)
+
+    if columns is not None:
+        # Always fetch the keys needed to build the next cursor
+        selected = list(dict.fromkeys(columns + ["id", sort_column.key]))
+        rows = (await db.execute(stmt.with_only_columns(*(getattr(model, name) for name in selected)))).all()
+        page = [row._asdict() for row in rows]
+        last = lambda item: (item[sort_column.key], item["id"])
+        items = [{name: item[name] for name in columns} for item in page[:limit]]
+    else:
+        page = (await db.execute(stmt)).scalars().all()
+        last = lambda item: (getattr(item, sort_column.key), item.id)
+        items = page[:limit]
+
+    if len(page) > limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(*last(page[limit - 1]))
+    return items
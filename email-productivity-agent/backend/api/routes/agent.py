@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from backend.database.connection import get_db
-from backend.database.models import Email
+from backend.config import settings
+from backend.database.connection import get_db, get_read_db, AsyncSessionLocal
+from backend.services.chat_memory import chat_memory
+from backend.services.embeddings import embedding_index
 from backend.services.llm_service import llm_service
+from backend.services.retrieval import email_retriever
+from backend.api.sse import sse_event, sse_response
 from pydantic import BaseModel
+from typing import Optional
+import asyncio
+import uuid
 
 
 router = APIRouter()
@@ -12,30 +20,17 @@ router = APIRouter()
 class ChatRequest(BaseModel):
     query: str
     email_id: int = None
+    session_id: Optional[str] = None  # continues that conversation; a new one starts if omitted
 
 
-@router.post("/chat")
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
-    # Get all emails for context
-    emails = db.query(Email).all()
-    
-    # Build context with email data
-    email_context = "YOUR EMAILS:\n"
-    for i, email in enumerate(emails, 1):
-        email_context += f"\n[Email {i}]\n"
-        email_context += f"From: {email.sender}\n"
-        email_context += f"Subject: {email.subject}\n"
-        email_context += f"Body: {email.body}\n"
-        email_context += f"Priority: {email.priority}\n"
+def _build_chat_prompt(db: Session, request: ChatRequest) -> str:
+    # Only the emails relevant to the query, within the context token budget
+    email_context = email_retriever.build_context(db, request.query, focus_email_id=request.email_id)
     
-    # If specific email_id is provided, add more detail
-    if request.email_id:
-        specific_email = db.query(Email).filter(Email.id == request.email_id).first()
-        if specific_email:
-            email_context += f"\n[FOCUSED EMAIL]\n"
-            email_context += f"From: {specific_email.sender}\n"
-            email_context += f"Subject: {specific_email.subject}\n"
-            email_context += f"Body: {specific_email.body}\n"
+    # Earlier turns of this session: a rolling summary plus the latest messages
+    history = chat_memory.context(db, request.session_id)
+    if history:
+        email_context += f"\n\n{history}"
     
     # Combine with strict instructions for direct responses
     full_prompt = f"""{email_context}
@@ -50,6 +45,64 @@ Body: [message]
 
 For summaries or questions, answer directly without introductory phrases. Start with the actual content immediately."""
     
+    return full_prompt
+
+
+@router.post("/chat")
+async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
+    request.session_id = request.session_id or uuid.uuid4().hex
+    if settings.EMBEDDING_ENABLED:
+        # Semantic retrieval only reads the index; embed anything new off the event loop
+        await asyncio.to_thread(embedding_index.sync)
+    full_prompt = await db.run_sync(_build_chat_prompt, request)
+    
     # Generate response
-    response = await llm_service.generate(full_prompt)
-    return {"response": response}
+    response = await llm_service.generate(full_prompt, task="chat")
+    await chat_memory.remember(db, request.session_id, request.query, response)
+    return {"response": response, "session_id": request.session_id}
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, db: AsyncSession = Depends(get_read_db)):
+    """Stream the chat response as server-sent `token` events, then `done` with the session id"""
+    request.session_id = request.session_id or uuid.uuid4().hex
+    if settings.EMBEDDING_ENABLED:
+        # Semantic retrieval only reads the index; embed anything new off the event loop
+        await asyncio.to_thread(embedding_index.sync)
+    full_prompt = await db.run_sync(_build_chat_prompt, request)
+    
+    async def events():
+        chunks = []
+        async for token in llm_service.stream(full_prompt, task="chat"):
+            chunks.append(token)
+            yield sse_event("token", {"text": token})
+        
+        # The request's session is closed once streaming starts
+        async with AsyncSessionLocal() as stream_db:
+            await chat_memory.remember(stream_db, request.session_id, request.query, "".join(chunks))
+        yield sse_event("done", {"session_id": request.session_id})
+    
+    return sse_response(events())
+
+
+@router.get("/sessions/{session_id}")
+async def get_chat_session(
+    session_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """The session's rolling summary and up to `limit` messages not yet folded into it"""
+    summary, _ = await db.run_sync(chat_memory.summary, session_id)
+    messages = await db.run_sync(chat_memory.recent, session_id, limit)
+    return {
+        "session_id": session_id,
+        "summary": summary,
+        "messages": [{"role": m.role, "content": m.content, "timestamp": m.timestamp} for m in messages]
+    }
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_chat_session(session_id: str, db: AsyncSession = Depends(get_db)):
+    """Forget a conversation"""
+    deleted = await db.run_sync(chat_memory.forget, session_id)
+    return {"message": f"Deleted {deleted} messages", "session_id": session_id}
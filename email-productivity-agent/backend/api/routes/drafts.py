@@ -1,13 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend.database.connection import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.config import settings
+from backend.database.connection import get_db, get_read_db, AsyncSessionLocal
 from backend.database.models import Draft, Email
+from backend.services.email_threads import thread_history
+from backend.services.embeddings import embedding_index
+from backend.services.prompt_builder import prompt_builder
+from backend.services.prompt_registry import prompt_registry
+from backend.services.structured_output import DraftReply, JSONStreamParser, parse_model
+from backend.api.sse import sse_event, sse_response
+from backend.api.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
+import asyncio
 
 router = APIRouter()
 
+DRAFT_FORMAT = """Return ONLY a JSON object with the reply's subject and body:
+{"subject": "...", "body": "..."}"""
+
 class DraftCreate(BaseModel):
     email_id: Optional[int] = None
     subject: str
@@ -22,21 +36,33 @@ class DraftUpdate(BaseModel):
     meta_data: Optional[dict] = None
 
 @router.get("/")
-async def get_drafts(db: Session = Depends(get_db)):
-    """Get all drafts"""
-    drafts = db.query(Draft).all()
-    return drafts
+async def get_drafts(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    email_id: Optional[int] = None,
+    recipient: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get drafts, newest first"""
+    stmt = select(Draft)
+    if email_id is not None:
+        stmt = stmt.where(Draft.email_id == email_id)
+    if recipient is not None:
+        stmt = stmt.where(Draft.recipient == recipient)
+    return await paginate(db, stmt, Draft, Draft.created_at, response, cursor, limit, fields)
 
 @router.get("/{draft_id}")
-async def get_draft(draft_id: int, db: Session = Depends(get_db)):
+async def get_draft(draft_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a specific draft"""
-    draft = db.query(Draft).filter(Draft.id == draft_id).first()
+    draft = await db.get(Draft, draft_id)
     if not draft:
         raise HTTPException(status_code=404, detail="Draft not found")
     return draft
 
 @router.post("/")
-async def create_draft(draft_data: DraftCreate, db: Session = Depends(get_db)):
+async def create_draft(draft_data: DraftCreate, db: AsyncSession = Depends(get_db)):
     """Create a new draft"""
     new_draft = Draft(
         email_id=draft_data.email_id,
@@ -48,14 +74,14 @@ async def create_draft(draft_data: DraftCreate, db: Session = Depends(get_db)):
         updated_at=datetime.utcnow()
     )
     db.add(new_draft)
-    db.commit()
-    db.refresh(new_draft)
+    await db.commit()
+    await db.refresh(new_draft)
     return new_draft
 
 @router.put("/{draft_id}")
-async def update_draft(draft_id: int, draft_data: DraftUpdate, db: Session = Depends(get_db)):
+async def update_draft(draft_id: int, draft_data: DraftUpdate, db: AsyncSession = Depends(get_db)):
     """Update an existing draft"""
-    draft = db.query(Draft).filter(Draft.id == draft_id).first()
+    draft = await db.get(Draft, draft_id)
     if not draft:
         raise HTTPException(status_code=404, detail="Draft not found")
     
@@ -69,79 +95,100 @@ async def update_draft(draft_id: int, draft_data: DraftUpdate, db: Session = Dep
         draft.meta_data = draft_data.meta_data
     
     draft.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(draft)
+    await db.commit()
+    await db.refresh(draft)
     return draft
 
 @router.delete("/{draft_id}")
-async def delete_draft(draft_id: int, db: Session = Depends(get_db)):
+async def delete_draft(draft_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a draft"""
-    draft = db.query(Draft).filter(Draft.id == draft_id).first()
+    draft = await db.get(Draft, draft_id)
     if not draft:
         raise HTTPException(status_code=404, detail="Draft not found")
     
-    db.delete(draft)
-    db.commit()
+    await db.delete(draft)
+    await db.commit()
     return {"message": "Draft deleted successfully"}
 
-@router.post("/generate")
-async def generate_draft(
-    email_id: int,
-    instruction: Optional[str] = "Write a professional reply",
-    db: Session = Depends(get_db)
-):
-    """Generate a draft reply for an email using AI"""
-    from backend.services.llm_service import llm_service
-    from backend.database.models import Prompt
-    
-    # Get the email
-    email = db.query(Email).filter(Email.id == email_id).first()
-    if not email:
-        raise HTTPException(status_code=404, detail="Email not found")
+def _thread_context(history) -> str:
+    """Earlier messages of the thread, oldest first, for the draft prompt"""
+    if not history:
+        return ""
+    messages = "\n\n".join(
+        f"[{message.timestamp:%Y-%m-%d %H:%M}] From: {message.sender}\n{prompt_builder.body(message, 'thread')}"
+        for message in history
+    )
+    return f"""Earlier in this conversation:
+{messages}
+
+"""
+
+def _related_context(related) -> str:
+    """Similar emails from other conversations, so replies stay consistent"""
+    if not related:
+        return ""
+    messages = "\n\n".join(
+        f"From: {message.sender}\nSubject: {message.subject}\n{prompt_builder.body(message, 'related')}"
+        for message, _ in related
+    )
+    return f"""Related emails from other conversations:
+{messages}
+
+"""
+
+async def _build_draft_prompt(email: Email, instruction: str, db: AsyncSession) -> str:
+    # Get auto-reply prompt (cached; only queries after a prompt change)
+    auto_reply_prompt = await db.run_sync(prompt_registry.active, "auto_reply")
     
-    # Get auto-reply prompt
-    auto_reply_prompt = db.query(Prompt).filter(
-        Prompt.type == "auto_reply",
-        Prompt.is_active == True
-    ).first()
+    # The thread's earlier messages replace the quoted history in the body
+    context = _thread_context(await db.run_sync(thread_history, email))
+    if settings.EMBEDDING_ENABLED and settings.DRAFT_SIMILAR_EMAILS:
+        await asyncio.to_thread(embedding_index.sync)
+        related = await db.run_sync(embedding_index.similar, email, settings.DRAFT_SIMILAR_EMAILS, None, True)
+        context = _related_context(related) + context
+    body = prompt_builder.body(email, "draft")
     
     # Construct the prompt
+    if auto_reply_prompt and auto_reply_prompt.fields:
+        return f"""{context}{auto_reply_prompt.render(email, body=body)}
+
+User Instruction: {instruction}
+
+{DRAFT_FORMAT}"""
+    
     if auto_reply_prompt:
-        prompt = f"""{auto_reply_prompt.content}
+        return f"""{auto_reply_prompt.content}
 
-Original Email:
+{context}Original Email:
 From: {email.sender}
 Subject: {email.subject}
-Body: {email.body}
+Body: {body}
 
 User Instruction: {instruction}
 
-Generate a draft reply with Subject and Body. Format:
-Subject: [your subject]
-Body: [your message]"""
-    else:
-        prompt = f"""Write a professional reply to this email:
+{DRAFT_FORMAT}"""
+    
+    return f"""{context}Write a professional reply to this email:
 
 From: {email.sender}
 Subject: {email.subject}
-Body: {email.body}
+Body: {body}
 
 User Instruction: {instruction}
 
-Format:
-Subject: [your subject]
-Body: [your message]"""
-    
-    # Generate draft using LLM
-    response = await llm_service.generate(prompt)
-    
-    # Parse response to extract subject and body
-    lines = response.strip().split('\n')
+{DRAFT_FORMAT}"""
+
+async def _save_generated_draft(email: Email, response: str, instruction: str, db: AsyncSession) -> Draft:
+    """Parse an LLM reply into subject/body and store it as a draft"""
     subject = "Re: " + email.subject
     body = response
     
-    # Try to extract subject and body if formatted correctly
-    if "Subject:" in response:
+    reply = parse_model(DraftReply, response)
+    if reply is not None:
+        subject = reply.subject.strip() or subject
+        body = reply.body.strip()
+    elif "Subject:" in response:
+        # Plain "Subject: ... Body: ..." replies from providers that ignored JSON mode
         parts = response.split("Body:", 1)
         if len(parts) == 2:
             subject = parts[0].replace("Subject:", "").strip()
@@ -149,7 +196,7 @@ Body: [your message]"""
     
     # Create draft
     draft = Draft(
-        email_id=email_id,
+        email_id=email.id,
         subject=subject,
         body=body,
         recipient=email.sender,
@@ -158,7 +205,70 @@ Body: [your message]"""
         updated_at=datetime.utcnow()
     )
     db.add(draft)
-    db.commit()
-    db.refresh(draft)
-    
+    await db.commit()
+    await db.refresh(draft)
     return draft
+
+@router.post("/generate")
+async def generate_draft(
+    email_id: int,
+    instruction: Optional[str] = "Write a professional reply",
+    use_cache: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Generate a draft reply for an email using AI.
+    
+    Each call writes a fresh draft; use_cache=true returns the cached reply
+    to an identical prompt instead.
+    """
+    from backend.services.llm_service import llm_service
+    
+    # Get the email
+    email = await db.get(Email, email_id)
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    
+    prompt = await _build_draft_prompt(email, instruction, db)
+    
+    # Generate draft using LLM
+    response = await llm_service.generate(prompt, use_cache=use_cache, task="draft", json_mode=True)
+    
+    return await _save_generated_draft(email, response, instruction, db)
+
+@router.post("/generate/stream")
+async def generate_draft_stream(
+    email_id: int,
+    instruction: Optional[str] = "Write a professional reply",
+    use_cache: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream a generated draft as `token` events; `done` carries the saved draft.
+    
+    Tokens carry decoded text of the reply's `subject` and `body` fields
+    (named in `field`) as soon as it arrives, not the raw JSON.
+    """
+    from backend.services.llm_service import llm_service
+    
+    email = await db.get(Email, email_id)
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    
+    prompt = await _build_draft_prompt(email, instruction, db)
+    
+    async def events():
+        chunks = []
+        parser = JSONStreamParser()
+        async for token in llm_service.stream(prompt, use_cache=use_cache, task="draft", json_mode=True):
+            chunks.append(token)
+            for field, text in parser.feed(token):
+                yield sse_event("token", {"field": field, "text": text})
+        if not parser.started:
+            # Not JSON at all (e.g. an error message); pass it through as the body
+            yield sse_event("token", {"field": "body", "text": "".join(chunks)})
+        
+        # The request's session is closed once streaming starts
+        async with AsyncSessionLocal() as stream_db:
+            draft = await _save_generated_draft(email, "".join(chunks), instruction, stream_db)
+            yield sse_event("done", {"draft": jsonable_encoder(draft)})
+    
+    return sse_response(events())
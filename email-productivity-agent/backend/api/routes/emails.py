@@ -1,27 +1,139 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from backend.database.connection import get_db
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database.connection import get_db, get_read_db, SessionLocal
 from backend.database.models import Email, ActionItem
-from typing import List
+from backend.api.pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from backend.services.search import search_emails
+from backend.services.embeddings import embedding_index
+from backend.services.ingestion import ingest, detect_format, FORMATS
+from backend.services.job_queue import job_queue
+from backend.services.mail_sync import apply_bodies, fetch_bodies
+from typing import List, Optional
+import asyncio
 
 router = APIRouter()
 
 @router.get("/")
-async def get_emails(db: Session = Depends(get_db)):
-    return db.query(Email).all()
+async def get_emails(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    priority: Optional[str] = None,
+    processed: Optional[bool] = None,
+    sender: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List emails newest first; the next page's cursor is in X-Next-Cursor"""
+    stmt = select(Email)
+    if category is not None:
+        stmt = stmt.where(Email.category == category)
+    if priority is not None:
+        stmt = stmt.where(Email.priority == priority)
+    if processed is not None:
+        stmt = stmt.where(Email.processed == processed)
+    if sender is not None:
+        stmt = stmt.where(Email.sender == sender)
+    return await paginate(db, stmt, Email, Email.timestamp, response, cursor, limit, fields)
+
+@router.post("/ingest")
+async def ingest_emails(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    process: bool = Form(False),
+    db: AsyncSession = Depends(get_db)
+):
+    """Bulk-import an mbox, EML or JSONL file, deduplicating on Message-ID"""
+    fmt = format or detect_format(file.filename or "")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Expected one of: {', '.join(FORMATS)}")
+    
+    def run():
+        ingest_db = SessionLocal()
+        try:
+            return ingest(file.file, fmt, ingest_db)
+        finally:
+            ingest_db.close()
+    
+    # Parsing and inserting is blocking work; keep it off the event loop
+    stats = await asyncio.to_thread(run)
+    
+    if process and stats["inserted"]:
+        job = await db.run_sync(job_queue.enqueue, "process_all")
+        stats["job_id"] = job.id
+    return stats
+
+@router.get("/search")
+async def search(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Full-text search over subject, body and sender, best matches first"""
+    total, results = await db.run_sync(search_emails, q, limit=limit, offset=offset)
+    return {"total": total, "limit": limit, "offset": offset, "results": results}
 
 @router.get("/{email_id}")
-async def get_email(email_id: int, db: Session = Depends(get_db)):
-    return db.query(Email).filter(Email.id == email_id).first()
+async def get_email(email_id: int, db: AsyncSession = Depends(get_db)):
+    email = await db.get(Email, email_id)
+    if email is not None and email.body_fetched is False:
+        bodies = await asyncio.to_thread(fetch_bodies, [(email.source, email.source_uid)])
+        apply_bodies([email], bodies)
+        await db.commit()
+    return email
+
+@router.get("/{email_id}/thread")
+async def get_email_thread(email_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Get every email in this email's thread, oldest first"""
+    email = await db.get(Email, email_id)
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    if email.thread_id is None:
+        return [email]
+    
+    stmt = select(Email).where(Email.thread_id == email.thread_id).order_by(Email.timestamp, Email.id)
+    return (await db.execute(stmt)).scalars().all()
+
+@router.get("/{email_id}/similar")
+async def get_similar_emails(
+    email_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    min_similarity: Optional[float] = Query(None, ge=-1, le=1),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the emails most similar in content to this one, most similar first"""
+    email = await db.get(Email, email_id)
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    
+    # Embed anything new off the event loop first
+    await asyncio.to_thread(embedding_index.sync)
+    similar = await db.run_sync(embedding_index.similar, email, limit, min_similarity)
+    return [{"similarity": round(score, 4), "email": match} for match, score in similar]
 
 @router.get("/{email_id}/actions")
-async def get_email_actions(email_id: int, db: Session = Depends(get_db)):
+async def get_email_actions(email_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get action items for a specific email"""
-    actions = db.query(ActionItem).filter(ActionItem.email_id == email_id).all()
+    actions = (await db.execute(select(ActionItem).where(ActionItem.email_id == email_id))).scalars().all()
     return actions
 
 @router.get("/actions/all")
-async def get_all_actions(db: Session = Depends(get_db)):
-    """Get all action items across all emails"""
-    actions = db.query(ActionItem).all()
-    return actions
+async def get_all_actions(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[str] = None,
+    email_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get action items across all emails, newest first"""
+    stmt = select(ActionItem)
+    if status is not None:
+        stmt = stmt.where(ActionItem.status == status)
+    if email_id is not None:
+        stmt = stmt.where(ActionItem.email_id == email_id)
+    return await paginate(db, stmt, ActionItem, ActionItem.created_at, response, cursor, limit, fields)
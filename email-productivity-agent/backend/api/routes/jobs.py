@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database.connection import get_db, get_read_db, AsyncReadSessionLocal
+from backend.database.models import Job
+from backend.services.job_queue import job_queue, JOB_TYPES, TERMINAL_STATUSES
+from backend.api.sse import sse_event, sse_response
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+
+router = APIRouter()
+
+class JobCreate(BaseModel):
+    type: str = "process_all"
+    email_ids: Optional[List[int]] = None
+
+def _job_progress(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "attempts": job.attempts,
+        "error": job.error,
+        "cancel_requested": job.cancel_requested,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+@router.post("/")
+async def create_job(job_data: JobCreate, db: AsyncSession = Depends(get_db)):
+    """Queue a processing job and return immediately"""
+    if job_data.type not in JOB_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown job type. Expected one of: {', '.join(JOB_TYPES)}")
+    if job_data.type == "process_emails" and not job_data.email_ids:
+        raise HTTPException(status_code=400, detail="process_emails requires email_ids")
+    
+    payload = {"email_ids": sorted(set(job_data.email_ids))} if job_data.email_ids else {}
+    job = await db.run_sync(job_queue.enqueue, job_data.type, payload)
+    return _job_progress(job)
+
+@router.get("/")
+async def get_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Most recent jobs first"""
+    stmt = select(Job)
+    if status is not None:
+        stmt = stmt.where(Job.status == status)
+    jobs = (await db.execute(stmt.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit))).scalars()
+    return [_job_progress(job) for job in jobs]
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_read_db)):
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_progress(job)
+
+@router.get("/{job_id}/events")
+async def stream_job(job_id: int, interval: float = Query(1.0, ge=0.2, le=30), db: AsyncSession = Depends(get_read_db)):
+    """Stream `progress` events whenever the job changes, ending when it finishes"""
+    if not await db.get(Job, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last = None
+        while True:
+            async with AsyncReadSessionLocal() as poll_db:
+                progress = _job_progress(await poll_db.get(Job, job_id))
+            
+            snapshot = (progress["status"], progress["processed"], progress["total"], progress["cancel_requested"])
+            if snapshot != last:
+                yield sse_event("progress", jsonable_encoder(progress))
+                last = snapshot
+            if progress["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(interval)
+    
+    return sse_response(events())
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return _job_progress(await db.run_sync(job_queue.cancel, job))
@@ -1,38 +1,78 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from backend.database.connection import get_db
 from backend.database.models import Email
 from backend.services.email_processor import email_processor
+from backend.services.processing_engine import processing_engine
+from backend.services.llm_cache import llm_cache
+from backend.services.preclassifier import preclassifier
+from backend.services.job_queue import job_queue
+import asyncio
 
 router = APIRouter()
 
 @router.post("/process-all")
-async def process_all_emails(db: Session = Depends(get_db)):
-    """Process all unprocessed emails"""
-    emails = db.query(Email).filter(Email.processed == False).all()
+async def process_all_emails(background: bool = False, db: AsyncSession = Depends(get_db)):
+    """Process all unprocessed emails; with background=true, queue a job instead"""
+    if background:
+        job = await db.run_sync(job_queue.enqueue, "process_all")
+        return {"message": f"Queued processing job {job.id}", "job_id": job.id}
     
-    processed_count = 0
-    for email in emails:
-        await email_processor.process_email(email, db)
-        processed_count += 1
+    emails = (await db.execute(select(Email).where(Email.processed == False))).scalars().all()
+    
+    processed_count = await processing_engine.run(emails, db)
     
     return {
         "message": f"Processed {processed_count} emails",
         "count": processed_count
     }
 
+@router.post("/reprocess-stale")
+async def reprocess_stale_emails(background: bool = False, db: AsyncSession = Depends(get_db)):
+    """Process emails whose content or active prompts changed since their last run"""
+    if background:
+        job = await db.run_sync(job_queue.enqueue, "reprocess_stale")
+        return {"message": f"Queued reprocessing job {job.id}", "job_id": job.id}
+    
+    emails = await db.run_sync(lambda session: email_processor.find_stale(session).all())
+    
+    processed_count = await processing_engine.run(emails, db)
+    
+    return {
+        "message": f"Reprocessed {processed_count} stale emails",
+        "count": processed_count
+    }
+
 @router.post("/process/{email_id}")
-async def process_single_email(email_id: int, db: Session = Depends(get_db)):
+async def process_single_email(email_id: int, db: AsyncSession = Depends(get_db)):
     """Process a single email"""
-    email = db.query(Email).filter(Email.id == email_id).first()
+    email = await db.get(Email, email_id)
     
     if not email:
         return {"error": "Email not found"}
     
-    await email_processor.process_email(email, db)
+    if await email_processor.process_email(email, db) is None:
+        return {"error": "Email body could not be downloaded"}
     
     return {
         "message": "Email processed successfully",
         "email_id": email_id,
         "category": email.category
     }
+
+@router.get("/cache")
+async def get_cache_stats():
+    """LLM response cache hit/miss counters and sizes"""
+    return await asyncio.to_thread(llm_cache.stats)
+
+@router.delete("/cache")
+async def clear_cache():
+    """Drop every cached LLM response"""
+    await asyncio.to_thread(llm_cache.clear)
+    return {"message": "LLM cache cleared"}
+
+@router.get("/preclassifier")
+async def get_preclassifier_stats():
+    """How many categorizations were decided by rules, headers, the local model or the LLM"""
+    return preclassifier.stats
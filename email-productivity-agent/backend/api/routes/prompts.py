@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend.database.connection import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database.connection import get_db, get_read_db
 from backend.database.models import Prompt
+from backend.services.prompt_registry import prompt_registry
 from pydantic import BaseModel
 from typing import Optional
 
@@ -20,19 +22,19 @@ class PromptUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 @router.get("/")
-async def get_prompts(db: Session = Depends(get_db)):
-    prompts = db.query(Prompt).all()
+async def get_prompts(db: AsyncSession = Depends(get_read_db)):
+    prompts = (await db.execute(select(Prompt))).scalars().all()
     return prompts
 
 @router.get("/{prompt_id}")
-async def get_prompt(prompt_id: int, db: Session = Depends(get_db)):
-    prompt = db.query(Prompt).filter(Prompt.id == prompt_id).first()
+async def get_prompt(prompt_id: int, db: AsyncSession = Depends(get_read_db)):
+    prompt = await db.get(Prompt, prompt_id)
     if not prompt:
         raise HTTPException(status_code=404, detail="Prompt not found")
     return prompt
 
 @router.post("/")
-async def create_prompt(prompt_data: PromptCreate, db: Session = Depends(get_db)):
+async def create_prompt(prompt_data: PromptCreate, db: AsyncSession = Depends(get_db)):
     new_prompt = Prompt(
         name=prompt_data.name,
         type=prompt_data.type,
@@ -40,13 +42,14 @@ async def create_prompt(prompt_data: PromptCreate, db: Session = Depends(get_db)
         is_active=prompt_data.is_active
     )
     db.add(new_prompt)
-    db.commit()
-    db.refresh(new_prompt)
+    await db.commit()
+    prompt_registry.invalidate()
+    await db.refresh(new_prompt)
     return new_prompt
 
 @router.put("/{prompt_id}")
-async def update_prompt(prompt_id: int, prompt_data: PromptUpdate, db: Session = Depends(get_db)):
-    prompt = db.query(Prompt).filter(Prompt.id == prompt_id).first()
+async def update_prompt(prompt_id: int, prompt_data: PromptUpdate, db: AsyncSession = Depends(get_db)):
+    prompt = await db.get(Prompt, prompt_id)
     if not prompt:
         raise HTTPException(status_code=404, detail="Prompt not found")
     
@@ -59,16 +62,22 @@ async def update_prompt(prompt_id: int, prompt_data: PromptUpdate, db: Session =
     if prompt_data.is_active is not None:
         prompt.is_active = prompt_data.is_active
     
-    db.commit()
-    db.refresh(prompt)
+    # Any change that affects processing output invalidates processed emails
+    if any(v is not None for v in (prompt_data.type, prompt_data.content, prompt_data.is_active)):
+        prompt.version = (prompt.version or 1) + 1
+    
+    await db.commit()
+    prompt_registry.invalidate()
+    await db.refresh(prompt)
     return prompt
 
 @router.delete("/{prompt_id}")
-async def delete_prompt(prompt_id: int, db: Session = Depends(get_db)):
-    prompt = db.query(Prompt).filter(Prompt.id == prompt_id).first()
+async def delete_prompt(prompt_id: int, db: AsyncSession = Depends(get_db)):
+    prompt = await db.get(Prompt, prompt_id)
     if not prompt:
         raise HTTPException(status_code=404, detail="Prompt not found")
     
-    db.delete(prompt)
-    db.commit()
+    await db.delete(prompt)
+    await db.commit()
+    prompt_registry.invalidate()
     return {"message": "Prompt deleted successfully"}
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database.connection import get_db, get_read_db, SessionLocal
+from backend.database.models import SyncState
+from backend.services.mail_sync import sync_imap, sync_maildir
+from backend.services.job_queue import job_queue
+from typing import Optional
+import asyncio
+
+router = APIRouter()
+
+async def _run_sync(sync, *args):
+    def run():
+        sync_db = SessionLocal()
+        try:
+            return sync(sync_db, *args)
+        finally:
+            sync_db.close()
+    
+    try:
+        # imaplib and file IO block; keep them off the event loop
+        return await asyncio.to_thread(run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/maildir")
+async def sync_maildir_source(path: Optional[str] = None, process: bool = False, db: AsyncSession = Depends(get_db)):
+    """Import new messages from MAILDIR_PATH, or a folder inside it given by `path`"""
+    stats = await _run_sync(sync_maildir, path)
+    if process and stats["inserted"]:
+        job = await db.run_sync(job_queue.enqueue, "process_all")
+        stats["job_id"] = job.id
+    return stats
+
+@router.post("/imap")
+async def sync_imap_source(process: bool = False, db: AsyncSession = Depends(get_db)):
+    """Import messages above the stored UID watermark from the configured IMAP mailbox"""
+    stats = await _run_sync(sync_imap)
+    if process and stats["inserted"]:
+        job = await db.run_sync(job_queue.enqueue, "process_all")
+        stats["job_id"] = job.id
+    return stats
+
+@router.get("/state")
+async def get_sync_state(db: AsyncSession = Depends(get_read_db)):
+    return (await db.execute(select(SyncState))).scalars().all()
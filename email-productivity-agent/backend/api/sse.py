@@ -0,0 +1,19 @@
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator
+import json
+
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event; data is JSON-encoded so newlines are safe"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # stop nginx from buffering the stream
+        }
+    )
@@ -1,19 +1,50 @@
 from pydantic_settings import BaseSettings
 from typing import Optional
-import os
-
-# Force override any system environment variable
-os.environ['LLM_PROVIDER'] = 'groq'
 
 class Settings(BaseSettings):
     GROQ_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
     OPENAI_API_KEY: Optional[str] = None
+    # Override to point a provider at a proxy or a local fake server
+    GROQ_BASE_URL: Optional[str] = None
+    OPENAI_BASE_URL: Optional[str] = None
+    ANTHROPIC_BASE_URL: Optional[str] = None
     
+    # Used for tasks without an entry in LLM_ROUTES
     LLM_PROVIDER: str = "groq"
     LLM_MODEL: str = "llama-3.3-70b-versatile"
+    # Candidates per task in order of preference; providers without an API key are skipped
+    LLM_ROUTES: dict = {
+        "categorization": ["groq:llama-3.1-8b-instant", "openai:gpt-4o-mini", "anthropic:claude-3-5-haiku-latest"],
+        "extraction": ["groq:llama-3.1-8b-instant", "openai:gpt-4o-mini", "anthropic:claude-3-5-haiku-latest"],
+        "analysis": ["groq:llama-3.1-8b-instant", "openai:gpt-4o-mini", "anthropic:claude-3-5-haiku-latest"],
+        "summary": ["groq:llama-3.1-8b-instant", "openai:gpt-4o-mini", "anthropic:claude-3-5-haiku-latest"],
+        "draft": ["groq:llama-3.3-70b-versatile", "anthropic:claude-3-5-sonnet-latest", "openai:gpt-4o"],
+        "chat": ["groq:llama-3.3-70b-versatile", "anthropic:claude-3-5-sonnet-latest", "openai:gpt-4o"],
+    }
+    LLM_MAX_RETRIES: int = 1  # SDK retries per provider before falling back to the next
+    # Hedging: re-send a request to the next candidate once it runs past this latency percentile
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_LATENCY_WINDOW: int = 200  # recent latencies kept per model
+    LLM_TIMEOUT: float = 60.0
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
     
     DATABASE_URL: str = "sqlite:///./data/emails.db"
+    # "tuned" = WAL + synchronous=NORMAL + mmap/cache sizing; "default" = stock SQLite
+    SQLITE_PROFILE: str = "tuned"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # bytes
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    # Pools are per process: each uvicorn/gunicorn worker opens its own, so keep
+    # workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the server's max_connections
+    DB_POOL_SIZE: int = 5
+    DB_READ_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800  # seconds; drop connections before server-side idle timeouts
+    SEED_SAMPLE_EMAILS: bool = True  # add the demo emails when the mailbox is empty
     CORS_ORIGINS: list = [
         "http://localhost:5173",
         "http://localhost:8080",  # Add this line!
@@ -23,6 +54,123 @@ class Settings(BaseSettings):
     ]
     DEBUG: bool = True
 
+    # Processing engine
+    PROCESSING_CONCURRENCY: int = 8  # emails analyzed in parallel
+    PROCESSING_COMMIT_BATCH_SIZE: int = 25
+    # One JSON-mode request per email for category, priority and action items when both prompts are active
+    STRUCTURED_ANALYSIS_ENABLED: bool = True
+    # Emails per categorization request when categorizing on its own; 1 disables batching
+    CATEGORIZATION_BATCH_SIZE: int = 20
+    CATEGORIZATION_BATCH_TOKEN_BUDGET: int = 6000  # estimated prompt tokens per batch
+    # Rule-based pre-classification; categories are checked in this order
+    PRECLASSIFIER_ENABLED: bool = True
+    PRECLASSIFIER_RULES: dict = {
+        "Spam": {
+            "keywords": ["you've won", "claim your prize", "claim now", "free iphone", "90% off"]
+        },
+        "Newsletter": {
+            # Not noreply addresses: banks and services send security alerts from them
+            "senders": ["newsletter", "digest"],
+            "keywords": ["view in browser", "view this email in your browser", "weekly digest"]
+        },
+    }
+    PRECLASSIFIER_MODEL_ENABLED: bool = False  # naive Bayes trained on categorized emails
+    PRECLASSIFIER_MODEL_THRESHOLD: float = 0.95  # posterior needed to skip the LLM
+    PRECLASSIFIER_MIN_TRAINING: int = 200
+    PRECLASSIFIER_MAX_TRAINING: int = 20000
+    PRECLASSIFIER_RETRAIN_INTERVAL: float = 3600.0  # seconds
+    # Near-duplicates of an email already processed with the same prompts reuse its
+    # category, priority and action items instead of calling the LLM
+    NEAR_DUPLICATE_ENABLED: bool = True
+    NEAR_DUPLICATE_MIN_SIMILARITY: float = 0.8  # Jaccard similarity of normalized word sets
+    NEAR_DUPLICATE_MIN_WORDS: int = 20  # shorter emails are always analyzed
+    NEAR_DUPLICATE_MAX_CANDIDATES: int = 50  # most recent LSH matches compared per lookup
+    PROMPT_CACHE_TTL: float = 30.0  # seconds; bounds how long other workers serve an edited prompt
+    LLM_RATE_LIMITS: dict = {  # requests per minute, per provider
+        "groq": 30,
+        "openai": 500,
+        "anthropic": 50
+    }
+
+    # Background jobs
+    JOB_WORKERS: int = 2
+    JOB_CHUNK_SIZE: int = 50  # emails processed (and progress saved) per step
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_DELAY: float = 30.0  # seconds, doubled on each retry
+    JOB_POLL_INTERVAL: float = 2.0  # seconds between queue checks when idle
+    JOB_LEASE_SECONDS: float = 900.0  # a running job not updated for this long is presumed dead; keep above one chunk's run time
+
+    # Threading
+    THREAD_SUBJECT_WINDOW_DAYS: int = 30  # replies without references join a same-subject thread this recent
+    THREAD_ASSIGN_BATCH_SIZE: int = 1000
+    THREAD_CONTEXT_MESSAGES: int = 5  # earlier messages shown when drafting a reply
+    # Emails of one thread analyzed in a single request, with quoted history removed
+    THREAD_PROCESSING_ENABLED: bool = True
+    THREAD_BATCH_SIZE: int = 10
+
+    # Ingestion
+    INGEST_BATCH_SIZE: int = 1000  # rows per executemany/transaction
+
+    # Mail sync
+    MAILDIR_PATH: Optional[str] = None
+    IMAP_HOST: Optional[str] = None
+    IMAP_PORT: int = 993
+    IMAP_SSL: bool = True
+    IMAP_USER: Optional[str] = None
+    IMAP_PASSWORD: Optional[str] = None
+    IMAP_MAILBOX: str = "INBOX"
+    IMAP_POOL_SIZE: int = 4
+    SYNC_FETCH_BATCH: int = 500  # messages per header FETCH / insert transaction
+    SYNC_LAZY_BODIES: bool = True  # import headers only; download bodies when first needed
+
+    # Prompt assembly: email bodies are cleaned and cut to a token budget per task
+    PROMPT_BUDGET_ENABLED: bool = True
+    PROMPT_BODY_BUDGETS: dict = {
+        "categorization": 400,
+        "extraction": 1500,
+        "analysis": 1500,
+        "thread": 600,  # per email in a thread request or thread context
+        "draft": 1500,
+        "chat": 800,  # per retrieved email; CHAT_CONTEXT_TOKEN_BUDGET caps the total
+        "chat_focus": 2000,
+        "chat_turn": 300,  # per remembered chat message
+        "embedding": 512,  # text embedded per email
+        "related": 200,  # per similar email shown when drafting
+        "default": 1500,
+    }
+    PROMPT_HEAD_FRACTION: float = 0.7  # share of a truncated body kept from the start
+    PROMPT_TOKENIZER_ENCODING: str = "cl100k_base"  # used when tiktoken is installed
+    PROMPT_BUILDER_CACHE_SIZE: int = 2048
+
+    # Chat retrieval
+    CHAT_RETRIEVAL_TOP_K: int = 10
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 4000
+
+    # Embeddings: similar-email search and semantic retrieval for chat and drafts
+    EMBEDDING_ENABLED: bool = True
+    # sentence-transformers model run on CPU, e.g. "all-MiniLM-L6-v2"; hashed term vectors when unset
+    EMBEDDING_MODEL: Optional[str] = None
+    EMBEDDING_DIM: int = 512  # size of hashed term vectors
+    EMBEDDING_INDEX_PATH: str = "./data/embeddings"  # directory of the memory-mapped vector matrix
+    EMBEDDING_BATCH_SIZE: int = 256  # emails embedded per batch
+    EMBEDDING_SEARCH_CHUNK: int = 65536  # matrix rows scored at a time
+    EMBEDDING_MIN_SIMILARITY: float = 0.2  # cosine similarity below which emails are not "similar"
+    DRAFT_SIMILAR_EMAILS: int = 2  # related emails from other threads shown when drafting; 0 disables
+
+    # Chat memory
+    CHAT_HISTORY_WINDOW: int = 6  # most recent messages kept verbatim in the prompt
+    CHAT_SUMMARY_TRIGGER: int = 4  # extra messages allowed before the oldest are summarized
+    CHAT_SUMMARY_MAX_TURNS: int = 40  # messages folded into the summary per pass
+    CHAT_SUMMARY_MAX_TOKENS: int = 400
+    CHAT_SUMMARY_CACHE_SIZE: int = 1000  # sessions whose summary is kept in memory
+
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "./data/llm_cache.db"  # empty string disables the SQLite tier
+    LLM_CACHE_MEMORY_SIZE: int = 1000
+    LLM_CACHE_DISK_SIZE: int = 100000
+    LLM_CACHE_TTL: float = 7 * 24 * 3600  # seconds
+
     class Config:
         env_file = ".env"
 
@@ -1,20 +1,96 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from backend.config import settings
 from pathlib import Path
 
 Path("data").mkdir(exist_ok=True)
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+
+SQLITE_PROFILES = ("default", "tuned")
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _apply_sqlite_profile(engine, profile: str, read_only: bool):
+    """Set per-connection pragmas for a SQLite profile"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE: {profile}")
+    tuned = profile == "tuned"
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {settings.SQLITE_BUSY_TIMEOUT_MS}")
+        if tuned:
+            # WAL lets readers proceed while a writer commits
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.execute(f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size = -{settings.SQLITE_CACHE_SIZE_KB}")
+            cursor.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+def create_db_engine(url: str, read_only: bool = False, profile: str = None, is_async: bool = False):
+    """Engine for `url`; SQLite engines get the SQLITE_PROFILE pragmas.
+
+    With is_async, the URL is switched to the asyncio driver for its backend
+    and an AsyncEngine is returned.
+    """
+    url = make_url(url)
+    if is_async:
+        url = url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    factory = create_async_engine if is_async else create_engine
+
+    if url.get_backend_name() != "sqlite":
+        return factory(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=settings.DB_POOL_RECYCLE
+        )
+
+    engine = factory(
+        url,
+        connect_args={"check_same_thread": False},
+        # aiosqlite would otherwise default to NullPool, reconnecting per checkout
+        poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+        pool_size=settings.DB_READ_POOL_SIZE if read_only else settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW
+    )
+    _apply_sqlite_profile(engine.sync_engine if is_async else engine, profile or settings.SQLITE_PROFILE, read_only)
+    return engine
+
+
+_is_sqlite = make_url(settings.DATABASE_URL).get_backend_name() == "sqlite"
+
+# Sync engines serve the job workers, processing engine, ingestion and sync
+engine = create_db_engine(settings.DATABASE_URL)
+# Reads get their own pool so they never queue behind writers for a connection
+read_engine = create_db_engine(settings.DATABASE_URL, read_only=True) if _is_sqlite else engine
+
+# Async engines serve the API routes, so queries don't block the event loop
+async_engine = create_db_engine(settings.DATABASE_URL, is_async=True)
+async_read_engine = create_db_engine(settings.DATABASE_URL, read_only=True, is_async=True) if _is_sqlite else async_engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# expire_on_commit=False: an expired attribute would need lazy IO on access,
+# which AsyncSession can't do implicitly
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_read_db():
+    """Session for handlers that only read"""
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,5 +1,8 @@
+from backend.config import settings
 from backend.database.connection import engine, SessionLocal
 from backend.database.models import Base, Email, Prompt
+from backend.database.migrations import run_migrations, schema_lock
+from backend.services.email_threads import assign_threads
 from datetime import datetime, timedelta
 
 SAMPLE_EMAILS = [
@@ -176,22 +179,40 @@ DEFAULT_PROMPTS = [
     }
 ]
 
+def init_schema():
+    """Create missing tables and apply pending migrations"""
+    with schema_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+
 def init_database():
     print("Creating database...")
-    Base.metadata.create_all(bind=engine)
+    init_schema()
     
+    # Under the lock so workers booting together don't both seed
+    with schema_lock(engine):
+        seed_database()
+        thread_emails()
+
+def thread_emails():
+    """Assign threads to emails stored without one, e.g. before threading existed"""
     db = SessionLocal()
     try:
-        # Clear existing data
-        if db.query(Email).count() > 0:
-            print("Clearing existing emails...")
-            db.query(Email).delete()
-        
-        # Add sample emails
-        for email_data in SAMPLE_EMAILS:
-            email = Email(**email_data, timestamp=datetime.utcnow())
-            db.add(email)
-        print(f"Added {len(SAMPLE_EMAILS)} sample emails")
+        count = assign_threads(db)
+        if count:
+            print(f"Threaded {count} emails")
+    finally:
+        db.close()
+
+def seed_database():
+    db = SessionLocal()
+    try:
+        # Sample emails only go into an empty mailbox; existing mail is kept
+        if settings.SEED_SAMPLE_EMAILS and db.query(Email.id).first() is None:
+            for email_data in SAMPLE_EMAILS:
+                email = Email(**email_data, timestamp=datetime.utcnow())
+                db.add(email)
+            print(f"Added {len(SAMPLE_EMAILS)} sample emails")
         
         # Add default prompts if none exist
         if db.query(Prompt).count() == 0:
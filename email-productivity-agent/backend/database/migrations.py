@@ -0,0 +1,178 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from backend.database.models import Base, content_hash
+from contextlib import contextmanager
+from datetime import datetime
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# create_all() builds new tables but never alters existing ones, so columns
+# and indexes added to models.py after a database was created are applied
+# here. Each migration must be a no-op on a freshly created schema.
+
+# Arbitrary key shared by every process that sets up the schema
+SCHEMA_LOCK_KEY = 7_261_803_517
+
+
+@contextmanager
+def schema_lock(engine: Engine):
+    """Serialize schema setup between processes starting at the same time.
+
+    Postgres uses a session-level advisory lock; SQLite an exclusive lock on
+    a file next to the database.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        return
+
+    database = engine.url.database
+    if engine.dialect.name != "sqlite" or fcntl is None or not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if not _has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_indexes(conn: Connection, *names: str):
+    """Create indexes declared in models.py by name, skipping existing ones"""
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+def _001_processing_fingerprints(conn: Connection):
+    _add_column(conn, "emails", "processed_fingerprint", "VARCHAR(200)")
+    _add_column(conn, "prompts", "version", "INTEGER NOT NULL DEFAULT 1")
+
+
+def _002_email_fts(conn: Connection):
+    # Full-text index is SQLite-only; other backends fall back to LIKE search
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5("
+        "subject, body, sender, content='emails', content_rowid='id', tokenize='porter unicode61')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS emails_fts_ai AFTER INSERT ON emails BEGIN "
+        "INSERT INTO emails_fts (rowid, subject, body, sender) VALUES (new.id, new.subject, new.body, new.sender); "
+        "END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS emails_fts_ad AFTER DELETE ON emails BEGIN "
+        "INSERT INTO emails_fts (emails_fts, rowid, subject, body, sender) "
+        "VALUES ('delete', old.id, old.subject, old.body, old.sender); "
+        "END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS emails_fts_au AFTER UPDATE OF subject, body, sender ON emails BEGIN "
+        "INSERT INTO emails_fts (emails_fts, rowid, subject, body, sender) "
+        "VALUES ('delete', old.id, old.subject, old.body, old.sender); "
+        "INSERT INTO emails_fts (rowid, subject, body, sender) VALUES (new.id, new.subject, new.body, new.sender); "
+        "END"
+    ))
+    conn.execute(text("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')"))
+
+
+def _003_lookup_indexes(conn: Connection):
+    _create_indexes(
+        conn,
+        "ix_emails_processed_timestamp",
+        "ix_emails_timestamp_id",
+        "ix_prompts_type_is_active",
+        "ix_action_items_email_id",
+        "ix_action_items_created_at_id",
+        "ix_drafts_email_id",
+        "ix_drafts_created_at_id",
+        "ix_chat_history_session_id_timestamp",
+    )
+
+
+def _004_message_ids(conn: Connection):
+    _add_column(conn, "emails", "message_id", "VARCHAR(500)")
+    _add_column(conn, "emails", "headers", "JSON")
+    _create_indexes(conn, "ux_emails_message_id")
+
+
+def _005_sync_sources(conn: Connection):
+    _add_column(conn, "emails", "source", "VARCHAR(255)")
+    _add_column(conn, "emails", "source_uid", "VARCHAR(255)")
+    _add_column(conn, "emails", "body_fetched", "BOOLEAN DEFAULT TRUE")
+    _create_indexes(conn, "ix_emails_source_uid")
+
+
+def _006_threads(conn: Connection):
+    # The threads table itself comes from create_all; emails are assigned on startup
+    _add_column(conn, "emails", "thread_id", "INTEGER REFERENCES threads(id)")
+    _create_indexes(conn, "ix_emails_thread_id_timestamp")
+
+
+def _007_content_hashes(conn: Connection):
+    _add_column(conn, "emails", "content_hash", "VARCHAR(32)")
+    _create_indexes(conn, "ix_emails_content_hash")
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, sender, subject, body FROM emails WHERE content_hash IS NULL ORDER BY id LIMIT 1000"
+        )).all()
+        if not rows:
+            break
+        conn.execute(
+            text("UPDATE emails SET content_hash = :hash WHERE id = :id"),
+            [{"id": row.id, "hash": content_hash(row.sender, row.subject, row.body)} for row in rows]
+        )
+
+
+MIGRATIONS = [
+    (1, "processing fingerprints", _001_processing_fingerprints),
+    (2, "email full-text index", _002_email_fts),
+    (3, "lookup indexes", _003_lookup_indexes),
+    (4, "email message ids", _004_message_ids),
+    (5, "mail sync sources", _005_sync_sources),
+    (6, "email threads", _006_threads),
+    (7, "email content hashes", _007_content_hashes),
+]
+
+
+def run_migrations(engine: Engine):
+    """Apply pending migrations in order, recording each in schema_migrations.
+
+    Callers running alongside other processes should hold schema_lock().
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+        for version, name, upgrade in MIGRATIONS:
+            if version in applied:
+                continue
+            upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": version, "name": name, "applied_at": datetime.utcnow()}
+            )
+            print(f"Applied migration {version}: {name}")
@@ -1,10 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, Float, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import hashlib
 
 Base = declarative_base()
 
+
+def content_hash(sender: str, subject: str, body: str) -> str:
+    """Hash of the fields processing reads; the first part of processed_fingerprint"""
+    content = "\0".join((sender or "", subject or "", body or ""))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def _content_hash_default(context) -> str:
+    row = context.get_current_parameters()
+    return content_hash(row.get("sender"), row.get("subject"), row.get("body"))
+
+
 class Email(Base):
     __tablename__ = "emails"
     id = Column(Integer, primary_key=True)
@@ -16,10 +29,42 @@ class Email(Base):
     category = Column(String(100))
     priority = Column(String(50), default="medium")
     processed = Column(Boolean, default=False)
+    processed_fingerprint = Column(String(200))  # "<content hash>:<prompt versions>" at last processing
+    content_hash = Column(String(32), default=_content_hash_default)  # current content hash, updated with the body
+    message_id = Column(String(500))  # RFC 5322 Message-ID, used to deduplicate imports
+    headers = Column(JSON)  # selected original headers (List-Unsubscribe, In-Reply-To, References, ...)
+    source = Column(String(255))  # mailbox the email was synced from, e.g. "imap:user@host/INBOX"
+    source_uid = Column(String(255))  # IMAP UID or Maildir key within `source`
+    body_fetched = Column(Boolean, default=True)  # False until a lazily synced body is downloaded
+    thread_id = Column(Integer, ForeignKey("threads.id"))  # conversation, assigned by services/email_threads.py
     created_at = Column(DateTime, default=datetime.utcnow)
     
     action_items = relationship("ActionItem", back_populates="email", cascade="all, delete-orphan")
     drafts = relationship("Draft", back_populates="email", cascade="all, delete-orphan")
+    minhash_bands = relationship("MinHashBand", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_emails_processed_timestamp", "processed", "timestamp"),
+        Index("ix_emails_timestamp_id", "timestamp", "id"),
+        Index("ux_emails_message_id", "message_id", unique=True),
+        Index("ix_emails_source_uid", "source", "source_uid"),
+        Index("ix_emails_thread_id_timestamp", "thread_id", "timestamp"),
+        Index("ix_emails_content_hash", "content_hash"),
+    )
+
+class Thread(Base):
+    __tablename__ = "threads"
+    id = Column(Integer, primary_key=True)
+    subject_key = Column(String(500))  # normalized subject, for replies without usable references
+    root_message_id = Column(String(500))  # Message-ID of the conversation's first message, when known
+    message_count = Column(Integer, default=0)
+    last_timestamp = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_threads_subject_key_last_timestamp", "subject_key", "last_timestamp"),
+        Index("ix_threads_root_message_id", "root_message_id"),
+    )
 
 class Prompt(Base):
     __tablename__ = "prompts"
@@ -28,8 +73,13 @@ class Prompt(Base):
     type = Column(String(100), nullable=False)
     content = Column(Text, nullable=False)
     is_active = Column(Boolean, default=True)
+    version = Column(Integer, default=1, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_prompts_type_is_active", "type", "is_active"),
+    )
 
 class ActionItem(Base):
     __tablename__ = "action_items"
@@ -40,6 +90,23 @@ class ActionItem(Base):
     status = Column(String(50), default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
     email = relationship("Email", back_populates="action_items")
+    
+    __table_args__ = (
+        Index("ix_action_items_email_id", "email_id"),
+        Index("ix_action_items_created_at_id", "created_at", "id"),
+    )
+
+class MinHashBand(Base):
+    __tablename__ = "minhash_bands"  # written by services/near_duplicates.py when an email is processed
+    id = Column(Integer, primary_key=True)
+    email_id = Column(Integer, ForeignKey("emails.id"), nullable=False)
+    band = Column(Integer, nullable=False)
+    value = Column(BigInteger, nullable=False)  # hash of the band's rows of the MinHash signature
+    
+    __table_args__ = (
+        Index("ix_minhash_bands_band_value", "band", "value"),
+        Index("ix_minhash_bands_email_id", "email_id"),
+    )
 
 class Draft(Base):
     __tablename__ = "drafts"
@@ -54,6 +121,11 @@ class Draft(Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
     
     email = relationship("Email", back_populates="drafts")
+    
+    __table_args__ = (
+        Index("ix_drafts_email_id", "email_id"),
+        Index("ix_drafts_created_at_id", "created_at", "id"),
+    )
 
 class ChatHistory(Base):
     __tablename__ = "chat_history"
@@ -62,3 +134,39 @@ class ChatHistory(Base):
     role = Column(String(50), nullable=False)
     content = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_chat_history_session_id_timestamp", "session_id", "timestamp"),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed, cancelled
+    payload = Column(JSON)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(Text)
+    cancel_requested = Column(Boolean, default=False)
+    run_after = Column(DateTime)  # retry backoff
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    id = Column(Integer, primary_key=True)
+    source = Column(String(255), nullable=False, unique=True)
+    uidvalidity = Column(Integer)  # IMAP: last_uid is only meaningful for this UIDVALIDITY
+    last_uid = Column(Integer, default=0)
+    last_mtime = Column(Float, default=0.0)  # Maildir: newest file change time already imported
+    message_count = Column(Integer, default=0)
+    last_synced_at = Column(DateTime)
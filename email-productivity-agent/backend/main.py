@@ -2,15 +2,30 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from backend.config import settings
-from backend.database.models import Base
-from backend.database.connection import engine
 from backend.api.routes import emails, prompts, agent, processing
-from backend.api.routes import emails, prompts, agent, processing, drafts
+from backend.api.routes import emails, prompts, agent, processing, drafts, jobs, sync
+from contextlib import asynccontextmanager
 
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from backend.database.init_db import init_database
+    from backend.services.job_queue import job_queue
+    from backend.services.llm_service import llm_service
+    from backend.services.mail_sync import imap_pool
+    try:
+        init_database()
+        print("Database initialized successfully")
+    except Exception as e:
+        print(f"Database init: {e}")
+    
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    await llm_service.aclose()
+    imap_pool.close()
 
-app = FastAPI(title="Email Productivity Agent")
+app = FastAPI(title="Email Productivity Agent", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,12 +33,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(emails.router, prefix="/api/emails", tags=["Emails"])
 app.include_router(prompts.router, prefix="/api/prompts", tags=["Prompts"])
 app.include_router(agent.router, prefix="/api/agent", tags=["Agent"])
 app.include_router(processing.router, prefix="/api/processing", tags=["Processing"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+app.include_router(sync.router, prefix="/api/sync", tags=["Sync"])
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -243,11 +261,3 @@ async def root():
 async def health():
     return {"status": "healthy"}
 app.include_router(drafts.router, prefix="/api/drafts", tags=["Drafts"])
-@app.on_event("startup")
-async def startup_event():
-    from backend.database.init_db import init_database
-    try:
-        init_database()
-        print("Database initialized successfully")
-    except Exception as e:
-        print(f"Database init: {e}")
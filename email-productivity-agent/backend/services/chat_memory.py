@@ -0,0 +1,173 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database.connection import AsyncSessionLocal
+from backend.database.models import ChatHistory
+from backend.services.llm_service import llm_service
+from backend.services.prompt_builder import prompt_builder
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import asyncio
+
+SUMMARY_ROLE = "summary"
+TURN_ROLES = ("user", "assistant")
+
+Summary = Tuple[Optional[str], Optional[datetime]]  # (text, timestamp of the last turn it covers)
+
+
+class ChatMemory:
+    """Per-session chat memory: recent turns verbatim plus a rolling summary.
+
+    Turns are stored in ChatHistory and read back through the
+    (session_id, timestamp) index. Once a session has more than
+    CHAT_HISTORY_WINDOW + CHAT_SUMMARY_TRIGGER unsummarized messages, the
+    oldest are folded into a summary in the background. The summary is
+    stored as a "summary" row timestamped with the last turn it covers, so a
+    prompt holds one summary plus at most a window of recent turns however
+    long the session runs. Summaries are cached per session.
+    """
+
+    def __init__(self):
+        self._summaries: "OrderedDict[str, Summary]" = OrderedDict()
+        self._compacting = set()
+        self._tasks = set()
+
+    def _cache(self, session_id: str, summary: Summary):
+        self._summaries[session_id] = summary
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > settings.CHAT_SUMMARY_CACHE_SIZE:
+            self._summaries.popitem(last=False)
+
+    def summary(self, db: Session, session_id: str, refresh: bool = False) -> Summary:
+        if session_id in self._summaries and not refresh:
+            self._summaries.move_to_end(session_id)
+            return self._summaries[session_id]
+        row = db.query(ChatHistory.content, ChatHistory.timestamp).filter(
+            ChatHistory.session_id == session_id,
+            ChatHistory.role == SUMMARY_ROLE
+        ).order_by(ChatHistory.timestamp.desc()).first()
+        summary = (row.content, row.timestamp) if row else (None, None)
+        self._cache(session_id, summary)
+        return summary
+
+    def _unsummarized(self, db: Session, session_id: str, after: Optional[datetime]):
+        query = db.query(ChatHistory).filter(
+            ChatHistory.session_id == session_id,
+            ChatHistory.role.in_(TURN_ROLES)
+        )
+        if after is not None:
+            query = query.filter(ChatHistory.timestamp > after)
+        return query
+
+    def recent(self, db: Session, session_id: str, limit: Optional[int] = None) -> List[ChatHistory]:
+        """The newest unsummarized turns, oldest first"""
+        _, covered = self.summary(db, session_id)
+        turns = self._unsummarized(db, session_id, covered).order_by(
+            ChatHistory.timestamp.desc(), ChatHistory.id.desc()
+        ).limit(limit or settings.CHAT_HISTORY_WINDOW).all()
+        return turns[::-1]
+
+    def context(self, db: Session, session_id: Optional[str]) -> str:
+        """The conversation so far as prompt text, or "" for a new session"""
+        if not session_id:
+            return ""
+        text, _ = self.summary(db, session_id)
+        turns = self.recent(db, session_id)
+        if not text and not turns:
+            return ""
+        lines = ["CONVERSATION SO FAR:"]
+        if text:
+            lines.append(f"Summary of earlier turns: {text}")
+        budget = prompt_builder.budget("chat_turn")
+        lines += [f"{turn.role.capitalize()}: {prompt_builder.fit(turn.content, budget)}" for turn in turns]
+        return "\n".join(lines)
+
+    def record(self, db: Session, session_id: str, query: str, response: str) -> bool:
+        """Store one exchange; returns whether the session is due for compaction"""
+        now = datetime.utcnow()
+        db.add_all([
+            ChatHistory(session_id=session_id, role="user", content=query, timestamp=now),
+            # Strictly after the question, so ordering by timestamp is stable
+            ChatHistory(session_id=session_id, role="assistant", content=response,
+                        timestamp=now + timedelta(microseconds=1)),
+        ])
+        db.commit()
+        _, covered = self.summary(db, session_id)
+        limit = settings.CHAT_HISTORY_WINDOW + settings.CHAT_SUMMARY_TRIGGER
+        return self._unsummarized(db, session_id, covered).count() > limit
+
+    async def remember(self, db: AsyncSession, session_id: str, query: str, response: str):
+        """Store an exchange and start compaction in the background when due"""
+        if response.startswith("Error"):
+            # Failed completions would only confuse later turns
+            return
+        if await db.run_sync(self.record, session_id, query, response) and session_id not in self._compacting:
+            self._compacting.add(session_id)
+            task = asyncio.ensure_future(self._compact(session_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _compact(self, session_id: str):
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._fold(db, session_id)
+        except Exception as e:
+            print(f"Chat summary failed for session {session_id}: {e}")
+        finally:
+            self._compacting.discard(session_id)
+
+    async def _fold(self, db: AsyncSession, session_id: str):
+        # Another worker may have summarized since this one cached the session
+        text, covered = await db.run_sync(self.summary, session_id, True)
+
+        def oldest(sync_db: Session) -> List[ChatHistory]:
+            query = self._unsummarized(sync_db, session_id, covered)
+            fold = min(query.count() - settings.CHAT_HISTORY_WINDOW, settings.CHAT_SUMMARY_MAX_TURNS)
+            if fold <= 0:
+                return []
+            return query.order_by(ChatHistory.timestamp, ChatHistory.id).limit(fold).all()
+
+        turns = await db.run_sync(oldest)
+        if not turns:
+            return
+
+        budget = prompt_builder.budget("chat_turn")
+        transcript = "\n".join(f"{turn.role.capitalize()}: {prompt_builder.fit(turn.content, budget)}" for turn in turns)
+        prompt = f"""Summarize this conversation between a user and their email assistant so it can be continued later. Keep names, email subjects, decisions, open questions and anything the user asked to remember. Use at most {settings.CHAT_SUMMARY_MAX_TOKENS * 3 // 4} words.
+
+Summary so far: {text or "(none)"}
+
+New turns:
+{transcript}
+
+Return ONLY the updated summary."""
+
+        response = await llm_service.generate(prompt, task="summary")
+        if response.startswith("Error"):
+            print(f"Chat summary failed for session {session_id}: {response}")
+            return
+        summary = (prompt_builder.fit(response.strip(), settings.CHAT_SUMMARY_MAX_TOKENS), turns[-1].timestamp)
+
+        def save(sync_db: Session):
+            # Only the latest summary is ever read
+            sync_db.query(ChatHistory).filter(
+                ChatHistory.session_id == session_id,
+                ChatHistory.role == SUMMARY_ROLE
+            ).delete(synchronize_session=False)
+            sync_db.add(ChatHistory(session_id=session_id, role=SUMMARY_ROLE, content=summary[0], timestamp=summary[1]))
+            sync_db.commit()
+
+        await db.run_sync(save)
+        self._cache(session_id, summary)
+        print(f"Summarized {len(turns)} chat messages for session {session_id}")
+
+    def forget(self, db: Session, session_id: str) -> int:
+        """Delete a session's history and summary; returns the rows removed"""
+        deleted = db.query(ChatHistory).filter(ChatHistory.session_id == session_id).delete(synchronize_session=False)
+        db.commit()
+        self._summaries.pop(session_id, None)
+        return deleted
+
+
+chat_memory = ChatMemory()
@@ -1,34 +1,133 @@
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from backend.database.models import Email, Prompt, ActionItem
+from backend.database.models import Email, ActionItem, content_hash
 from backend.services.llm_service import llm_service
-import json
-import re
+from backend.services.mail_sync import apply_bodies, fetch_bodies
+from backend.services.near_duplicates import near_duplicates
+from backend.services.preclassifier import preclassifier
+from backend.services.prompt_builder import prompt_builder
+from backend.services.prompt_registry import PromptTemplate, prompt_registry
+from backend.services.structured_output import ActionItemList, EmailAnalysis, normalize_category, parse_json, parse_model, validate
+from backend.config import settings
+from typing import Dict, List
+import asyncio
 
 class EmailProcessor:
     
-    async def process_email(self, email: Email, db: Session):
-        """Process a single email: categorize and extract action items"""
-        
-        # Get active prompts
-        categorization_prompt = db.query(Prompt).filter(
-            Prompt.type == "categorization",
-            Prompt.is_active == True
-        ).first()
-        
-        action_prompt = db.query(Prompt).filter(
-            Prompt.type == "action_extraction",
-            Prompt.is_active == True
-        ).first()
-        
-        # Categorize email
-        if categorization_prompt:
-            category = await self._categorize_email(email, categorization_prompt.content)
+    async def process_email(self, email: Email, db: AsyncSession):
+        """Process a single email: categorize and extract action items.
+        
+        Returns None, leaving the email unprocessed, if its lazily synced
+        body can't be downloaded.
+        """
+        if email.body_fetched is False:
+            bodies = await asyncio.to_thread(fetch_bodies, [(email.source, email.source_uid)])
+            apply_bodies([email], bodies)
+            await db.commit()
+            if email.body_fetched is False:
+                print(f"Body of email {email.id} is not available; leaving it unprocessed")
+                return None
+        
+        categorization_prompt, action_prompt = await db.run_sync(self.get_active_prompts)
+        signature = self.prompt_signature(categorization_prompt, action_prompt)
+        
+        results = await db.run_sync(
+            lambda session: self.reuse_results(email, session, categorization_prompt, action_prompt, signature)
+        )
+        if results is None:
+            results = await self.analyze_email(email, categorization_prompt, action_prompt)
+        category, action_items, priority = results
+        await db.run_sync(lambda session: self.apply_results(
+            email, category, action_items, session, self.fingerprint(email, signature), priority,
+            failed=action_prompt is not None and action_items is None
+        ))
+        
+        await db.commit()
+        return email
+    
+    def prompt_signature(self, categorization_prompt, action_prompt) -> str:
+        """Identify the prompt versions a processing run uses"""
+        parts = []
+        for prompt_type, prompt in (("categorization", categorization_prompt), ("action_extraction", action_prompt)):
+            parts.append(f"{prompt_type}={prompt.id}.{prompt.version}" if prompt else f"{prompt_type}=-")
+        return ",".join(parts)
+    
+    def fingerprint(self, email: Email, signature: str) -> str:
+        """Content hash of the email combined with the prompt signature"""
+        return f"{content_hash(email.sender, email.subject, email.body)}:{signature}"
+    
+    def reuse_results(self, email: Email, db: Session, categorization_prompt, action_prompt, signature: str):
+        """(category, action_items, priority) copied from a near-duplicate
+        processed with the same prompts, or None if there is none"""
+        if not settings.NEAR_DUPLICATE_ENABLED or not (categorization_prompt or action_prompt):
+            return None
+        source = near_duplicates.find(db, email, signature)
+        if source is None:
+            return None
+        action_items = [{"task": item.task, "deadline": item.deadline} for item in source.action_items]
+        return (
+            source.category if categorization_prompt else None,
+            action_items if action_prompt else None,
+            source.priority if categorization_prompt and action_prompt else None
+        )
+    
+    def find_stale(self, db: Session):
+        """Query for emails never processed, changed since, or processed with other prompt versions"""
+        categorization_prompt, action_prompt = self.get_active_prompts(db)
+        signature = self.prompt_signature(categorization_prompt, action_prompt)
+        return db.query(Email).filter(or_(
+            Email.processed == False,
+            Email.processed_fingerprint.is_(None),
+            Email.content_hash.is_(None),
+            Email.processed_fingerprint != Email.content_hash + ":" + signature
+        ))
+    
+    def get_active_prompts(self, db: Session):
+        """Return the active (categorization, action_extraction) prompt templates"""
+        return prompt_registry.active_prompts(db)
+    
+    async def analyze_email(self, email: Email, categorization_prompt, action_prompt):
+        """Categorize the email and extract its action items.
+        
+        Returns (category, action_items, priority). Category and action items
+        are None when their prompt is inactive; a failed request leaves the
+        category 'Uncategorized' or the action items None. Priority is only
+        set by the combined analysis, which answers all three in one
+        structured request when both prompts are active. Emails the
+        pre-classifier recognizes are categorized without the LLM.
+        """
+        category = preclassifier.classify(email) if categorization_prompt else None
+        if categorization_prompt and action_prompt and category is None and settings.STRUCTURED_ANALYSIS_ENABLED:
+            analysis = await self._analyze_structured(email, categorization_prompt, action_prompt)
+            if analysis is not None:
+                return analysis.category, [item.model_dump() for item in analysis.action_items], analysis.priority
+        
+        async def none():
+            return None
+        
+        async def categorize():
+            return category or await self._categorize_email(email, categorization_prompt)
+        
+        category, action_items = await asyncio.gather(
+            categorize() if categorization_prompt else none(),
+            self._extract_action_items(email, action_prompt) if action_prompt else none()
+        )
+        return category, action_items, None
+    
+    def apply_results(self, email: Email, category, action_items, db: Session, fingerprint: str = None,
+                      priority: str = None, failed: bool = False):
+        """Stage analysis results on the session without committing.
+        
+        `failed` marks results whose action extraction failed; like a failed
+        categorization they are not offered for near-duplicate reuse.
+        """
+        if category is not None:
             email.category = category
+        if priority is not None:
+            email.priority = priority
         
-        # Extract action items
-        if action_prompt:
-            action_items = await self._extract_action_items(email, action_prompt.content)
-            
+        if action_items is not None:
             # Delete existing action items for this email
             db.query(ActionItem).filter(ActionItem.email_id == email.id).delete()
             
@@ -42,58 +141,198 @@ class EmailProcessor:
                 db.add(action_item)
         
         email.processed = True
-        db.commit()
-        return email
+        email.processed_fingerprint = fingerprint
+        if settings.NEAR_DUPLICATE_ENABLED:
+            # Failed analyses are not worth copying
+            near_duplicates.record(db, email, reusable=not failed and email.category != "Uncategorized")
     
-    async def _categorize_email(self, email: Email, prompt_template: str):
-        """Categorize email using LLM"""
-        prompt = f"""{prompt_template}
+    def _with_email(self, template: PromptTemplate, email: Email, task: str) -> str:
+        """The template filled in with the email, or followed by it if it has no placeholders.
+        
+        The body is cleaned and cut to the task's token budget by prompt_builder.
+        """
+        body = prompt_builder.body(email, task)
+        if template.fields:
+            return template.render(email, body=body)
+        return f"""{template.content}
 
 Email Details:
 Subject: {email.subject}
 From: {email.sender}
-Body: {email.body}
+Body: {body}"""
+    
+    async def _analyze_structured(self, email: Email, categorization_template: PromptTemplate,
+                                  action_template: PromptTemplate):
+        """Category, priority and action items from one JSON-mode request, or None"""
+        prompt = f"""{categorization_template.instructions}
+
+{action_template.instructions}
+
+Email Details:
+Subject: {email.subject}
+From: {email.sender}
+Body: {prompt_builder.body(email, "analysis")}
+
+Return ONLY a JSON object in this form:
+{{"category": "Important" | "Newsletter" | "Spam" | "To-Do", "priority": "high" | "medium" | "low", "action_items": [{{"task": "...", "deadline": "..." or null}}]}}
+Use an empty action_items list if the email asks for nothing."""
+        
+        response = await llm_service.generate(prompt, task="analysis", json_mode=True)
+        analysis = parse_model(EmailAnalysis, response)
+        if analysis is None:
+            print(f"Structured analysis failed for email {email.id}; falling back to separate requests")
+        return analysis
+    
+    async def analyze_thread(self, emails: List[Email], categorization_template: PromptTemplate,
+                             action_template: PromptTemplate):
+        """Analyze several emails of one thread with one JSON-mode request.
+        
+        The emails go in oldest first with their quoted history removed, so
+        each message's text is sent once rather than again in every reply.
+        Returns (category, action_items, priority) per email, in order;
+        emails missing from the response are analyzed on their own.
+        """
+        known = {email.id: preclassifier.classify(email) for email in emails}
+        email_blocks = "\n\n".join(
+            f"[Email id={email.id}]\nDate: {email.timestamp}\nFrom: {email.sender}\nSubject: {email.subject}\n"
+            f"Body: {prompt_builder.body(email, 'thread')}"
+            for email in emails
+        )
+        prompt = f"""{categorization_template.instructions}
+
+{action_template.instructions}
+
+The following emails are one conversation, oldest first, with quoted text removed. Analyze EACH email on its own, using the others only as context.
+
+{email_blocks}
+
+Return ONLY a JSON object mapping every email id to its analysis, e.g.
+{{"12": {{"category": "Important" | "Newsletter" | "Spam" | "To-Do", "priority": "high" | "medium" | "low", "action_items": [{{"task": "...", "deadline": "..." or null}}]}}}}"""
+        
+        analyses = {}
+        response = await llm_service.generate(prompt, task="analysis", json_mode=True)
+        parsed = parse_json(response)
+        if isinstance(parsed, dict):
+            for key, value in parsed.items():
+                analysis = validate(EmailAnalysis, value) if str(key).strip().isdigit() else None
+                if analysis is not None:
+                    analyses[int(key)] = analysis
+        
+        results = {}
+        for email in emails:
+            analysis = analyses.get(email.id)
+            if analysis is not None:
+                items = [item.model_dump() for item in analysis.action_items]
+                results[email.id] = (known[email.id] or analysis.category, items, analysis.priority)
+        
+        missing = [email for email in emails if email.id not in results]
+        if missing:
+            print(f"Thread analysis missed {len(missing)} of {len(emails)} emails; analyzing them separately")
+            fallback = await asyncio.gather(*(
+                self.analyze_email(email, categorization_template, action_template) for email in missing
+            ))
+            results.update({email.id: result for email, result in zip(missing, fallback)})
+        
+        return [results[email.id] for email in emails]
+    
+    async def _categorize_email(self, email: Email, template: PromptTemplate):
+        """Categorize email using LLM"""
+        prompt = f"""{self._with_email(template, email, "categorization")}
 
 Return ONLY the category name (Important, Newsletter, Spam, or To-Do)."""
         
         try:
-            response = await llm_service.generate(prompt)
+            response = await llm_service.generate(prompt, task="categorization")
+            if response.startswith("Error"):
+                print(f"Categorization failed for email {email.id}: {response}")
+                return 'Uncategorized'
             # Extract category from response
             category = response.strip().split('\n')[0].strip()
-            # Validate category
-            valid_categories = ['Important', 'Newsletter', 'Spam', 'To-Do', 'Todo']
-            for cat in valid_categories:
-                if cat.lower() in category.lower():
-                    return cat if cat != 'Todo' else 'To-Do'
-            return 'Important'  # Default
+            return normalize_category(category) or 'Important'  # Default
         except Exception as e:
             print(f"Categorization error: {e}")
             return 'Uncategorized'
     
-    async def _extract_action_items(self, email: Email, prompt_template: str):
-        """Extract action items using LLM"""
-        prompt = f"""{prompt_template}
+    def plan_categorization_batches(self, emails: List[Email], max_size: int = None,
+                                    task: str = "categorization") -> List[List[Email]]:
+        """Split emails into batches bounded by count and prompt tokens"""
+        max_size = max_size or settings.CATEGORIZATION_BATCH_SIZE
+        batches, batch, batch_tokens = [], [], 0
+        for email in emails:
+            tokens = prompt_builder.count(f"{email.subject} {email.sender} {prompt_builder.body(email, task)}") + 20
+            if batch and (len(batch) >= max_size
+                          or batch_tokens + tokens > settings.CATEGORIZATION_BATCH_TOKEN_BUDGET):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(email)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    async def categorize_batch(self, emails: List[Email], template: PromptTemplate) -> Dict[int, str]:
+        """Categorize several emails with one LLM request, keyed by email id.
+        
+        Emails missing or unparseable in the response fall back to one request each.
+        """
+        if len(emails) == 1:
+            return {emails[0].id: await self._categorize_email(emails[0], template)}
+        
+        email_blocks = "\n\n".join(
+            f"[Email id={email.id}]\nSubject: {email.subject}\nFrom: {email.sender}\nBody: {prompt_builder.body(email, 'categorization')}"
+            for email in emails
+        )
+        prompt = f"""{template.instructions}
 
-Email Details:
-Subject: {email.subject}
-From: {email.sender}
-Body: {email.body}
+Categorize EACH of the following emails.
+
+{email_blocks}
 
-Return a JSON array of tasks: [{{"task": "...", "deadline": "..."}}]
-If no tasks, return empty array: []"""
+Return ONLY a JSON object mapping every email id to its category (Important, Newsletter, Spam, or To-Do), e.g. {{"12": "Spam", "15": "To-Do"}}"""
         
+        categories = {}
         try:
-            response = await llm_service.generate(prompt)
-            
-            # Try to extract JSON from response
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                tasks = json.loads(json_match.group())
-                return tasks if isinstance(tasks, list) else []
+            response = await llm_service.generate(prompt, task="categorization", json_mode=True)
+            parsed = parse_json(response)
+            if isinstance(parsed, dict):
+                for key, value in parsed.items():
+                    category = normalize_category(str(value))
+                    if category and str(key).strip().isdigit():
+                        categories[int(key)] = category
+        except Exception as e:
+            print(f"Batch categorization error: {e}")
+        
+        missing = [email for email in emails if email.id not in categories]
+        if missing:
+            results = await asyncio.gather(*(self._categorize_email(email, template) for email in missing))
+            categories.update({email.id: category for email, category in zip(missing, results)})
+        
+        return {email.id: categories[email.id] for email in emails}
+    
+    async def _extract_action_items(self, email: Email, template: PromptTemplate):
+        """Extract action items using LLM; None if the request failed"""
+        prompt = f"""{self._with_email(template, email, "extraction")}
+
+Return ONLY a JSON object of tasks: {{"action_items": [{{"task": "...", "deadline": "..." or null}}]}}
+If no tasks, return: {{"action_items": []}}"""
+        
+        try:
+            response = await llm_service.generate(prompt, task="extraction", json_mode=True)
+            if response.startswith("Error"):
+                print(f"Action extraction failed for email {email.id}: {response}")
+                return None
             
-            return []
+            parsed = parse_json(response)
+            if isinstance(parsed, list):
+                # Older prompts asked for a bare array
+                parsed = {"action_items": parsed}
+            result = validate(ActionItemList, parsed)
+            if result is None:
+                print(f"Action extraction returned no valid JSON for email {email.id}")
+                return []
+            return [item.model_dump() for item in result.action_items]
         except Exception as e:
             print(f"Action extraction error: {e}")
-            return []
+            return None
 
 email_processor = EmailProcessor()
@@ -0,0 +1,204 @@
+from sqlalchemy.orm import Session, load_only
+from backend.config import settings
+from backend.database.models import Email, Thread
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import re
+
+# "Re:", "Fwd:", "AW:", "Re[2]:" and list tags like "[team]", possibly repeated
+REPLY_PREFIX_RE = re.compile(r"^\s*(?:(?:re|fw|fwd|aw|wg|sv|vs|antw|tr|rif)\s*(?:\[\d+\])?\s*:|\[[^\]]{1,40}\])\s*", re.IGNORECASE)
+MESSAGE_ID_RE = re.compile(r"<[^<>\s]+>")
+# Attribution line of a quoted reply, possibly wrapped onto a second line;
+# German and Dutch clients put the sender after the verb ("Am ... schrieb Sam:")
+ATTRIBUTION_RE = re.compile(
+    r"^(?:on|am|le|el|op|il)\b.{0,300}\b(?:wrote|schrieb|a écrit|escribió|schreef|ha scritto)(?:\s[^:]{0,200})?\s*:\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+ORIGINAL_MESSAGE_RE = re.compile(r"^-{2,}\s*original message\s*-{2,}$", re.IGNORECASE)
+OUTLOOK_HEADER_RE = re.compile(r"^(?:from|von|de):\s", re.IGNORECASE)
+OUTLOOK_SENT_RE = re.compile(r"^(?:sent|date|gesendet|envoyé)\s*:\s", re.IGNORECASE)
+
+
+def normalize_subject(subject: Optional[str]) -> str:
+    """Subject without reply/forward prefixes or list tags, lowercased"""
+    subject = subject or ""
+    while True:
+        stripped = REPLY_PREFIX_RE.sub("", subject, count=1)
+        if stripped == subject:
+            break
+        subject = stripped
+    return " ".join(subject.split()).lower()
+
+
+def is_reply_subject(subject: Optional[str]) -> bool:
+    return bool(REPLY_PREFIX_RE.match(subject or ""))
+
+
+def _header(email: Email, name: str) -> str:
+    headers = email.headers or {}
+    if name in headers:
+        return headers[name] or ""
+    name = name.lower()
+    return next((value or "" for key, value in headers.items() if key.lower() == name), "")
+
+
+def references(email: Email) -> List[str]:
+    """Message-IDs of the email's ancestors, nearest parent first"""
+    ids = MESSAGE_ID_RE.findall(_header(email, "In-Reply-To"))
+    ids += reversed(MESSAGE_ID_RE.findall(_header(email, "References")))
+    return list(dict.fromkeys(i for i in ids if i != email.message_id))
+
+
+def _root_id(email: Email) -> Optional[str]:
+    """The conversation's first Message-ID as far as this email knows"""
+    ids = MESSAGE_ID_RE.findall(_header(email, "References")) or MESSAGE_ID_RE.findall(_header(email, "In-Reply-To"))
+    return ids[0] if ids else email.message_id
+
+
+def strip_quoted(body: Optional[str]) -> str:
+    """The new text of a reply: quoted lines and the quoted history below an
+    attribution line ("On ... wrote:") or Outlook header block are dropped.
+
+    Returns the body unchanged if nothing would be left.
+    """
+    body = body or ""
+    lines = body.splitlines()
+    kept = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        following = lines[i + 1].strip() if i + 1 < len(lines) else ""
+        if (ORIGINAL_MESSAGE_RE.match(stripped)
+                or ATTRIBUTION_RE.match(stripped)
+                or (following and ATTRIBUTION_RE.match(f"{stripped} {following}"))
+                or (OUTLOOK_HEADER_RE.match(stripped) and OUTLOOK_SENT_RE.match(following))):
+            break
+        if stripped.startswith(">"):
+            continue
+        kept.append(line)
+    text = "\n".join(kept).strip()
+    return text or body
+
+
+class ThreadAssigner:
+    """Assigns emails to threads for one batch, reusing lookups across the batch.
+
+    An email joins the thread of the nearest ancestor named in In-Reply-To
+    or References. Failing that it joins a thread rooted at its own or an
+    ancestor's Message-ID, which also pulls in parents imported after
+    their replies. Replies without usable references fall back to the most
+    recent thread with the same normalized subject within
+    THREAD_SUBJECT_WINDOW_DAYS.
+    """
+
+    def __init__(self, db: Session, emails: List[Email]):
+        self.db = db
+        self.references = {email.id: references(email) for email in emails}
+        wanted = {ref for refs in self.references.values() for ref in refs}
+        own = {email.message_id for email in emails if email.message_id}
+
+        self.by_message: Dict[str, int] = {}
+        if wanted:
+            self.by_message = dict(db.query(Email.message_id, Email.thread_id).filter(
+                Email.message_id.in_(list(wanted)),
+                Email.thread_id.isnot(None)
+            ))
+        self.threads: Dict[int, Thread] = {}
+        self.by_root: Dict[str, Thread] = {}
+        if wanted | own:
+            for thread in db.query(Thread).filter(Thread.root_message_id.in_(list(wanted | own))):
+                self.threads[thread.id] = thread
+                self.by_root[thread.root_message_id] = thread
+        self.by_subject: Dict[str, Thread] = {}
+
+    def _thread(self, thread_id: int) -> Thread:
+        if thread_id not in self.threads:
+            self.threads[thread_id] = self.db.get(Thread, thread_id)
+        return self.threads[thread_id]
+
+    def _by_subject(self, key: str, timestamp: datetime) -> Optional[Thread]:
+        window = timedelta(days=settings.THREAD_SUBJECT_WINDOW_DAYS)
+        thread = self.by_subject.get(key)
+        if thread is None:
+            thread = self.db.query(Thread).filter(
+                Thread.subject_key == key,
+                Thread.last_timestamp >= timestamp - window
+            ).order_by(Thread.last_timestamp.desc()).first()
+        if thread is not None and thread.last_timestamp and thread.last_timestamp >= timestamp - window:
+            return thread
+        return None
+
+    def assign(self, email: Email):
+        refs = self.references[email.id]
+        key = normalize_subject(email.subject)
+        timestamp = email.timestamp or datetime.utcnow()
+
+        thread = next((self._thread(self.by_message[ref]) for ref in refs if ref in self.by_message), None)
+        if thread is None:
+            thread = next((self.by_root[ref] for ref in [email.message_id, *refs] if ref in self.by_root), None)
+        if thread is None and key and (refs or is_reply_subject(email.subject)):
+            thread = self._by_subject(key, timestamp)
+        if thread is None:
+            thread = Thread(subject_key=key, root_message_id=_root_id(email), message_count=0,
+                            last_timestamp=timestamp)
+            self.db.add(thread)
+            self.db.flush()
+            self.threads[thread.id] = thread
+            if thread.root_message_id:
+                self.by_root[thread.root_message_id] = thread
+
+        email.thread_id = thread.id
+        thread.message_count = (thread.message_count or 0) + 1
+        if thread.last_timestamp is None or timestamp > thread.last_timestamp:
+            thread.last_timestamp = timestamp
+        if email.message_id:
+            self.by_message[email.message_id] = thread.id
+        if key:
+            self.by_subject[key] = thread
+
+
+def _assign(db: Session, emails: List[Email]) -> int:
+    emails = sorted(emails, key=lambda e: (e.timestamp or datetime.min, e.id))
+    assigner = ThreadAssigner(db, emails)
+    for email in emails:
+        assigner.assign(email)
+    db.commit()
+    return len(emails)
+
+
+def assign_threads(db: Session, emails: Optional[List[Email]] = None) -> int:
+    """Thread every unthreaded email in `emails`, or in the database if omitted.
+
+    Returns how many emails were assigned. Commits.
+    """
+    if emails is not None:
+        pending = [email for email in emails if email.thread_id is None]
+        return _assign(db, pending) if pending else 0
+
+    count = 0
+    while True:
+        chunk = db.query(Email).options(load_only(
+            Email.id, Email.subject, Email.message_id, Email.headers, Email.timestamp, Email.thread_id
+        )).filter(Email.thread_id.is_(None)).order_by(Email.timestamp, Email.id).limit(settings.THREAD_ASSIGN_BATCH_SIZE).all()
+        if not chunk:
+            return count
+        count += _assign(db, chunk)
+
+
+def thread_history(db: Session, email: Email, limit: Optional[int] = None) -> List[Email]:
+    """Earlier emails of `email`'s thread, oldest first, at most `limit` of them"""
+    if email.thread_id is None:
+        return []
+    earlier = db.query(Email).filter(
+        Email.thread_id == email.thread_id,
+        Email.id != email.id,
+        Email.timestamp <= email.timestamp
+    ).order_by(Email.timestamp.desc(), Email.id.desc()).limit(limit or settings.THREAD_CONTEXT_MESSAGES).all()
+    return earlier[::-1]
+
+
+def group_by_thread(emails: List[Email]) -> List[List[Email]]:
+    """Emails grouped by thread in first-seen order, each group oldest first"""
+    groups: Dict[object, List[Email]] = {}
+    for email in emails:
+        groups.setdefault(email.thread_id if email.thread_id is not None else ("email", email.id), []).append(email)
+    return [sorted(group, key=lambda e: (e.timestamp or datetime.min, e.id)) for group in groups.values()]
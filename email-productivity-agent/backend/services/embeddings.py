@@ -0,0 +1,289 @@
+from sqlalchemy.orm import Session, load_only
+from backend.config import settings
+from backend.database.connection import SessionLocal
+from backend.database.models import Email
+from backend.services.prompt_builder import prompt_builder
+from backend.services.retrieval import tokenize
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import json
+import math
+import os
+import threading
+import zlib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.i64"
+META_FILE = "meta.json"
+
+
+def email_text(email: Email) -> str:
+    """What gets embedded for an email: sender, subject and cleaned body"""
+    return f"From: {email.sender}\nSubject: {email.subject}\n\n{prompt_builder.body(email, 'embedding')}"
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word pairs with sublinear term frequency.
+
+    Needs no model or fitted vocabulary, so vectors never go stale as the
+    mailbox grows. Rows are L2-normalized, making a dot product the cosine
+    similarity.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            features = Counter(words)
+            features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+            for feature, tf in features.items():
+                h = zlib.crc32(feature.encode())
+                weight = 1 + math.log(tf)
+                vectors[row, h % self.dim] += -weight if h & 0x80000000 else weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """A sentence-transformers model run on CPU"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers/{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+def load_embedder():
+    if settings.EMBEDDING_MODEL:
+        try:
+            return SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+        except Exception as e:
+            print(f"Embedding model {settings.EMBEDDING_MODEL} unavailable ({e.__class__.__name__}: {e}); "
+                  f"using hashed term vectors")
+    return HashingEmbedder(settings.EMBEDDING_DIM)
+
+
+class EmbeddingIndex:
+    """Email embeddings in a memory-mapped float32 matrix with brute-force top-k search.
+
+    Vectors are appended to vectors.f32 and their email ids to ids.i64, so
+    new emails are embedded in batches and added without a rebuild. An
+    email embedded again (when its lazily synced body arrives) gets a new
+    row that supersedes the old one. Search scores the matrix in chunks of
+    EMBEDDING_SEARCH_CHUNK rows with one matrix-vector product each, which
+    stays in milliseconds up to a few hundred thousand emails. Appends take
+    a file lock and every call picks up rows other workers appended. The
+    files are only discarded when the embedder changes.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.EMBEDDING_INDEX_PATH
+        self._embedder = None
+        self._lock = threading.RLock()
+        self._changed: Set[int] = set()  # emails whose text changed since they were embedded
+        self._reset()
+
+    def _reset(self):
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._vectors: Optional[np.ndarray] = None
+        self._live = np.zeros(0, dtype=bool)  # False for superseded rows
+        self._rows: Dict[int, int] = {}  # email id -> its current row
+        self._cursor: Optional[int] = None  # highest email id checked by this process
+        self._loaded = False
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = load_embedder()
+        return self._embedder
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(self._file("index.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Check the stored index was built by the current embedder, else start over"""
+        if self._loaded:
+            return
+        meta = {"embedder": self.embedder.name, "dim": self.embedder.dim}
+        try:
+            with open(self._file(META_FILE)) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = None
+        if stored != meta:
+            if stored is not None:
+                print(f"Embedder changed from {stored.get('embedder')} to {meta['embedder']}; rebuilding the embedding index")
+            for name in (VECTORS_FILE, IDS_FILE):
+                open(self._file(name), "wb").close()
+            with open(self._file(META_FILE), "w") as f:
+                json.dump(meta, f)
+        self._loaded = True
+
+    def _stored_rows(self) -> int:
+        # A crash between the two appends leaves one file longer; the extra tail is ignored
+        return min(
+            os.path.getsize(self._file(IDS_FILE)) // 8,
+            os.path.getsize(self._file(VECTORS_FILE)) // (4 * self.embedder.dim)
+        )
+
+    def _map(self):
+        """Map rows appended since the last call, by this process or another"""
+        n = self._stored_rows()
+        start = len(self._ids)
+        if n == start:
+            return
+        ids = np.fromfile(self._file(IDS_FILE), dtype=np.int64, count=n)
+        self._rows.update(zip(ids[start:].tolist(), range(start, n)))
+        live = np.zeros(n, dtype=bool)
+        live[np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))] = True
+        self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r", shape=(n, self.embedder.dim))
+        self._ids, self._live = ids, live
+
+    def _append(self, ids: List[int], vectors: np.ndarray):
+        n = len(self._ids)
+        for name, size in ((VECTORS_FILE, 4 * self.embedder.dim), (IDS_FILE, 8)):
+            if os.path.getsize(self._file(name)) > n * size:
+                os.truncate(self._file(name), n * size)
+        with open(self._file(VECTORS_FILE), "ab") as f:
+            np.ascontiguousarray(vectors, dtype=np.float32).tofile(f)
+        with open(self._file(IDS_FILE), "ab") as f:
+            np.asarray(ids, dtype=np.int64).tofile(f)
+        self._map()
+
+    def _pending(self, db: Session) -> List[int]:
+        """Ids of emails added since the last check, or changed, that need a (new) row"""
+        query = db.query(Email.id).order_by(Email.id)
+        if self._cursor is not None:
+            query = query.filter(Email.id > self._cursor)
+        new = [email_id for (email_id,) in query]
+        self._cursor = new[-1] if new else (self._cursor or 0)
+        return sorted({email_id for email_id in new if email_id not in self._rows} | self._changed)
+
+    def mark_changed(self, email_ids: Iterable[int]):
+        """Have the next update re-embed these emails once their new text is committed"""
+        self._changed.update(email_ids)
+
+    def update(self, db: Session) -> int:
+        """Embed emails added or changed since the last call; returns how many"""
+        if not settings.EMBEDDING_ENABLED:
+            return 0
+        count = 0
+        with self._lock, self._file_lock():
+            self._load()
+            self._map()
+            pending = self._pending(db)
+            for start in range(0, len(pending), settings.EMBEDDING_BATCH_SIZE):
+                batch = pending[start:start + settings.EMBEDDING_BATCH_SIZE]
+                emails = db.query(Email).options(
+                    load_only(Email.id, Email.sender, Email.subject, Email.body, Email.body_fetched)
+                ).filter(Email.id.in_(batch)).all()
+                # A changed email whose body isn't committed yet keeps its old row until it is
+                waiting = {e.id for e in emails if e.body_fetched is False and e.id in self._rows}
+                emails = [e for e in emails if e.id not in waiting]
+                if emails:
+                    self._append([email.id for email in emails], self.embedder.embed([email_text(e) for e in emails]))
+                    count += len(emails)
+                # Deleted emails are dropped too
+                self._changed.difference_update(set(batch) - waiting)
+        if count:
+            print(f"Embedded {count} emails")
+        return count
+
+    def sync(self) -> int:
+        """update() in a session of its own, for running in a worker thread"""
+        db = SessionLocal()
+        try:
+            return self.update(db)
+        finally:
+            db.close()
+
+    def _refresh(self):
+        """Map rows appended since the last update; never embeds, so it is safe on the event loop"""
+        with self._lock:
+            if self._loaded:
+                self._map()
+
+    def _top(self, query: np.ndarray, k: int, exclude: Set[int]) -> List[Tuple[int, float]]:
+        vectors, ids, live = self._vectors, self._ids, self._live
+        if vectors is None or k <= 0:
+            return []
+        want = k + len(exclude)
+        rows, scores = [], []
+        for start in range(0, len(ids), settings.EMBEDDING_SEARCH_CHUNK):
+            chunk_scores = vectors[start:start + settings.EMBEDDING_SEARCH_CHUNK] @ query
+            chunk_scores[~live[start:start + len(chunk_scores)]] = -np.inf
+            top = np.argpartition(-chunk_scores, want)[:want] if len(chunk_scores) > want else np.arange(len(chunk_scores))
+            rows.append(top + start)
+            scores.append(chunk_scores[top])
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+
+        results = []
+        for i in np.argsort(-scores):
+            email_id = int(ids[rows[i]])
+            if not np.isfinite(scores[i]) or email_id in exclude:
+                continue
+            results.append((email_id, float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+    def search(self, db: Session, text: str, k: int) -> List[Tuple[int, float]]:
+        """Up to k (email_id, cosine similarity) pairs closest to `text`.
+
+        Only searches what is already embedded; callers run sync() first.
+        """
+        self._refresh()
+        return self._top(self.embedder.embed([text])[0], k, set())
+
+    def similar(self, db: Session, email: Email, k: int, min_similarity: Optional[float] = None,
+                other_threads: bool = False) -> List[Tuple[Email, float]]:
+        """Up to k (email, similarity) pairs most like `email`, most similar first.
+
+        With `other_threads`, emails of the same thread are left out. Like
+        search(), only emails already embedded are candidates.
+        """
+        self._refresh()
+        row = self._rows.get(email.id)
+        vector = np.asarray(self._vectors[row]) if row is not None else self.embedder.embed([email_text(email)])[0]
+        min_similarity = settings.EMBEDDING_MIN_SIMILARITY if min_similarity is None else min_similarity
+
+        exclude = {email.id}
+        if other_threads and email.thread_id is not None:
+            exclude.update(email_id for (email_id,) in db.query(Email.id).filter(Email.thread_id == email.thread_id))
+        ranked = [(email_id, score) for email_id, score in self._top(vector, k, exclude) if score >= min_similarity]
+        if not ranked:
+            return []
+        by_id = {e.id: e for e in db.query(Email).filter(Email.id.in_([email_id for email_id, _ in ranked]))}
+        return [(by_id[email_id], score) for email_id, score in ranked if email_id in by_id]
+
+
+embedding_index = EmbeddingIndex()
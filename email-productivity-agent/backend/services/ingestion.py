@@ -0,0 +1,282 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database.connection import SessionLocal
+from backend.database.models import Email
+from backend.services.email_threads import assign_threads
+from backend.services.embeddings import embedding_index
+from backend.services.prompt_builder import strip_html
+from email import policy
+from email.header import decode_header, make_header
+from email.message import Message
+from email.parser import BytesParser
+from email.utils import getaddresses, parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterator, List, Optional
+import hashlib
+import json
+
+FORMATS = ("mbox", "eml", "jsonl")
+KEPT_HEADERS = ("Message-ID", "In-Reply-To", "References", "List-Unsubscribe", "List-Id", "Precedence", "Auto-Submitted")
+
+# compat32 parses an order of magnitude faster than policy.default, which
+# builds structured header objects we don't need
+_parser = BytesParser(policy=policy.compat32)
+
+
+def parse_message(raw: bytes) -> Message:
+    return _parser.parsebytes(raw)
+
+
+def detect_format(filename: str) -> str:
+    name = filename.lower()
+    if name.endswith(".eml"):
+        return "eml"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "mbox"
+
+
+def iter_mbox(fileobj: BinaryIO) -> Iterator[Message]:
+    """Yield messages from an mbox stream, holding one message in memory at a time"""
+    lines: List[bytes] = []
+    for line in fileobj:
+        if line.startswith(b"From ") and (not lines or lines[-1] in (b"\n", b"\r\n")):
+            if lines:
+                yield _parser.parsebytes(b"".join(lines))
+            lines = []
+            continue  # the separator line is not part of the message
+        # Undo mboxrd ">From " quoting
+        if line.startswith(b">") and line.lstrip(b">").startswith(b"From "):
+            line = line[1:]
+        lines.append(line)
+    if lines:
+        yield _parser.parsebytes(b"".join(lines))
+
+
+def iter_eml(fileobj: BinaryIO) -> Iterator[Message]:
+    yield _parser.parse(fileobj)
+
+
+def _header(msg: Message, name: str) -> Optional[str]:
+    value = msg[name]
+    if value is None:
+        return None
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, UnicodeDecodeError, ValueError):
+        return str(value)
+
+
+def _address(value: Optional[str]) -> str:
+    addresses = [addr for _, addr in getaddresses([value or ""]) if addr]
+    return ", ".join(addresses) or (value or "").strip() or "unknown"
+
+
+def _decode_part(part: Message) -> str:
+    payload = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
+
+def _text_body(msg: Message) -> str:
+    """Plain-text body, falling back to tag-stripped HTML"""
+    plain = html_part = None
+    for part in msg.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain" and plain is None:
+            plain = part
+        elif content_type == "text/html" and html_part is None:
+            html_part = part
+    if plain is not None:
+        return _decode_part(plain).strip()
+    if html_part is not None:
+        return strip_html(_decode_part(html_part))
+    return ""
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return _naive_utc(parsedate_to_datetime(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _iso_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    # fromisoformat only accepts a "Z" suffix from Python 3.11
+    return _naive_utc(datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value))
+
+
+def _synthetic_message_id(row: Dict) -> str:
+    """Stable id for sources without Message-ID, so re-imports still deduplicate"""
+    key = "\0".join(str(row.get(k) or "") for k in ("sender", "recipient", "subject", "timestamp", "body"))
+    return f"<{hashlib.sha256(key.encode('utf-8')).hexdigest()[:40]}@mailflow.local>"
+
+
+def message_to_row(msg: Message) -> Dict:
+    headers = {name: _header(msg, name) for name in KEPT_HEADERS if msg[name] is not None}
+    row = {
+        "sender": _address(_header(msg, "From"))[:255],
+        "recipient": _address(_header(msg, "To"))[:255],
+        "subject": (_header(msg, "Subject") or "(no subject)").strip()[:500],
+        "body": _text_body(msg),
+        "timestamp": _timestamp(_header(msg, "Date")),
+        "message_id": (headers.get("Message-ID") or "").strip()[:500] or None,
+        "headers": headers,
+    }
+    return row
+
+
+def iter_jsonl(fileobj: BinaryIO) -> Iterator[Optional[Dict]]:
+    """Yield one row per JSON line, or None for a line that can't be parsed"""
+    for line in fileobj:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            yield {
+                "sender": str(data.get("sender") or "unknown")[:255],
+                "recipient": str(data.get("recipient") or "unknown")[:255],
+                "subject": str(data.get("subject") or "(no subject)")[:500],
+                "body": str(data.get("body") or ""),
+                "timestamp": _iso_timestamp(data.get("timestamp")),
+                "priority": data.get("priority") or "medium",
+                "message_id": str(data["message_id"])[:500] if data.get("message_id") else None,
+                "headers": data.get("headers"),
+            }
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Skipping unparseable JSONL record: {e}")
+            yield None
+
+
+def iter_rows(fileobj: BinaryIO, fmt: str) -> Iterator[Optional[Dict]]:
+    if fmt == "jsonl":
+        yield from iter_jsonl(fileobj)
+        return
+    messages = iter_eml(fileobj) if fmt == "eml" else iter_mbox(fileobj)
+    for msg in messages:
+        try:
+            yield message_to_row(msg)
+        except Exception as e:
+            print(f"Skipping unparseable message: {e}")
+            yield None
+
+
+def prepare_row(row: Dict, now: datetime) -> Dict:
+    """Fill the defaults a parsed row needs before insertion"""
+    row["message_id"] = row["message_id"] or _synthetic_message_id(row)
+    row["timestamp"] = row["timestamp"] or now
+    row.setdefault("priority", "medium")
+    row["processed"] = False
+    row["created_at"] = now
+    return row
+
+
+def insert_batch(db: Session, batch: List[Dict], stats: Dict):
+    """Insert rows with one executemany, skipping Message-IDs already present.
+
+    The rows are left unthreaded; callers run assign_threads once they are done.
+    """
+    by_id = {}
+    for row in batch:
+        by_id.setdefault(row["message_id"], row)
+    stats["duplicates"] += len(batch) - len(by_id)
+
+    existing = {
+        message_id for (message_id,) in
+        db.query(Email.message_id).filter(Email.message_id.in_(list(by_id)))
+    }
+    rows = [row for message_id, row in by_id.items() if message_id not in existing]
+    stats["duplicates"] += len(existing)
+
+    if rows:
+        db.execute(insert(Email), rows)
+    db.commit()
+    stats["inserted"] += len(rows)
+
+
+def ingest(fileobj: BinaryIO, fmt: str, db: Session, batch_size: Optional[int] = None) -> Dict:
+    """Stream-parse `fileobj` and insert new emails in chunked transactions.
+
+    Rows are deduplicated on Message-ID, both within the file and against
+    emails already stored.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    stats = {"parsed": 0, "inserted": 0, "duplicates": 0, "errors": 0}
+    now = datetime.utcnow()
+
+    batch = []
+    for row in iter_rows(fileobj, fmt):
+        if row is None:
+            stats["errors"] += 1
+            continue
+
+        stats["parsed"] += 1
+        batch.append(prepare_row(row, now))
+
+        if len(batch) >= batch_size:
+            insert_batch(db, batch, stats)
+            batch = []
+
+    if batch:
+        insert_batch(db, batch, stats)
+    if stats["inserted"]:
+        # Once for the whole file, in timestamp order, rather than per batch
+        assign_threads(db)
+        stats["embedded"] = embedding_index.update(db)
+    return stats
+
+
+def ingest_path(path: str, fmt: Optional[str] = None) -> Dict:
+    db = SessionLocal()
+    try:
+        with open(path, "rb") as fileobj:
+            return ingest(fileobj, fmt or detect_format(path), db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from backend.database.init_db import init_schema
+    from backend.services.job_queue import job_queue
+
+    parser = argparse.ArgumentParser(description="Import emails from mbox, EML or JSONL files")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--format", choices=FORMATS, help="default: detect from file extension")
+    parser.add_argument("--process", action="store_true", help="queue a processing job for the new emails")
+    args = parser.parse_args()
+
+    init_schema()
+    total_inserted = 0
+    for path in args.paths:
+        stats = ingest_path(path, args.format)
+        total_inserted += stats["inserted"]
+        print(f"{path}: {stats}")
+
+    if args.process and total_inserted:
+        db = SessionLocal()
+        try:
+            job = job_queue.enqueue(db, "process_all")
+            print(f"Queued processing job {job.id}")
+        finally:
+            db.close()
@@ -0,0 +1,216 @@
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database.connection import AsyncSessionLocal, SessionLocal
+from backend.database.models import Email, Job
+from backend.services.email_processor import email_processor
+from backend.services.processing_engine import processing_engine
+from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import time
+import traceback
+
+JOB_TYPES = ("process_all", "reprocess_stale", "process_emails")
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueue:
+    """Persistent job queue drained by a pool of asyncio workers.
+
+    Jobs live in the `jobs` table, so queued work survives restarts. Work
+    is done in chunks of JOB_CHUNK_SIZE emails, committing progress after
+    each, and every chunk re-selects the emails still left to do, so a
+    resumed job picks up where it stopped.
+
+    Several processes may share the table. A running job's updated_at is
+    its lease: it is refreshed after every chunk, and any worker may queue
+    the job again once it is older than JOB_LEASE_SECONDS. A clean shutdown
+    hands its running jobs back straight away.
+
+    Workers run on the API's event loop, so they use AsyncSessions and keep
+    synchronous queries inside run_sync.
+    """
+
+    def __init__(self):
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = set()
+        self._recovered_at = 0.0
+
+    def start(self, n_workers: int = None):
+        self._wakeup = asyncio.Event()
+        db = SessionLocal()
+        try:
+            self._recover(db)
+        finally:
+            db.close()
+        for i in range(n_workers or settings.JOB_WORKERS):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        print(f"Started {len(self._workers)} job workers")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await asyncio.to_thread(self._release)
+
+    def enqueue(self, db: Session, job_type: str, payload: dict = None) -> Job:
+        job = Job(type=job_type, payload=payload or {}, max_attempts=settings.JOB_MAX_ATTEMPTS)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def cancel(self, db: Session, job: Job) -> Job:
+        """Cancel a queued job now, or ask a running one to stop after its current chunk"""
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+        elif job.status == "running":
+            job.cancel_requested = True
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def _recover(self, db: Session):
+        """Queue again running jobs whose lease expired (their worker died)"""
+        self._recovered_at = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        count = db.query(Job).filter(Job.status == "running", Job.updated_at < cutoff).update(
+            {Job.status: "queued"}, synchronize_session=False
+        )
+        db.commit()
+        if count:
+            print(f"Re-queued {count} interrupted jobs")
+
+    def _release(self):
+        """Hand jobs interrupted by shutdown back to the queue"""
+        if not self._running:
+            return
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id.in_(self._running), Job.status == "running").update(
+                {Job.status: "queued"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+        self._running.clear()
+
+    def _claim(self, db: Session) -> Optional[Job]:
+        """Atomically move the oldest runnable job to `running`"""
+        now = datetime.utcnow()
+        candidates = db.query(Job.id).filter(
+            Job.status == "queued",
+            or_(Job.run_after.is_(None), Job.run_after <= now)
+        ).order_by(Job.created_at, Job.id).limit(5).all()
+
+        for (job_id,) in candidates:
+            # Conditional update so two workers (or processes) can't claim the same job
+            claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update(
+                {Job.status: "running", Job.started_at: now, Job.attempts: Job.attempts + 1},
+                synchronize_session=False
+            )
+            db.commit()
+            if claimed:
+                return db.query(Job).filter(Job.id == job_id).first()
+        return None
+
+    async def _worker(self, worker_id: int):
+        while True:
+            db = AsyncSessionLocal()
+            try:
+                job = await db.run_sync(self._claim)
+                if job is None:
+                    if time.monotonic() - self._recovered_at > settings.JOB_LEASE_SECONDS / 10:
+                        await db.run_sync(self._recover)
+                    await db.close()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self._running.add(job.id)
+                await self._run(job, db)
+                self._running.discard(job.id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker {worker_id} error: {e}")
+                print(f"Full traceback: {traceback.format_exc()}")
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+            finally:
+                await db.close()
+
+    async def _run(self, job: Job, db: AsyncSession):
+        try:
+            await self._process(job, db)
+            job.status = "completed"
+            job.finished_at = datetime.utcnow()
+        except JobCancelled:
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+        except asyncio.CancelledError:
+            # Shutdown: leave the job `running` so it is recovered on the next start
+            raise
+        except Exception as e:
+            await db.rollback()
+            await db.refresh(job)
+            print(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            if job.attempts < job.max_attempts:
+                job.status = "queued"
+                job.run_after = datetime.utcnow() + timedelta(
+                    seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+                )
+            else:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+        await db.commit()
+
+    def _remaining(self, job: Job, db: Session):
+        # Emails are taken in id order past the last chunk, so ones left
+        # unprocessed (a body that couldn't be downloaded) aren't picked again
+        after = Email.id > job.payload.get("last_id", 0)
+        if job.type == "process_all":
+            return db.query(Email).filter(Email.processed == False, after)
+        if job.type == "reprocess_stale":
+            return email_processor.find_stale(db).filter(after)
+        if job.type == "process_emails":
+            return db.query(Email).filter(Email.id.in_(job.payload.get("email_ids", [])), after)
+        raise ValueError(f"Unknown job type: {job.type}")
+
+    def _next_chunk(self, db: Session, job: Job) -> List[Email]:
+        return self._remaining(job, db).order_by(Email.id).limit(settings.JOB_CHUNK_SIZE).all()
+
+    async def _process(self, job: Job, db: AsyncSession):
+        if not job.total:
+            job.total = job.processed + await db.run_sync(lambda session: self._remaining(job, session).count())
+            await db.commit()
+
+        while True:
+            await db.refresh(job)
+            if job.cancel_requested:
+                raise JobCancelled()
+
+            emails = await db.run_sync(self._next_chunk, job)
+            if not emails:
+                return
+
+            job.processed += await processing_engine.run(emails, db)
+            job.payload = {**job.payload, "last_id": emails[-1].id}
+            job.updated_at = datetime.utcnow()  # renew the lease
+            await db.commit()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,178 @@
+from backend.config import settings
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class LLMCache:
+    """Two-tier response cache: in-memory LRU in front of a SQLite table.
+
+    Entries are keyed by a hash of (provider, model, temperature, prompt) and
+    expire after `ttl` seconds. Each tier is trimmed to its size limit by
+    evicting the least recently used entries. Async callers use aget/aset,
+    which run SQLite reads and writes in a worker thread.
+    """
+
+    def __init__(self, path: str, memory_size: int, disk_size: int, ttl: float):
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()  # memory tier and counters; never held across disk IO
+        self._disk_lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, temperature: float, prompt: str, response_format: str = "text") -> str:
+        parts = [provider, model, temperature, prompt]
+        if response_format != "text":
+            # Plain-text keys keep their original form so existing entries stay valid
+            parts.append(response_format)
+        payload = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get_memory(key)
+        if value is None and self._conn is not None:
+            value = self._get_disk(key)
+        self._count(value)
+        return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        if self._conn is not None:
+            self._set_disk(key, value, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for the event loop: memory hits return at once, SQLite lookups run in a thread"""
+        value = self._get_memory(key)
+        if value is None and self._conn is not None:
+            value = await asyncio.to_thread(self._get_disk, key)
+        self._count(value)
+        return value
+
+    async def aset(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        if self._conn is not None:
+            await asyncio.to_thread(self._set_disk, key, value, now)
+
+    def _count(self, value: Optional[str]):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if time.time() - created_at < self.ttl:
+                self._memory.move_to_end(key)
+                return value
+            del self._memory[key]
+            return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._disk_lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at >= self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        with self._lock:
+            self._remember(key, value, created_at)
+        return value
+
+    def _set_disk(self, key: str, value: str, now: float):
+        with self._disk_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._writes += 1
+            # Trim the disk tier periodically rather than on every write
+            if self._writes % 100 == 0:
+                self._evict_disk(now)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+        if self._conn is not None:
+            with self._disk_lock:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        disk_entries = None
+        if self._conn is not None:
+            with self._disk_lock:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries
+            }
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_size,)
+        )
+
+
+llm_cache = LLMCache(
+    path=settings.LLM_CACHE_PATH,
+    memory_size=settings.LLM_CACHE_MEMORY_SIZE,
+    disk_size=settings.LLM_CACHE_DISK_SIZE,
+    ttl=settings.LLM_CACHE_TTL
+)
@@ -0,0 +1,146 @@
+from backend.config import settings
+from typing import AsyncIterator, Dict, Optional
+import httpx
+
+
+class LLMProvider:
+    """One LLM vendor: its SDK client and its own pool of keep-alive connections"""
+
+    name = ""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=settings.LLM_TIMEOUT
+        )
+        self.client = self._make_client(api_key, base_url)
+
+    def _make_client(self, api_key: str, base_url: Optional[str]):
+        raise NotImplementedError
+
+    async def complete(self, model: str, prompt: str, temperature: float, max_tokens: int,
+                       json_mode: bool = False) -> str:
+        """Complete `prompt`; with json_mode the reply is constrained to a JSON object"""
+        raise NotImplementedError
+
+    def stream(self, model: str, prompt: str, temperature: float, max_tokens: int,
+               json_mode: bool = False) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def aclose(self):
+        await self._http_client.aclose()
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat-completions API, shared by the OpenAI and Groq SDKs"""
+
+    def _options(self, json_mode):
+        # JSON mode needs the prompt itself to ask for JSON, which ours do
+        return {"response_format": {"type": "json_object"}} if json_mode else {}
+
+    async def complete(self, model, prompt, temperature, max_tokens, json_mode=False):
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **self._options(json_mode)
+        )
+        return response.choices[0].message.content
+
+    async def stream(self, model, prompt, temperature, max_tokens, json_mode=False):
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **self._options(json_mode)
+        )
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+class GroqProvider(OpenAICompatibleProvider):
+    name = "groq"
+
+    def _make_client(self, api_key, base_url):
+        from groq import AsyncGroq
+        # Retries are left to the fallback chain, which can switch provider
+        return AsyncGroq(api_key=api_key, base_url=base_url, http_client=self._http_client,
+                         max_retries=settings.LLM_MAX_RETRIES)
+
+
+class OpenAIProvider(OpenAICompatibleProvider):
+    name = "openai"
+
+    def _make_client(self, api_key, base_url):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http_client,
+                           max_retries=settings.LLM_MAX_RETRIES)
+
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+
+    def _make_client(self, api_key, base_url):
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=self._http_client,
+                              max_retries=settings.LLM_MAX_RETRIES)
+
+    # No JSON mode in this API; prefilling the reply with "{" has the same effect
+    JSON_PREFILL = "{"
+
+    def _messages(self, prompt, json_mode):
+        messages = [{"role": "user", "content": prompt}]
+        if json_mode:
+            messages.append({"role": "assistant", "content": self.JSON_PREFILL})
+        return messages
+
+    async def complete(self, model, prompt, temperature, max_tokens, json_mode=False):
+        response = await self.client.messages.create(
+            model=model,
+            messages=self._messages(prompt, json_mode),
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        text = "".join(block.text for block in response.content if block.type == "text")
+        return self.JSON_PREFILL + text if json_mode else text
+
+    async def stream(self, model, prompt, temperature, max_tokens, json_mode=False):
+        async with self.client.messages.stream(
+            model=model,
+            messages=self._messages(prompt, json_mode),
+            temperature=temperature,
+            max_tokens=max_tokens
+        ) as response:
+            if json_mode:
+                yield self.JSON_PREFILL
+            async for text in response.text_stream:
+                yield text
+
+
+PROVIDER_CLASSES = {cls.name: cls for cls in (GroqProvider, OpenAIProvider, AnthropicProvider)}
+
+
+def load_providers() -> Dict[str, LLMProvider]:
+    """Instantiate every provider that has an API key configured"""
+    credentials = {
+        "groq": (settings.GROQ_API_KEY, settings.GROQ_BASE_URL),
+        "openai": (settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL),
+        "anthropic": (settings.ANTHROPIC_API_KEY, settings.ANTHROPIC_BASE_URL),
+    }
+    providers = {}
+    for name, (api_key, base_url) in credentials.items():
+        if not api_key:
+            continue
+        try:
+            providers[name] = PROVIDER_CLASSES[name](api_key, base_url)
+        except Exception as e:
+            print(f"Error initializing {name} client: {e}")
+    return providers
@@ -1,64 +1,189 @@
 from backend.config import settings
-import traceback
+from backend.services.llm_cache import llm_cache
+from backend.services.llm_providers import load_providers
+from backend.services.rate_limiter import get_rate_limiter
+from collections import deque
+from typing import AsyncIterator, Dict, List, Tuple
+import asyncio
+import time
+
+TEMPERATURE = 0.7
+MAX_TOKENS = 1000
+
+Candidate = Tuple[str, str]  # (provider, model)
 
 
 class LLMService:
+    """Routes completions to providers by task, with fallback and optional hedging.
+
+    LLM_ROUTES maps each task (categorization, extraction, draft, chat) to
+    an ordered list of "provider:model" candidates; candidates whose
+    provider has no API key are skipped. A request goes to the first
+    candidate with rate-limit headroom and moves down the list on errors.
+    With LLM_HEDGE_ENABLED, a request still running past the
+    LLM_HEDGE_PERCENTILE latency of its model is duplicated to the next
+    candidate, and whichever answers first wins.
+    """
+
     def __init__(self):
-        self.provider = settings.LLM_PROVIDER
-        self.client = None
-        print(f"LLM Provider: {self.provider}")
-        print(f"Groq API Key exists: {bool(settings.GROQ_API_KEY)}")
-        
-        # Initialize client once during service startup
-        if self.provider == "groq" and settings.GROQ_API_KEY:
-            try:
-                from groq import Groq
-                print(f"Groq module imported successfully")
-                print(f"Creating Groq client with API key: {settings.GROQ_API_KEY[:10]}...")
-                
-                # Try to create client with only api_key parameter
-                self.client = Groq(api_key=settings.GROQ_API_KEY)
-                print("Groq client initialized successfully!")
-                
-            except TypeError as e:
-                print(f"TypeError initializing Groq client: {e}")
-                print(f"Full traceback: {traceback.format_exc()}")
-                
-                # Try alternative: set environment variable instead
-                try:
-                    import os
-                    os.environ['GROQ_API_KEY'] = settings.GROQ_API_KEY
-                    self.client = Groq()
-                    print("Groq client initialized with environment variable")
-                except Exception as e2:
-                    print(f"Also failed with env var: {e2}")
-                    
-            except Exception as e:
-                print(f"Error initializing Groq client: {e}")
-                print(f"Full traceback: {traceback.format_exc()}")
-        
-    async def generate(self, prompt: str) -> str:
-        if self.provider == "groq":
-            if not settings.GROQ_API_KEY:
-                return "Error: GROQ_API_KEY not found in .env file"
-            
-            if not self.client:
-                return "Error: Groq client not initialized. Check server logs for details."
-            
+        self.providers = load_providers()
+        self._latencies: Dict[Candidate, deque] = {}
+        print(f"LLM providers: {', '.join(self.providers) or 'none configured'}")
+
+    def route(self, task: str) -> List[Candidate]:
+        entries = settings.LLM_ROUTES.get(task) or [f"{settings.LLM_PROVIDER}:{settings.LLM_MODEL}"]
+        candidates = []
+        for entry in entries:
+            provider, _, model = entry.partition(":")
+            if provider in self.providers and (provider, model) not in candidates:
+                candidates.append((provider, model))
+        return candidates
+
+    def _cache_key(self, candidates: List[Candidate], prompt: str, json_mode: bool = False) -> str:
+        # Keyed on the primary candidate even when a fallback answered
+        provider, model = candidates[0]
+        return llm_cache.make_key(provider, model, TEMPERATURE, prompt, "json" if json_mode else "text")
+
+    def _order(self, candidates: List[Candidate]) -> Tuple[List[Candidate], bool]:
+        """Move the first candidate with rate-limit headroom to the front.
+
+        Returns the reordered list and whether its first entry already holds
+        a rate-limit token. If every provider is saturated, the primary is
+        kept and the caller waits for it.
+        """
+        for candidate in candidates:
+            if get_rate_limiter(candidate[0]).try_acquire():
+                return [candidate] + [c for c in candidates if c != candidate], True
+        return candidates, False
+
+    def _hedge_delay(self, candidate: Candidate):
+        """Seconds after which to hedge a request to `candidate`, or None"""
+        samples = self._latencies.get(candidate)
+        if not settings.LLM_HEDGE_ENABLED or not samples or len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * settings.LLM_HEDGE_PERCENTILE / 100))]
+
+    async def _call(self, candidate: Candidate, prompt: str, json_mode: bool, acquired: bool = False) -> str:
+        provider, model = candidate
+        if not acquired:
+            await get_rate_limiter(provider).acquire()
+        started = time.monotonic()
+        content = await self.providers[provider].complete(model, prompt, TEMPERATURE, MAX_TOKENS, json_mode)
+        self._latencies.setdefault(candidate, deque(maxlen=settings.LLM_LATENCY_WINDOW)).append(
+            time.monotonic() - started
+        )
+        return content
+
+    async def _complete(self, candidates: List[Candidate], prompt: str, json_mode: bool = False) -> str:
+        candidates, acquired = self._order(candidates)
+        remaining = list(candidates)
+        pending = {}
+        errors = []
+
+        def launch(acquired=False):
+            candidate = remaining.pop(0)
+            pending[asyncio.ensure_future(self._call(candidate, prompt, json_mode, acquired))] = candidate
+
+        launch(acquired)
+        # Hedge at most once, timed from the first request
+        timeout = self._hedge_delay(candidates[0]) if remaining else None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                timeout = None
+                if not done:
+                    launch()
+                    continue
+                for task in done:
+                    provider, model = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    print(f"Error calling {provider} ({model}): {task.exception()}")
+                    errors.append(f"{provider}: {task.exception()}")
+                if not pending and remaining:
+                    launch()
+        finally:
+            # The slower of a hedged pair is no longer needed
+            for task in pending:
+                task.cancel()
+        raise RuntimeError("; ".join(errors))
+
+    async def generate(self, prompt: str, use_cache: bool = True, task: str = "default",
+                       json_mode: bool = False) -> str:
+        """Complete `prompt`; pass use_cache=False to force a fresh completion.
+
+        With json_mode the provider is asked for a JSON object (the prompt
+        must still describe it); the caller validates the result.
+        """
+        candidates = self.route(task)
+        if not candidates:
+            return "Error: no LLM provider configured. Set GROQ_API_KEY, OPENAI_API_KEY or ANTHROPIC_API_KEY in .env"
+
+        use_cache = use_cache and settings.LLM_CACHE_ENABLED
+        if use_cache:
+            cache_key = self._cache_key(candidates, prompt, json_mode)
+            cached = await llm_cache.aget(cache_key)
+            if cached is not None:
+                return cached
+
+        try:
+            content = await self._complete(candidates, prompt, json_mode)
+        except Exception as e:
+            return f"Error calling LLM API: {str(e)}"
+
+        if use_cache:
+            await llm_cache.aset(cache_key, content)
+        return content
+
+    async def stream(self, prompt: str, use_cache: bool = True, task: str = "default",
+                     json_mode: bool = False) -> AsyncIterator[str]:
+        """Yield the completion for `prompt` in chunks as the provider sends them.
+
+        Falls back to the next candidate only until the first chunk arrives;
+        after that an error ends the stream.
+        """
+        candidates = self.route(task)
+        if not candidates:
+            # Surface the same configuration error generate() reports
+            yield await self.generate(prompt, use_cache=use_cache, task=task, json_mode=json_mode)
+            return
+
+        use_cache = use_cache and settings.LLM_CACHE_ENABLED
+        if use_cache:
+            cache_key = self._cache_key(candidates, prompt, json_mode)
+            cached = await llm_cache.aget(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        candidates, acquired = self._order(candidates)
+        chunks = []
+        error = None
+        for i, (provider, model) in enumerate(candidates):
+            if not (i == 0 and acquired):
+                await get_rate_limiter(provider).acquire()
             try:
-                response = self.client.chat.completions.create(
-                    model=settings.LLM_MODEL,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.7,
-                    max_tokens=1000
-                )
-                return response.choices[0].message.content
+                async for delta in self.providers[provider].stream(model, prompt, TEMPERATURE, MAX_TOKENS, json_mode):
+                    chunks.append(delta)
+                    yield delta
+                error = None
+                break
             except Exception as e:
-                print(f"Error calling Groq API: {e}")
-                print(f"Full traceback: {traceback.format_exc()}")
-                return f"Error calling Groq API: {str(e)}"
-        else:
-            return "LLM provider not configured"
+                print(f"Error streaming from {provider} ({model}): {e}")
+                error = e
+                if chunks:
+                    break
+
+        if error is not None:
+            yield f"Error calling LLM API: {str(error)}"
+        elif use_cache:
+            await llm_cache.aset(cache_key, "".join(chunks))
+
+    async def aclose(self):
+        """Release every provider's pooled connections"""
+        for provider in self.providers.values():
+            await provider.aclose()
 
 
 llm_service = LLMService()
@@ -0,0 +1,357 @@
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database.models import Email, SyncState, content_hash
+from backend.services.email_threads import assign_threads
+from backend.services.embeddings import embedding_index
+from backend.services.ingestion import insert_batch, message_to_row, parse_message, prepare_row
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import imaplib
+import os
+import queue
+import re
+import threading
+
+HEADER_FIELDS = "FROM TO SUBJECT DATE MESSAGE-ID IN-REPLY-TO REFERENCES LIST-UNSUBSCRIBE LIST-ID PRECEDENCE AUTO-SUBMITTED"
+UID_RE = re.compile(rb"UID (\d+)")
+
+# Syncs of the same source must not interleave their watermark updates
+_source_locks: Dict[str, threading.Lock] = {}
+
+
+def _source_lock(source: str) -> threading.Lock:
+    return _source_locks.setdefault(source, threading.Lock())
+
+
+def _get_state(db: Session, source: str) -> SyncState:
+    state = db.query(SyncState).filter(SyncState.source == source).first()
+    if state is None:
+        state = SyncState(source=source, last_uid=0, last_mtime=0.0, message_count=0)
+        db.add(state)
+        db.commit()
+    return state
+
+
+def _batches(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class ImapPool:
+    """Small pool of logged-in IMAP connections, reused across syncs and body fetches"""
+
+    def __init__(self, size: int):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> imaplib.IMAP4:
+        cls = imaplib.IMAP4_SSL if settings.IMAP_SSL else imaplib.IMAP4
+        conn = cls(settings.IMAP_HOST, settings.IMAP_PORT)
+        conn.login(settings.IMAP_USER, settings.IMAP_PASSWORD)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+                conn.noop()  # drop connections the server has closed
+            except queue.Empty:
+                conn = self._connect()
+            except (imaplib.IMAP4.error, OSError):
+                conn = self._connect()
+            yield conn
+            self._idle.put(conn)
+            conn = None
+        finally:
+            if conn is not None:
+                try:
+                    conn.logout()
+                except Exception:
+                    pass
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.logout()
+            except Exception:
+                pass
+
+
+imap_pool = ImapPool(settings.IMAP_POOL_SIZE)
+
+
+def imap_source() -> str:
+    return f"imap:{settings.IMAP_USER}@{settings.IMAP_HOST}/{settings.IMAP_MAILBOX}"
+
+
+def maildir_source(path: str) -> str:
+    return f"maildir:{os.path.abspath(path)}"
+
+
+def _refresh_source_uids(db: Session, rows: List[Dict]):
+    """Point emails stored under these rows' Message-IDs at the rows' source_uid (caller commits)"""
+    if not rows:
+        return
+    emails = Email.__table__
+    db.execute(
+        update(emails).where(emails.c.source == bindparam("src"), emails.c.message_id == bindparam("mid"))
+        .values(source_uid=bindparam("uid")),
+        [{"src": row["source"], "mid": row["message_id"], "uid": row["source_uid"]} for row in rows]
+    )
+
+
+def _fetch_items(data) -> Iterable[Tuple[bytes, bytes]]:
+    """(fetch response line, literal) pairs from an imaplib FETCH result"""
+    for item in data:
+        if isinstance(item, tuple) and len(item) == 2:
+            yield item
+
+
+def sync_imap(db: Session) -> Dict:
+    """Import messages with a UID above the stored watermark.
+
+    If the mailbox UIDVALIDITY changed, UIDs were reassigned and the
+    watermark is reset; Message-ID deduplication keeps the re-scan from
+    creating duplicates, and emails already stored take the UID their
+    message has now, so lazy bodies are fetched from the right message.
+    """
+    if not settings.IMAP_HOST:
+        raise ValueError("IMAP_HOST is not configured")
+    source = imap_source()
+    stats = {"source": source, "fetched": 0, "inserted": 0, "duplicates": 0}
+
+    with _source_lock(source), imap_pool.connection() as conn:
+        conn.select(f'"{settings.IMAP_MAILBOX}"', readonly=True)
+        _, uidvalidity = conn.response("UIDVALIDITY")
+        uidvalidity = int(uidvalidity[0])
+
+        state = _get_state(db, source)
+        rescan = state.uidvalidity != uidvalidity
+        if rescan:
+            state.uidvalidity = uidvalidity
+            state.last_uid = 0
+            # Old UIDs may now name other messages; the re-scan assigns new ones
+            db.query(Email).filter(Email.source == source).update(
+                {Email.source_uid: None}, synchronize_session=False
+            )
+
+        _, data = conn.uid("SEARCH", None, f"UID {state.last_uid + 1}:*")
+        # "n:*" always matches the highest UID, even if it is below n
+        uids = sorted(uid for uid in map(int, (data[0] or b"").split()) if uid > state.last_uid)
+
+        fetch_spec = f"(UID BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])" if settings.SYNC_LAZY_BODIES \
+            else "(UID BODY.PEEK[])"
+        now = datetime.utcnow()
+        for chunk in _batches(uids, settings.SYNC_FETCH_BATCH):
+            _, data = conn.uid("FETCH", ",".join(map(str, chunk)), fetch_spec)
+            rows = []
+            for meta, literal in _fetch_items(data):
+                match = UID_RE.search(meta)
+                if not match:
+                    continue
+                row = message_to_row(parse_message(literal))
+                row["source"] = source
+                row["source_uid"] = match.group(1).decode()
+                row["body_fetched"] = not settings.SYNC_LAZY_BODIES
+                rows.append(prepare_row(row, now))
+            stats["fetched"] += len(rows)
+            insert_batch(db, rows, stats)
+            if rescan:
+                _refresh_source_uids(db, rows)
+
+            # Watermark advances only after the chunk is committed
+            state.last_uid = chunk[-1]
+            state.message_count = (state.message_count or 0) + len(rows)
+            db.commit()
+
+        state.last_synced_at = datetime.utcnow()
+        db.commit()
+        if stats["inserted"]:
+            assign_threads(db)
+    return stats
+
+
+def _read_headers(path: str) -> bytes:
+    with open(path, "rb") as f:
+        lines = []
+        for line in f:
+            if line in (b"\n", b"\r\n"):
+                break
+            lines.append(line)
+    return b"".join(lines)
+
+
+def _maildir_under_root(path: str) -> str:
+    """Resolve `path`, which must be MAILDIR_PATH or a folder inside it"""
+    path = os.path.join(settings.MAILDIR_PATH, path)
+    # realpath so neither ".." nor a symlink leads out of the root
+    root = os.path.realpath(settings.MAILDIR_PATH)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError("Maildir path must be inside MAILDIR_PATH")
+    return os.path.abspath(path)
+
+
+def _insert_maildir_batch(db: Session, rows: List[Dict], stats: Dict):
+    stats["fetched"] += len(rows)
+    insert_batch(db, rows, stats)
+    # Files seen again were moved or had their flags changed; keep the stored paths current
+    _refresh_source_uids(db, rows)
+    db.commit()
+
+
+def sync_maildir(db: Session, path: Optional[str] = None) -> Dict:
+    """Import Maildir files modified since the last sync.
+
+    Delivery renames files into new/ and the MUA renames them into cur/;
+    renames bump the file ctime and the directory mtime, so an unchanged
+    mailbox is detected from two stat calls. Files whose flags changed are
+    seen again and dropped by Message-ID deduplication.
+    """
+    if not settings.MAILDIR_PATH:
+        raise ValueError("MAILDIR_PATH is not configured")
+    path = _maildir_under_root(path or settings.MAILDIR_PATH)
+    source = maildir_source(path)
+    stats = {"source": source, "fetched": 0, "inserted": 0, "duplicates": 0}
+
+    with _source_lock(source):
+        state = _get_state(db, source)
+        watermark = state.last_mtime or 0.0
+        subdirs = [os.path.join(path, sub) for sub in ("new", "cur") if os.path.isdir(os.path.join(path, sub))]
+        if all(os.stat(d).st_mtime < watermark for d in subdirs):
+            state.last_synced_at = datetime.utcnow()
+            db.commit()
+            return stats
+
+        newest = watermark
+        now = datetime.utcnow()
+        rows = []
+        for subdir in subdirs:
+            for entry in os.scandir(subdir):
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                changed = max(st.st_mtime, st.st_ctime)
+                # >= so files delivered within the same second are not missed
+                if changed < watermark:
+                    continue
+                newest = max(newest, changed)
+                if settings.SYNC_LAZY_BODIES:
+                    raw = _read_headers(entry.path)
+                else:
+                    with open(entry.path, "rb") as f:
+                        raw = f.read()
+                row = message_to_row(parse_message(raw))
+                row["source"] = source
+                # new/ or cur/ and the file name, so its body can be opened directly
+                row["source_uid"] = os.path.join(os.path.basename(subdir), entry.name)
+                row["body_fetched"] = not settings.SYNC_LAZY_BODIES
+                rows.append(prepare_row(row, now))
+                if len(rows) >= settings.SYNC_FETCH_BATCH:
+                    _insert_maildir_batch(db, rows, stats)
+                    rows = []
+        if rows:
+            _insert_maildir_batch(db, rows, stats)
+
+        state.last_mtime = newest
+        state.message_count = (state.message_count or 0) + stats["inserted"]
+        state.last_synced_at = datetime.utcnow()
+        db.commit()
+        if stats["inserted"]:
+            assign_threads(db)
+    return stats
+
+
+def _fetch_imap_bodies(uids: List[str]) -> Dict[str, str]:
+    bodies = {}
+    with imap_pool.connection() as conn:
+        conn.select(f'"{settings.IMAP_MAILBOX}"', readonly=True)
+        for chunk in _batches(uids, settings.SYNC_FETCH_BATCH):
+            _, data = conn.uid("FETCH", ",".join(chunk), "(UID BODY.PEEK[])")
+            for meta, literal in _fetch_items(data):
+                match = UID_RE.search(meta)
+                if match:
+                    bodies[match.group(1).decode()] = message_to_row(parse_message(literal))["body"]
+    return bodies
+
+
+def _maildir_key(name: str) -> str:
+    """Unique part of a Maildir file name, without the flags suffix"""
+    return os.path.basename(name).split(":", 1)[0]
+
+
+def _read_maildir_body(path: str) -> str:
+    with open(path, "rb") as f:
+        return message_to_row(parse_message(f.read()))["body"]
+
+
+def _fetch_maildir_bodies(path: str, uids: List[str]) -> Dict[str, str]:
+    """Open each file at its stored new/ or cur/ path; only files moved or
+    renamed since the last sync are looked up by key in a directory scan"""
+    bodies = {}
+    missing = {}
+    for uid in uids:
+        try:
+            bodies[uid] = _read_maildir_body(os.path.join(path, uid))
+        except (FileNotFoundError, IsADirectoryError):
+            missing[_maildir_key(uid)] = uid
+    if not missing:
+        return bodies
+    for sub in ("cur", "new"):
+        subdir = os.path.join(path, sub)
+        if not os.path.isdir(subdir):
+            continue
+        for entry in os.scandir(subdir):
+            uid = missing.pop(_maildir_key(entry.name), None)
+            if uid is not None:
+                bodies[uid] = _read_maildir_body(entry.path)
+    return bodies
+
+
+def fetch_bodies(refs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+    """Download bodies for (source, source_uid) pairs, batched per source.
+
+    Blocking network/disk IO with no database access, so callers can run it
+    in a worker thread.
+    """
+    by_source: Dict[str, List[str]] = {}
+    for source, uid in refs:
+        if uid is None:
+            continue  # no longer in its mailbox since a UIDVALIDITY change
+        by_source.setdefault(source, []).append(uid)
+
+    bodies = {}
+    for source, uids in by_source.items():
+        try:
+            if source.startswith("imap:") and source == imap_source():
+                fetched = _fetch_imap_bodies(uids)
+            elif source.startswith("maildir:"):
+                fetched = _fetch_maildir_bodies(source[len("maildir:"):], uids)
+            else:
+                continue
+        except Exception as e:
+            print(f"Body fetch from {source} failed: {e}")
+            continue
+        bodies.update({(source, uid): body for uid, body in fetched.items()})
+    return bodies
+
+
+def apply_bodies(emails: List[Email], bodies: Dict[Tuple[str, str], str]):
+    """Store fetched bodies on their emails (caller commits)"""
+    for email in emails:
+        body = bodies.get((email.source, email.source_uid))
+        if body is not None:
+            email.body = body
+            email.body_fetched = True
+            email.content_hash = content_hash(email.sender, email.subject, body)
+    # Header-only vectors are replaced once the body is in
+    embedding_index.mark_changed(email.id for email in emails if email.body_fetched)
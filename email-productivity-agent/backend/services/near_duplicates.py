@@ -0,0 +1,168 @@
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
+from backend.config import settings
+from backend.database.models import Email, MinHashBand
+from backend.services.prompt_builder import clean_body
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import hashlib
+import re
+import numpy as np
+
+BANDS = 8
+ROWS_PER_BAND = 4  # emails with word-set similarity 0.8 share a band 98.5% of the time, at 0.3 about 6%
+_seeds = np.random.default_rng(0x5EED)
+# Multiply-shift hashing, one function per signature row: top 32 bits of (a * x + b) mod 2^64, a odd
+HASH_A = _seeds.integers(0, 2 ** 63, size=BANDS * ROWS_PER_BAND, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+HASH_B = _seeds.integers(0, 2 ** 63, size=BANDS * ROWS_PER_BAND, dtype=np.uint64)
+# Parts that vary between copies of the same automated email
+URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+ADDRESS_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+NUMBER_RE = re.compile(r"\b\w*\d[\w.,:/-]*")
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercased words with URLs, addresses and anything containing a digit
+    (amounts, dates, order numbers, codes) replaced by placeholders"""
+    text = URL_RE.sub(" url ", text.lower())
+    text = ADDRESS_RE.sub(" address ", text)
+    text = NUMBER_RE.sub(" 0 ", text)
+    return WORD_RE.findall(text)
+
+
+@lru_cache(maxsize=4096)
+def word_set(text: str) -> Optional[FrozenSet[str]]:
+    """Distinct normalized words of `text`, or None if it is too short to compare"""
+    words = normalize(text)
+    if len(words) < settings.NEAR_DUPLICATE_MIN_WORDS:
+        return None
+    return frozenset(words)
+
+
+def email_words(email: Email) -> Optional[FrozenSet[str]]:
+    return word_set(f"{email.subject or ''}\n{clean_body(email.body)}")
+
+
+def sender_domain(sender: Optional[str]) -> str:
+    """Lowercased domain of the sender's address, or "" if it has none"""
+    match = ADDRESS_RE.search(sender or "")
+    return match.group(0).rsplit("@", 1)[1].lower() if match else ""
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two word sets"""
+    return len(a & b) / len(a | b)
+
+
+def bands(words: FrozenSet[str]) -> List[int]:
+    """MinHash signature of the word set, hashed into one signed 64-bit value per band"""
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little") for word in words),
+        dtype=np.uint64, count=len(words)
+    )
+    signature = ((hashes[:, None] * HASH_A + HASH_B) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+    return [
+        int.from_bytes(hashlib.blake2b(rows.tobytes(), digest_size=8).digest(), "little", signed=True)
+        for rows in signature.reshape(BANDS, ROWS_PER_BAND)
+    ]
+
+
+def template_fits(action_items: List[Dict], email: Email) -> bool:
+    """Whether another email's action items apply to `email` as they are.
+
+    Normalization ignores numbers, so near-duplicates can differ in dates,
+    amounts and codes; items mentioning any the email doesn't contain would
+    carry the wrong ones over.
+    """
+    text = f"{email.subject or ''}\n{email.body or ''}".lower()
+    for item in action_items:
+        for value in (item.get("task"), item.get("deadline")):
+            if any(token.rstrip(".,:/-").lower() not in text for token in NUMBER_RE.findall(value or "")):
+                return False
+    return True
+
+
+class NearDuplicateIndex:
+    """Finds processed emails that are near-duplicates of a new one.
+
+    Emails are compared as sets of normalized words, with URLs, addresses
+    and numbers masked, so alerts, receipts and newsletters sent from one
+    template differ in a name or two at most. Each processed email's
+    MinHash signature is stored as BANDS hashed bands in minhash_bands. A
+    lookup fetches the emails sharing any band (locality-sensitive hashing)
+    and keeps those from the same sender domain, processed with the current
+    prompts, whose exact similarity reaches NEAR_DUPLICATE_MIN_SIMILARITY.
+    Short personal notes from different people can share most of their
+    words; a category decided for one sender is not reused for another.
+    """
+
+    def record(self, db: Session, email: Email, reusable: bool = True):
+        """Store the email's bands as a reuse source, replacing any earlier ones (caller commits)"""
+        db.query(MinHashBand).filter(MinHashBand.email_id == email.id).delete(synchronize_session=False)
+        words = email_words(email) if reusable else None
+        if words is None:
+            return
+        db.add_all([MinHashBand(email_id=email.id, band=band, value=value) for band, value in enumerate(bands(words))])
+
+    def candidates(self, db: Session, email: Email) -> List[Email]:
+        """Emails sharing a band with `email`, most recent first"""
+        words = email_words(email)
+        if words is None:
+            return []
+        ids = [email_id for (email_id,) in db.query(MinHashBand.email_id).filter(
+            or_(*(and_(MinHashBand.band == band, MinHashBand.value == value)
+                  for band, value in enumerate(bands(words)))),
+            MinHashBand.email_id != email.id
+        ).distinct().order_by(MinHashBand.email_id.desc()).limit(settings.NEAR_DUPLICATE_MAX_CANDIDATES)]
+        if not ids:
+            return []
+        return db.query(Email).options(selectinload(Email.action_items)).filter(
+            Email.id.in_(ids)
+        ).order_by(Email.id.desc()).all()
+
+    def find(self, db: Session, email: Email, signature: str) -> Optional[Email]:
+        """The most similar near-duplicate processed with the prompts in
+        `signature` whose action items apply to `email` unchanged, or None"""
+        words = email_words(email)
+        domain = sender_domain(email.sender)
+        scored = []
+        for source in self.candidates(db, email):
+            source_words = email_words(source)
+            if (source_words and source.processed and sender_domain(source.sender) == domain
+                    and (source.processed_fingerprint or "").endswith(":" + signature)):
+                score = similarity(words, source_words)
+                if score >= settings.NEAR_DUPLICATE_MIN_SIMILARITY:
+                    scored.append((score, source))
+        for _, source in sorted(scored, key=lambda item: item[0], reverse=True):
+            if template_fits([{"task": item.task, "deadline": item.deadline} for item in source.action_items], email):
+                return source
+        return None
+
+    def split(self, emails: List[Email]) -> Tuple[List[Email], List[Email]]:
+        """Separate emails that are near-duplicates of an earlier one in the list.
+
+        Returns (firsts, rest): processing `firsts` before `rest` lets the
+        rest reuse their results instead of all reaching the LLM together.
+        Only emails from the same sender domain count, as in find().
+        """
+        firsts, rest = [], []
+        buckets: Dict[Tuple[str, int, int], List[FrozenSet[str]]] = {}
+        for email in emails:
+            words = email_words(email)
+            if words is None:
+                firsts.append(email)
+                continue
+            domain = sender_domain(email.sender)
+            keys = [(domain, band, value) for band, value in enumerate(bands(words))]
+            if any(similarity(words, other) >= settings.NEAR_DUPLICATE_MIN_SIMILARITY
+                   for key in keys for other in buckets.get(key, ())):
+                rest.append(email)
+                continue
+            firsts.append(email)
+            for key in keys:
+                buckets.setdefault(key, []).append(words)
+        return firsts, rest
+
+
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,177 @@
+from backend.config import settings
+from backend.database.connection import SessionLocal
+from backend.database.models import Email
+from backend.services.retrieval import tokenize
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import math
+import re
+import time
+
+CATEGORIES = ("Important", "Newsletter", "Spam", "To-Do")
+# Bulk senders set these; List-Id alone also marks team discussion lists
+BULK_HEADERS = ("List-Unsubscribe",)
+BULK_PRECEDENCE = ("bulk", "list", "junk")
+# Rules look at the start of the body only; long tails rarely change the verdict
+MAX_SCAN_CHARS = 5000
+
+
+def _word(pattern: str) -> str:
+    """Match `pattern` only when not inside a larger word"""
+    return rf"(?<!\w){pattern}(?!\w)"
+
+
+def compile_rules(rules: Dict[str, Dict[str, List[str]]]) -> Tuple[Optional[re.Pattern], Dict[str, str]]:
+    """Compile sender/domain/keyword rules into one regex.
+
+    Each category becomes a named group, so a single scan reports every
+    category that matched. The scanned text is "from:<sender>" on the first
+    line followed by the subject and body, which is what anchors sender and
+    domain patterns to the sender.
+    """
+    groups, categories = [], {}
+    for i, (category, rule) in enumerate(rules.items()):
+        patterns = []
+        for sender in rule.get("senders", []):
+            sender = re.escape(sender.lower())
+            # A full address, or a local part such as "newsletter"
+            patterns.append(rf"\Afrom:{sender}\n" if "@" in sender else rf"\Afrom:{sender}@")
+        for domain in rule.get("domains", []):
+            patterns.append(rf"\Afrom:[^@\n]*@(?:[^\n]*\.)?{re.escape(domain.lower())}\n")
+        for keyword in rule.get("keywords", []):
+            patterns.append(_word(re.escape(keyword.lower())))
+        if patterns:
+            name = f"c{i}"
+            groups.append(f"(?P<{name}>{'|'.join(patterns)})")
+            categories[name] = category
+    if not groups:
+        return None, categories
+    return re.compile("|".join(groups), re.IGNORECASE), categories
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over email tokens, with add-one smoothing"""
+
+    def __init__(self):
+        self.log_prior: Dict[str, float] = {}
+        self.log_likelihood: Dict[str, Dict[str, float]] = {}
+        self.vocabulary = set()
+
+    def fit(self, documents: List[List[str]], labels: List[str]):
+        word_counts = {label: Counter() for label in set(labels)}
+        for tokens, label in zip(documents, labels):
+            word_counts[label].update(tokens)
+        self.vocabulary = set().union(*word_counts.values())
+
+        class_counts = Counter(labels)
+        self.log_prior = {label: math.log(count / len(labels)) for label, count in class_counts.items()}
+        self.log_likelihood = {}
+        for label, counts in word_counts.items():
+            denominator = sum(counts.values()) + len(self.vocabulary)
+            self.log_likelihood[label] = {
+                word: math.log((counts[word] + 1) / denominator) for word in self.vocabulary
+            }
+
+    def predict(self, tokens: List[str]) -> Tuple[Optional[str], float]:
+        """(best label, its posterior probability)"""
+        if not self.log_prior:
+            return None, 0.0
+        known = [t for t in tokens if t in self.vocabulary]
+        scores = {
+            label: prior + sum(self.log_likelihood[label][t] for t in known)
+            for label, prior in self.log_prior.items()
+        }
+        best = max(scores, key=scores.get)
+        # Softmax relative to the best score to avoid underflow
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / total
+
+
+def _features(email: Email) -> List[str]:
+    sender = (email.sender or "").lower()
+    tokens = tokenize(f"{email.subject or ''} {(email.body or '')[:MAX_SCAN_CHARS]}")
+    if "@" in sender:
+        tokens.append("sender-domain:" + sender.rsplit("@", 1)[1])
+    return tokens
+
+
+class PreClassifier:
+    """Categorizes obvious emails locally so they never reach the LLM.
+
+    Configured rules and bulk-mail headers give a category outright. If
+    enabled, a naive Bayes model trained on already-categorized emails
+    handles the rest when its posterior clears PRECLASSIFIER_MODEL_THRESHOLD.
+    Anything else returns None and goes to the LLM.
+    """
+
+    def __init__(self):
+        self._matcher, self._categories = compile_rules(settings.PRECLASSIFIER_RULES)
+        self._priority = list(settings.PRECLASSIFIER_RULES)
+        self._model: Optional[NaiveBayes] = None
+        self._trained_at = 0.0
+        self.stats = {"rule": 0, "header": 0, "model": 0, "llm": 0}
+
+    def classify(self, email: Email) -> Optional[str]:
+        if not settings.PRECLASSIFIER_ENABLED:
+            return None
+
+        category = self._match_rules(email)
+        source = "rule"
+        if category is None:
+            category, source = self._match_headers(email), "header"
+        if category is None and self._model is not None:
+            label, probability = self._model.predict(_features(email))
+            if probability >= settings.PRECLASSIFIER_MODEL_THRESHOLD:
+                category, source = label, "model"
+
+        self.stats[source if category else "llm"] += 1
+        return category
+
+    def _match_rules(self, email: Email) -> Optional[str]:
+        if self._matcher is None:
+            return None
+        text = f"from:{(email.sender or '').lower()}\n{email.subject or ''}\n{(email.body or '')[:MAX_SCAN_CHARS]}"
+        matched = {self._categories[m.lastgroup] for m in self._matcher.finditer(text)}
+        # Rules are listed in priority order, e.g. spam before newsletter
+        for category in self._priority:
+            if category in matched:
+                return category
+        return None
+
+    def _match_headers(self, email: Email) -> Optional[str]:
+        headers = email.headers or {}
+        precedence = (headers.get("Precedence") or "").strip().lower()
+        if any(headers.get(name) for name in BULK_HEADERS) or precedence in BULK_PRECEDENCE:
+            return "Newsletter"
+        return None
+
+    async def refresh_model(self):
+        """Retrain the model in a worker thread when it is due"""
+        if not (settings.PRECLASSIFIER_ENABLED and settings.PRECLASSIFIER_MODEL_ENABLED):
+            return
+        if self._trained_at and time.monotonic() - self._trained_at < settings.PRECLASSIFIER_RETRAIN_INTERVAL:
+            return
+        self._trained_at = time.monotonic()
+        self._model = await asyncio.to_thread(self._train) or self._model
+
+    def _train(self) -> Optional[NaiveBayes]:
+        db = SessionLocal()
+        try:
+            rows = db.query(Email.sender, Email.subject, Email.body, Email.category).filter(
+                Email.processed == True,
+                Email.category.in_(CATEGORIES)
+            ).order_by(Email.id.desc()).limit(settings.PRECLASSIFIER_MAX_TRAINING).all()
+        finally:
+            db.close()
+
+        labels = [row.category for row in rows]
+        if len(rows) < settings.PRECLASSIFIER_MIN_TRAINING or len(set(labels)) < 2:
+            return None
+        model = NaiveBayes()
+        model.fit([_features(row) for row in rows], labels)
+        print(f"Pre-classifier model trained on {len(rows)} emails")
+        return model
+
+
+preclassifier = PreClassifier()
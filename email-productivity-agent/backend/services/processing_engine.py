@@ -0,0 +1,165 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database.models import Email
+from backend.services.email_processor import email_processor
+from backend.services.email_threads import assign_threads, group_by_thread
+from backend.services.embeddings import embedding_index
+from backend.services.mail_sync import apply_bodies, fetch_bodies
+from backend.services.near_duplicates import near_duplicates
+from backend.services.preclassifier import preclassifier
+from backend.services.prompt_registry import PromptTemplate
+from typing import Dict, List, Optional
+import asyncio
+
+
+class ProcessingEngine:
+    """Processes many emails with bounded parallelism.
+    
+    Up to `concurrency` requests run at once. With both prompts active,
+    each email takes one structured request for its category, priority and
+    action items, and with THREAD_PROCESSING_ENABLED emails of the same
+    thread share one request. When only categorization runs (or
+    STRUCTURED_ANALYSIS_ENABLED is off) and CATEGORIZATION_BATCH_SIZE > 1,
+    categorization is packed into multi-email requests that share the same
+    concurrency budget. The per-provider rate limiter in llm_service paces
+    the actual requests. Results are applied as they complete and committed
+    every `batch_size` emails.
+    
+    The database work goes through an AsyncSession (queries in run_sync),
+    so job workers sharing the API's event loop never block it.
+    
+    With NEAR_DUPLICATE_ENABLED, emails that are near-duplicates of one
+    already processed take its results without a request, and
+    near-duplicates within `emails` wait for the first of them.
+    """
+    
+    def __init__(self, concurrency: Optional[int] = None, batch_size: Optional[int] = None):
+        self.concurrency = concurrency or settings.PROCESSING_CONCURRENCY
+        self.batch_size = batch_size or settings.PROCESSING_COMMIT_BATCH_SIZE
+    
+    async def run(self, emails: List[Email], db: AsyncSession) -> int:
+        """Process `emails` and return how many were processed"""
+        await self._ensure_bodies(emails, db)
+        # Emails whose body couldn't be downloaded stay unprocessed for a later run
+        emails = [email for email in emails if email.body_fetched is not False]
+        await db.run_sync(assign_threads, emails)
+        if settings.EMBEDDING_ENABLED:
+            # Picks up bodies just downloaded; off the event loop since a model may be loaded
+            await asyncio.to_thread(embedding_index.sync)
+        categorization_prompt, action_prompt = await db.run_sync(email_processor.get_active_prompts)
+        signature = email_processor.prompt_signature(categorization_prompt, action_prompt)
+        
+        if categorization_prompt:
+            await preclassifier.refresh_model()
+        
+        passes = list(near_duplicates.split(emails)) if settings.NEAR_DUPLICATE_ENABLED else [emails]
+        processed_count = 0
+        for batch in passes:
+            processed_count += await self._process(batch, db, categorization_prompt, action_prompt, signature)
+        return processed_count
+    
+    async def _process(self, emails: List[Email], db: AsyncSession, categorization_prompt, action_prompt,
+                       signature: str) -> int:
+        # Emails like one already processed with these prompts reuse its results
+        remaining = await db.run_sync(self._reuse, emails, categorization_prompt, action_prompt, signature)
+        processed_count = pending = len(emails) - len(remaining)
+        emails = remaining
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        # Batched categorization runs alongside per-email action extraction;
+        # emails the pre-classifier recognizes are left out of the batches
+        known, batch_of = None, {}
+        structured = action_prompt is not None and settings.STRUCTURED_ANALYSIS_ENABLED
+        if categorization_prompt and settings.CATEGORIZATION_BATCH_SIZE > 1 and not structured:
+            known = {}
+            for email in emails:
+                category = preclassifier.classify(email)
+                if category:
+                    known[email.id] = category
+            batch_of = self._categorize_in_batches(
+                [email for email in emails if email.id not in known], categorization_prompt, semaphore
+            )
+            categorization_prompt = None
+        
+        groups = [[email] for email in emails]
+        if structured and categorization_prompt and settings.THREAD_PROCESSING_ENABLED:
+            groups = [
+                batch for thread in group_by_thread(emails)
+                for batch in email_processor.plan_categorization_batches(thread, settings.THREAD_BATCH_SIZE, "thread")
+            ]
+        
+        async def analyze(group: List[Email]):
+            async with semaphore:
+                if len(group) == 1:
+                    results = [await email_processor.analyze_email(group[0], categorization_prompt, action_prompt)]
+                else:
+                    results = await email_processor.analyze_thread(group, categorization_prompt, action_prompt)
+            if known is not None:
+                # Outside the semaphore, and only waiting for the batch the email is in
+                results = [
+                    (known.get(email.id) or (await batch_of[email.id]).get(email.id), action_items, priority)
+                    for email, (_, action_items, priority) in zip(group, results)
+                ]
+            return [(email, email_processor.fingerprint(email, signature), result)
+                    for email, result in zip(group, results)]
+        
+        for future in asyncio.as_completed([analyze(group) for group in groups]):
+            results = await future
+            await db.run_sync(self._apply, results, action_prompt)
+            processed_count += len(results)
+            pending += len(results)
+            
+            if pending >= self.batch_size:
+                await db.commit()
+                pending = 0
+        
+        if pending:
+            await db.commit()
+        
+        return processed_count
+    
+    def _reuse(self, db: Session, emails: List[Email], categorization_prompt, action_prompt,
+               signature: str) -> List[Email]:
+        """Apply the results of processed near-duplicates; returns the emails left to analyze"""
+        remaining = []
+        for email in emails:
+            results = email_processor.reuse_results(email, db, categorization_prompt, action_prompt, signature)
+            if results is None:
+                remaining.append(email)
+                continue
+            category, action_items, priority = results
+            email_processor.apply_results(email, category, action_items, db,
+                                          email_processor.fingerprint(email, signature), priority)
+        return remaining
+    
+    def _apply(self, db: Session, results, action_prompt):
+        for email, fingerprint, (category, action_items, priority) in results:
+            email_processor.apply_results(email, category, action_items, db, fingerprint, priority,
+                                          failed=action_prompt is not None and action_items is None)
+    
+    async def _ensure_bodies(self, emails: List[Email], db: AsyncSession):
+        """Download bodies of lazily synced emails in one batch per source"""
+        missing = [email for email in emails if email.body_fetched is False]
+        if missing:
+            bodies = await asyncio.to_thread(fetch_bodies, [(e.source, e.source_uid) for e in missing])
+            apply_bodies(missing, bodies)
+            # The embedding sync reads them in a session of its own
+            await db.commit()
+    
+    def _categorize_in_batches(self, emails: List[Email], template: PromptTemplate,
+                               semaphore: asyncio.Semaphore) -> Dict[int, asyncio.Task]:
+        """Start one categorization request per batch; maps each email id
+        to the task of its batch, which returns {email id: category}"""
+        async def categorize(batch):
+            async with semaphore:
+                return await email_processor.categorize_batch(batch, template)
+        
+        batch_of = {}
+        for batch in email_processor.plan_categorization_batches(emails):
+            task = asyncio.ensure_future(categorize(batch))
+            batch_of.update((email.id, task) for email in batch)
+        return batch_of
+
+
+processing_engine = ProcessingEngine()
@@ -0,0 +1,152 @@
+from backend.config import settings
+from backend.database.models import Email
+from backend.services.email_threads import strip_quoted
+from functools import lru_cache
+from typing import List, Optional
+import html
+import re
+
+HTML_TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.DOTALL | re.IGNORECASE)
+LOOKS_LIKE_HTML_RE = re.compile(r"<(?:html|body|div|p|br|table|span|td)\b[^>]*>", re.IGNORECASE)
+SIGNATURE_DELIMITER = "-- "  # RFC 3676; everything below it is the signature
+MOBILE_FOOTER_RE = re.compile(r"^sent from my \w+|^get outlook for \w+", re.IGNORECASE)
+SIGN_OFF_RE = re.compile(
+    r"^(?:(?:best|kind|warm|many thanks and)?\s*regards|thanks|thank you|many thanks|cheers|sincerely|best|br)[,.!]?$",
+    re.IGNORECASE
+)
+SIGN_OFF_MAX_LINES = 8  # a sign-off only counts as a signature this close to the end
+# What follows a sign-off or footer must look like a signature: a few short lines of
+# names, titles and contact details, with no sentences, questions or postscripts
+SIGNATURE_MAX_LINES = 6
+SIGNATURE_LINE_MAX_CHARS = 60
+SENTENCE_RE = re.compile(r"[.!?](?:\s|$)|\?")
+POSTSCRIPT_RE = re.compile(r"^p\.?\s?s\b", re.IGNORECASE)
+BLANK_LINES_RE = re.compile(r"\n[ \t]*(?:\n[ \t]*){2,}")
+SPACES_RE = re.compile(r"[ \t\u00a0]{2,}")
+
+
+def strip_html(text: str) -> str:
+    """Text content of an HTML document, without scripts and styles"""
+    return html.unescape(HTML_TAG_RE.sub(" ", text)).strip()
+
+
+def _looks_like_signature(lines: List[str]) -> bool:
+    lines = [line.strip() for line in lines if line.strip()]
+    return len(lines) <= SIGNATURE_MAX_LINES and all(
+        len(line) <= SIGNATURE_LINE_MAX_CHARS and not SENTENCE_RE.search(line) and not POSTSCRIPT_RE.match(line)
+        for line in lines
+    )
+
+
+def strip_signature(body: str) -> str:
+    """Drop a trailing signature block: everything after a "-- " delimiter, or
+    after a mobile footer or lone sign-off line ("Best regards,") near the end
+    when only signature-like lines follow it.
+    """
+    lines = body.splitlines()
+    for i, line in enumerate(lines):
+        if i and (line == SIGNATURE_DELIMITER
+                  or (MOBILE_FOOTER_RE.match(line.strip()) and _looks_like_signature(lines[i + 1:]))):
+            return "\n".join(lines[:i]).rstrip()
+    for i in range(max(1, len(lines) - SIGN_OFF_MAX_LINES), len(lines)):
+        if SIGN_OFF_RE.match(lines[i].strip()) and _looks_like_signature(lines[i + 1:]):
+            return "\n".join(lines[:i]).rstrip()
+    return body
+
+
+def clean_body(body: Optional[str]) -> str:
+    """Email text with HTML, quoted replies, signature and whitespace runs removed"""
+    body = body or ""
+    if LOOKS_LIKE_HTML_RE.search(body):
+        body = strip_html(body)
+    body = strip_signature(strip_quoted(body))
+    body = SPACES_RE.sub(" ", body)
+    return BLANK_LINES_RE.sub("\n\n", body).strip()
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    """The tiktoken encoding, loaded once per process; None if unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"Token counting falls back to an estimate ({e.__class__.__name__}: {e})")
+        return None
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when installed, else estimates ~4 characters per token"""
+
+    def __init__(self, encoding_name: str):
+        self.encoding_name = encoding_name
+
+    @property
+    def encoding(self):
+        return _load_encoding(self.encoding_name)
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def head_tail(self, text: str, max_tokens: int) -> str:
+        """`text` cut to its start and end within `max_tokens`, marking the gap"""
+        total = self.count(text)
+        if total <= max_tokens:
+            return text
+        marker_tokens = 12
+        keep = max(max_tokens - marker_tokens, 0)
+        head = int(keep * settings.PROMPT_HEAD_FRACTION)
+        tail = keep - head
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            start = self.encoding.decode(tokens[:head])
+            end = self.encoding.decode(tokens[len(tokens) - tail:]) if tail else ""
+        else:
+            start = text[:head * 4]
+            end = text[len(text) - tail * 4:] if tail else ""
+            # Estimated cuts land mid-word; move them to nearby whitespace
+            cut = max(start.rfind("\n"), start.rfind(" "))
+            if cut > len(start) * 0.8:
+                start = start[:cut]
+            cut = min((i for i in (end.find("\n"), end.find(" ")) if i >= 0), default=-1)
+            if 0 <= cut < len(end) * 0.2:
+                end = end[cut + 1:]
+        return f"{start.rstrip()}\n[... {total - head - tail} tokens omitted ...]\n{end.lstrip()}"
+
+
+class PromptBuilder:
+    """Fits email text into per-task token budgets before it goes into a prompt.
+
+    Bodies are cleaned first (HTML, quoted replies, signatures, runs of
+    whitespace), and whatever is still over the task's budget in
+    PROMPT_BODY_BUDGETS keeps its head and tail, which is where requests
+    and deadlines usually are. Results are cached by body and budget, since
+    the same email is often prompted for several tasks.
+    """
+
+    def __init__(self):
+        self.counter = TokenCounter(settings.PROMPT_TOKENIZER_ENCODING)
+        self._fit_body = lru_cache(maxsize=settings.PROMPT_BUILDER_CACHE_SIZE)(self._fit_body_uncached)
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+    def fit(self, text: str, max_tokens: int) -> str:
+        return self.counter.head_tail(text, max_tokens)
+
+    def budget(self, task: str) -> int:
+        return settings.PROMPT_BODY_BUDGETS.get(task) or settings.PROMPT_BODY_BUDGETS["default"]
+
+    def body(self, email: Email, task: str) -> str:
+        """The email's body as it should appear in a prompt for `task`"""
+        if not settings.PROMPT_BUDGET_ENABLED:
+            return strip_quoted(email.body)
+        return self._fit_body(email.body or "", self.budget(task))
+
+    def _fit_body_uncached(self, body: str, budget: int) -> str:
+        return self.fit(clean_body(body), budget)
+
+
+prompt_builder = PromptBuilder()
@@ -0,0 +1,78 @@
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database.models import Email, Prompt
+from typing import Dict, Optional, Tuple
+import re
+import time
+
+# Only these names are substituted; any other braces (JSON examples in a
+# prompt, say) are left as written rather than breaking str.format
+PLACEHOLDER_RE = re.compile(r"\{(subject|sender|recipient|body)\}")
+
+
+class PromptTemplate:
+    """A prompt's content split once into literal text and placeholder slots"""
+
+    def __init__(self, prompt: Prompt):
+        self.id = prompt.id
+        self.version = prompt.version
+        self.type = prompt.type
+        self.name = prompt.name
+        self.content = prompt.content
+        # Even indexes are literal text, odd indexes placeholder names
+        self._parts = PLACEHOLDER_RE.split(prompt.content)
+        self.fields = frozenset(self._parts[1::2])
+
+    @property
+    def instructions(self) -> str:
+        """The text before the first placeholder, for prompts that list emails themselves"""
+        return self._parts[0].strip()
+
+    def render(self, email: Email, **overrides) -> str:
+        """Fill in the placeholders from `email`; keyword arguments replace its fields"""
+        if not self.fields:
+            return self.content
+        values = {name: overrides.get(name, getattr(email, name)) or "" for name in self.fields}
+        return "".join(
+            part if i % 2 == 0 else values[part]
+            for i, part in enumerate(self._parts)
+        )
+
+
+class PromptRegistry:
+    """Active prompts by type, compiled once and shared by the processing paths.
+
+    Loaded with a single query on first use and dropped by the prompt routes
+    whenever a prompt changes. Other worker processes don't see those
+    invalidations, so the cache also expires after PROMPT_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._active: Optional[Dict[str, PromptTemplate]] = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._active = None
+
+    def _load(self, db: Session) -> Dict[str, PromptTemplate]:
+        active = self._active
+        if active is None or time.monotonic() - self._loaded_at > self.ttl:
+            active = {}
+            for prompt in db.query(Prompt).filter(Prompt.is_active == True).order_by(Prompt.id):
+                # First active prompt of each type wins
+                active.setdefault(prompt.type, PromptTemplate(prompt))
+            self._active = active
+            self._loaded_at = time.monotonic()
+        return active
+
+    def active(self, db: Session, prompt_type: str) -> Optional[PromptTemplate]:
+        return self._load(db).get(prompt_type)
+
+    def active_prompts(self, db: Session) -> Tuple[Optional[PromptTemplate], Optional[PromptTemplate]]:
+        """The active (categorization, action_extraction) templates"""
+        active = self._load(db)
+        return active.get("categorization"), active.get("action_extraction")
+
+
+prompt_registry = PromptRegistry(settings.PROMPT_CACHE_TTL)
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from backend.config import settings
+
+
+class RateLimiter:
+    """Async token bucket allowing `rate` acquisitions per `period` seconds"""
+
+    def __init__(self, rate: int, period: float = 60.0):
+        self.capacity = max(1, rate)
+        self.fill_rate = self.capacity / period
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now"""
+        if self._lock.locked():
+            return False  # others are already waiting
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _Unlimited:
+    async def acquire(self):
+        return
+
+    def try_acquire(self) -> bool:
+        return True
+
+
+_limiters = {}
+
+
+def get_rate_limiter(provider: str):
+    """Shared limiter for a provider, sized from settings.LLM_RATE_LIMITS"""
+    if provider not in _limiters:
+        rate = settings.LLM_RATE_LIMITS.get(provider)
+        _limiters[provider] = RateLimiter(rate) if rate else _Unlimited()
+    return _limiters[provider]
@@ -0,0 +1,181 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from backend.config import settings
+from backend.database.models import Email
+from backend.services.prompt_builder import prompt_builder
+from backend.services.search import fts_available, rank_email_ids
+from collections import Counter, defaultdict
+from typing import List, Optional, Set, Tuple
+import math
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "have", "i",
+    "in", "is", "it", "me", "my", "of", "on", "or", "please", "that", "the", "this", "to",
+    "was", "what", "when", "which", "who", "with", "you", "your", "emails", "email"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def fuse_rankings(*rankings: List[int], k: int = 60) -> List[int]:
+    """Merge ranked id lists by reciprocal rank fusion"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class EmailRetriever:
+    """BM25 ranking over email sender, subject and body.
+
+    Uses the SQLite FTS5 index when present. Otherwise an in-memory index is
+    kept and filled incrementally: each search first indexes rows with an
+    id above the highest one seen so far, reindexes lazily synced emails
+    whose body has arrived since, and rebuilds only if rows were removed
+    from the table.
+    """
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)  # term -> {email_id: term frequency}
+        self._doc_len = {}
+        self._total_len = 0
+        self._last_id = 0
+        self._unfetched = set()  # ids indexed before their body was downloaded
+
+    def _add(self, email_id: int, sender: str, subject: str, body: str, body_fetched: Optional[bool]):
+        # Subject terms count double
+        terms = tokenize(f"{sender} {subject} {subject} {body}")
+        for term, tf in Counter(terms).items():
+            self._postings[term][email_id] = tf
+        self._doc_len[email_id] = len(terms)
+        self._total_len += len(terms)
+        if body_fetched is False:
+            self._unfetched.add(email_id)
+
+    def _remove(self, email_ids: Set[int]):
+        for postings in self._postings.values():
+            for email_id in email_ids & postings.keys():
+                del postings[email_id]
+        for email_id in email_ids:
+            self._total_len -= self._doc_len.pop(email_id)
+        self._unfetched -= email_ids
+
+    def _sync(self, db: Session):
+        if db.query(func.count(Email.id)).scalar() < len(self._doc_len):
+            self._reset()
+
+        columns = (Email.id, Email.sender, Email.subject, Email.body, Email.body_fetched)
+        rows = db.query(*columns) \
+            .filter(Email.id > self._last_id) \
+            .order_by(Email.id) \
+            .yield_per(1000)
+        for row in rows:
+            self._add(*row)
+            self._last_id = row.id
+
+        unfetched = sorted(self._unfetched)
+        for start in range(0, len(unfetched), 1000):
+            arrived = db.query(*columns).filter(
+                Email.id.in_(unfetched[start:start + 1000]),
+                Email.body_fetched == True
+            ).all()
+            if arrived:
+                self._remove({row.id for row in arrived})
+                for row in arrived:
+                    self._add(*row)
+
+    def search(self, db: Session, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (email_id, score) pairs ranked by BM25"""
+        if fts_available(db):
+            return rank_email_ids(db, " ".join(tokenize(query)), k)
+
+        self._sync(db)
+        if not self._doc_len:
+            return []
+
+        n_docs = len(self._doc_len)
+        avg_len = self._total_len / n_docs
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for email_id, tf in postings.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[email_id] / avg_len)
+                scores[email_id] += idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def retrieve(self, db: Session, query: str, k: int) -> List[Email]:
+        """Top-k relevant emails, topped up with the most recent ones.
+
+        With EMBEDDING_ENABLED, keyword and embedding matches are fused, so
+        emails that answer the question in other words are found too.
+        """
+        ranked_ids = [email_id for email_id, _ in self.search(db, query, k)]
+        if settings.EMBEDDING_ENABLED:
+            from backend.services.embeddings import embedding_index  # imports tokenize from here
+            semantic_ids = [email_id for email_id, _ in embedding_index.search(db, query, k)]
+            ranked_ids = fuse_rankings(ranked_ids, semantic_ids)[:k]
+        by_id = {e.id: e for e in db.query(Email).filter(Email.id.in_(ranked_ids))} if ranked_ids else {}
+        emails = [by_id[i] for i in ranked_ids if i in by_id]
+
+        # Broad questions ("summarize my inbox") match few terms
+        if len(emails) < k:
+            recent = db.query(Email) \
+                .filter(~Email.id.in_([e.id for e in emails])) \
+                .order_by(Email.timestamp.desc(), Email.id.desc()) \
+                .limit(k - len(emails))
+            emails.extend(recent)
+        return emails
+
+    def build_context(
+        self,
+        db: Session,
+        query: str,
+        focus_email_id: Optional[int] = None,
+        k: Optional[int] = None,
+        token_budget: Optional[int] = None
+    ) -> str:
+        """Assemble the relevant emails into prompt context within a token budget"""
+        k = k or settings.CHAT_RETRIEVAL_TOP_K
+        budget = token_budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+
+        email_context = "YOUR EMAILS:\n"
+        used = prompt_builder.count(email_context)
+        for i, email in enumerate(self.retrieve(db, query, k), 1):
+            block = f"\n[Email {i}]\nFrom: {email.sender}\nSubject: {email.subject}\n"
+            footer = f"Priority: {email.priority}\n"
+            remaining = budget - used - prompt_builder.count(block + footer + "Body: \n")
+            if remaining <= 0:
+                break
+            body = prompt_builder.fit(prompt_builder.body(email, "chat"), remaining)
+            block += f"Body: {body}\n" + footer
+            email_context += block
+            used += prompt_builder.count(block)
+
+        # If specific email_id is provided, add more detail
+        if focus_email_id:
+            specific_email = db.query(Email).filter(Email.id == focus_email_id).first()
+            if specific_email:
+                email_context += f"\n[FOCUSED EMAIL]\n"
+                email_context += f"From: {specific_email.sender}\n"
+                email_context += f"Subject: {specific_email.subject}\n"
+                email_context += f"Body: {prompt_builder.body(specific_email, 'chat_focus')}\n"
+
+        return email_context
+
+
+email_retriever = EmailRetriever()
@@ -0,0 +1,100 @@
+from sqlalchemy import inspect, or_, text
+from sqlalchemy.orm import Session
+from backend.database.models import Email
+from typing import List, Tuple
+import re
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts_available = {}
+
+
+def fts_available(db: Session) -> bool:
+    """Whether the emails_fts index exists on this database"""
+    bind = db.get_bind()
+    if bind.url not in _fts_available:
+        _fts_available[bind.url] = bind.dialect.name == "sqlite" and inspect(bind).has_table("emails_fts")
+    return _fts_available[bind.url]
+
+
+def build_match_query(query: str, match_any: bool = False) -> str:
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Terms are quoted so user input can't inject FTS syntax; the last term is
+    prefix-matched so partially typed words still hit.
+    """
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return (" OR " if match_any else " ").join(quoted)
+
+
+def search_emails(db: Session, query: str, limit: int = 20, offset: int = 0) -> Tuple[int, List[dict]]:
+    """Ranked full-text search; returns (total matches, page of results)"""
+    if not fts_available(db):
+        return _search_like(db, query, limit, offset)
+
+    match = build_match_query(query)
+    if not match:
+        return 0, []
+
+    total = db.execute(
+        text("SELECT COUNT(*) FROM emails_fts WHERE emails_fts MATCH :match"),
+        {"match": match}
+    ).scalar()
+    # bm25() is lower-is-better; weights favour subject, then sender, then body
+    rows = db.execute(
+        text(
+            "SELECT e.id, e.sender, e.subject, e.timestamp, e.category, e.priority, "
+            "snippet(emails_fts, 1, '<mark>', '</mark>', '...', 16) AS snippet, "
+            "bm25(emails_fts, 5.0, 1.0, 2.0) AS rank "
+            "FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid "
+            "WHERE emails_fts MATCH :match "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        ),
+        {"match": match, "limit": limit, "offset": offset}
+    ).mappings().all()
+    return total, [dict(row) for row in rows]
+
+
+def rank_email_ids(db: Session, query: str, k: int) -> List[Tuple[int, float]]:
+    """Top-k (email_id, score) matching any query term, best first"""
+    match = build_match_query(query, match_any=True)
+    if not match:
+        return []
+    rows = db.execute(
+        text(
+            "SELECT rowid, bm25(emails_fts, 5.0, 1.0, 2.0) AS rank FROM emails_fts "
+            "WHERE emails_fts MATCH :match ORDER BY rank LIMIT :k"
+        ),
+        {"match": match, "k": k}
+    ).all()
+    return [(email_id, -rank) for email_id, rank in rows]
+
+
+def _search_like(db: Session, query: str, limit: int, offset: int) -> Tuple[int, List[dict]]:
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return 0, []
+    filters = [
+        or_(Email.subject.ilike(f"%{term}%"), Email.body.ilike(f"%{term}%"), Email.sender.ilike(f"%{term}%"))
+        for term in terms
+    ]
+    q = db.query(Email).filter(*filters)
+    total = q.count()
+    results = [
+        {
+            "id": e.id,
+            "sender": e.sender,
+            "subject": e.subject,
+            "timestamp": e.timestamp,
+            "category": e.category,
+            "priority": e.priority,
+            "snippet": e.body[:120],
+            "rank": None
+        }
+        for e in q.order_by(Email.timestamp.desc(), Email.id.desc()).limit(limit).offset(offset)
+    ]
+    return total, results
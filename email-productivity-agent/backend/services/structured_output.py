@@ -0,0 +1,200 @@
+from pydantic import BaseModel, ValidationError, field_validator
+from typing import List, Optional, Tuple, Type, TypeVar
+import json
+
+CATEGORIES = ("Important", "Newsletter", "Spam", "To-Do")
+PRIORITIES = ("high", "medium", "low")
+JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+def normalize_category(text: str) -> Optional[str]:
+    """Map free text onto a valid category name, or None"""
+    text = text.lower()
+    for category in CATEGORIES + ("Todo",):
+        if category.lower() in text:
+            return category if category != "Todo" else "To-Do"
+    return None
+
+
+class ActionItemOutput(BaseModel):
+    task: str
+    deadline: Optional[str] = None
+
+    @field_validator("deadline", mode="before")
+    @classmethod
+    def _deadline(cls, value):
+        # Models write "none"/"N/A"/"" for tasks without a deadline
+        if value is None or str(value).strip().lower() in ("", "none", "null", "n/a", "no deadline"):
+            return None
+        return str(value)
+
+
+class EmailAnalysis(BaseModel):
+    """Category, priority and action items of one email, from a single completion"""
+    category: str
+    priority: Optional[str] = None
+    action_items: List[ActionItemOutput] = []
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def _category(cls, value):
+        category = normalize_category(str(value or ""))
+        if category is None:
+            raise ValueError(f"unknown category {value!r}")
+        return category
+
+    @field_validator("priority", mode="before")
+    @classmethod
+    def _priority(cls, value):
+        value = str(value or "").strip().lower()
+        return value if value in PRIORITIES else None
+
+
+class ActionItemList(BaseModel):
+    action_items: List[ActionItemOutput] = []
+
+
+class DraftReply(BaseModel):
+    subject: str
+    body: str
+
+
+def parse_json(text: str):
+    """Decode the JSON value in `text`, tolerating code fences and surrounding prose.
+
+    Returns None when there is none. JSON mode makes the plain case the
+    common one; the scan only runs for providers that ignore it.
+    """
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    for i, char in enumerate(text):
+        if char in "{[":
+            try:
+                return decoder.raw_decode(text, i)[0]
+            except ValueError:
+                continue
+    return None
+
+
+def parse_model(model: Type[Model], text: str) -> Optional[Model]:
+    """Validate the JSON in `text` as `model`, or None if it doesn't fit"""
+    return validate(model, parse_json(text))
+
+
+def validate(model: Type[Model], data) -> Optional[Model]:
+    """Validate decoded JSON as `model`, or None if it doesn't fit"""
+    if data is None:
+        return None
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        print(f"Structured output did not match {model.__name__}: {e.error_count()} error(s)")
+        return None
+
+
+class JSONStreamParser:
+    """Decodes the string fields of a JSON object while it is still streaming.
+
+    feed() takes raw completion chunks and returns (field, text) pairs for
+    the decoded characters of top-level string values as they arrive, so a
+    draft's body can be shown before the closing brace. Anything before
+    the opening brace (a code fence, a preamble) is ignored; text() returns
+    the object itself once it is complete.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.fields = {}
+        self._raw = []
+        self._depth = 0
+        self._in_string = False
+        self._is_key = False
+        self._expect_key = False
+        self._escape = None  # None, "" right after a backslash, or "u" plus hex digits
+        self._high_surrogate = None
+        self._key = None
+        self._key_chars = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        deltas = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if char != "{":
+                    continue
+                self.started = True
+            self._raw.append(char)
+            if self._in_string:
+                decoded = self._string_char(char)
+                if decoded:
+                    if self._is_key:
+                        self._key_chars.append(decoded)
+                    elif self._depth == 1 and self._key is not None:
+                        self.fields[self._key] = self.fields.get(self._key, "") + decoded
+                        if deltas and deltas[-1][0] == self._key:
+                            deltas[-1] = (self._key, deltas[-1][1] + decoded)
+                        else:
+                            deltas.append((self._key, decoded))
+            elif char == '"':
+                self._in_string = True
+                self._is_key = self._depth == 1 and self._expect_key
+                self._key_chars = []
+            elif char in "{[":
+                self._depth += 1
+                self._expect_key = char == "{"
+            elif char in "}]":
+                self._depth -= 1
+                self.finished = self._depth == 0
+            elif self._depth == 1 and char == ":":
+                self._expect_key = False
+            elif self._depth == 1 and char == ",":
+                self._expect_key = True
+        return deltas
+
+    def _string_char(self, char: str) -> Optional[str]:
+        """Decoded text for one character inside a string, or None"""
+        if self._escape is None:
+            if char == "\\":
+                self._escape = ""
+                return None
+            if char == '"':
+                self._in_string = False
+                if self._is_key:
+                    self._key = "".join(self._key_chars)
+                    self.fields.setdefault(self._key, "")
+                return None
+            return char
+        if self._escape == "":
+            if char == "u":
+                self._escape = "u"
+                return None
+            self._escape = None
+            return JSON_ESCAPES.get(char, char)
+
+        self._escape += char
+        if len(self._escape) < 5:
+            return None
+        digits, self._escape = self._escape[1:], None
+        try:
+            code = int(digits, 16)
+        except ValueError:
+            return None
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return None
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def text(self) -> Optional[str]:
+        """The raw JSON object, once its closing brace has arrived"""
+        return "".join(self._raw) if self.finished else None
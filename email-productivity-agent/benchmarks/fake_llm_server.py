@@ -0,0 +1,164 @@
+"""Local stand-in for the OpenAI, Groq and Anthropic HTTP APIs.
+
+Run from the email-productivity-agent directory:
+
+    python -m benchmarks.fake_llm_server [--port 8900] [--latency 0.05] [--slow-rate 0.1 --slow-latency 2] [--error-rate 0] [--error-status 500]
+
+then point the app at it, e.g.
+
+    GROQ_API_KEY=fake GROQ_BASE_URL=http://127.0.0.1:8900
+
+Any path ending in /chat/completions answers in the OpenAI format (used by
+the OpenAI and Groq SDKs) and /v1/messages in the Anthropic format, both
+with and without streaming. Latency, a slow tail and failures are
+configurable so fallback and hedging can be exercised without API keys.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.loads(raw or b"{}")
+        config = self.server.config
+        with config["lock"]:
+            config["requests"] += 1
+            failed = config["rng"].random() < config["error_rate"]
+            slow = config["rng"].random() < config["slow_rate"]
+        # Providers take longer the more prompt they have to read
+        time.sleep((config["slow_latency"] if slow else config["latency"]) + config["latency_per_kb"] * len(raw) / 1024)
+
+        if failed:
+            status = config["error_status"]
+            error_type = "rate_limit_error" if status == 429 else "server_error"
+            return self._send_json(status, {"error": {"message": "fake provider failure", "type": error_type}},
+                                   {"Retry-After": "0"})
+        reply = config["reply"]
+        model = body.get("model", "fake")
+        if self.path.endswith("/chat/completions"):
+            if body.get("stream"):
+                return self._stream_openai(model, reply)
+            return self._send_json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            })
+        if self.path.endswith("/v1/messages"):
+            if body.get("stream"):
+                return self._stream_anthropic(model, reply)
+            return self._send_json(200, self._anthropic_message(model, [{"type": "text", "text": reply}]))
+        self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _event(self, data, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        self.wfile.write(f"{prefix}data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+    def _stream_openai(self, model, reply):
+        self._start_stream()
+        for piece in reply.split(" "):
+            self._event({
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece + " "}, "finish_reason": None}],
+            })
+        self._event("[DONE]")
+
+    @staticmethod
+    def _anthropic_message(model, content):
+        return {
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": model, "content": content,
+            "stop_reason": "end_turn", "stop_sequence": None, "usage": {"input_tokens": 1, "output_tokens": 1},
+        }
+
+    def _stream_anthropic(self, model, reply):
+        self._start_stream()
+        self._event({"type": "message_start", "message": self._anthropic_message(model, [])}, "message_start")
+        self._event({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                    "content_block_start")
+        for piece in reply.split(" "):
+            self._event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece + " "}},
+                        "content_block_delta")
+        self._event({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        self._event({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                     "usage": {"output_tokens": 1}}, "message_delta")
+        self._event({"type": "message_stop"}, "message_stop")
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Hedged and cancelled requests hang up mid-response; that's expected
+        pass
+
+
+def make_server(port: int = 0, latency: float = 0.05, slow_rate: float = 0.0, slow_latency: float = 2.0,
+                error_rate: float = 0.0, reply: str = "Important", seed: int = 0,
+                latency_per_kb: float = 0.0, error_status: int = 500) -> ThreadingHTTPServer:
+    """Start a fake provider on a background thread; port 0 picks a free one.
+
+    Failures answer with `error_status`: 500 by default, or 429 to act rate limited.
+    """
+    server = FakeLLMServer(("127.0.0.1", port), FakeLLMHandler)
+    server.config = {
+        "latency": latency, "latency_per_kb": latency_per_kb, "slow_rate": slow_rate, "slow_latency": slow_latency, "error_rate": error_rate,
+        "error_status": error_status, "reply": reply, "rng": random.Random(seed), "lock": threading.Lock(), "requests": 0,
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--latency-per-kb", type=float, default=0.0, help="extra seconds per KB of request")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of responses that are slow")
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of failures, e.g. 429")
+    parser.add_argument("--reply", default="Important")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency, args.slow_rate, args.slow_latency, args.error_rate, args.reply,
+                         latency_per_kb=args.latency_per_kb, error_status=args.error_status)
+    print(f"Fake LLM provider listening on {base_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
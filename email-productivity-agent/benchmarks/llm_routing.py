@@ -0,0 +1,75 @@
+"""Measure LLM fallback and hedging against local fake providers.
+
+Run from the email-productivity-agent directory:
+
+    python -m benchmarks.llm_routing [--requests 400] [--concurrency 8]
+
+The primary provider (Groq API shape) answers in 50 ms but 5% of
+responses take 1.5 s; the secondary (Anthropic API shape) always answers
+in 150 ms. The run is repeated with hedging off and on, then once more
+with the primary failing a third of its requests to show fallback.
+"""
+from backend.config import settings
+from benchmarks.fake_llm_server import base_url, make_server
+import argparse
+import asyncio
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(n_requests: int, concurrency: int, hedge: bool, primary_errors: float = 0.0):
+    primary = make_server(latency=0.05, slow_rate=0.05, slow_latency=1.5, error_rate=primary_errors, seed=1)
+    secondary = make_server(latency=0.15, reply="Newsletter", seed=2)
+
+    settings.GROQ_API_KEY, settings.GROQ_BASE_URL = "fake", base_url(primary)
+    settings.ANTHROPIC_API_KEY, settings.ANTHROPIC_BASE_URL = "fake", base_url(secondary)
+    settings.OPENAI_API_KEY = None
+    settings.LLM_RATE_LIMITS = {}
+    settings.LLM_MAX_RETRIES = 0
+    settings.LLM_HEDGE_ENABLED = hedge
+
+    from backend.services.llm_service import LLMService
+    service = LLMService()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, answers = [], {}
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            answer = await service.generate(f"request {i}", use_cache=False, task="categorization")
+            latencies.append(time.perf_counter() - started)
+            answers[answer] = answers.get(answer, 0) + 1
+
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    await service.aclose()
+    primary.shutdown()
+    secondary.shutdown()
+    return latencies, answers, primary.config["requests"], secondary.config["requests"]
+
+
+def report(name, result):
+    latencies, answers, primary_requests, secondary_requests = result
+    print(
+        f"{name:<24} p50 {percentile(latencies, 50) * 1000:6.0f} ms  "
+        f"p95 {percentile(latencies, 95) * 1000:6.0f} ms  p99 {percentile(latencies, 99) * 1000:6.0f} ms  "
+        f"requests primary/secondary {primary_requests}/{secondary_requests}  answers {answers}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    report("no hedging", asyncio.run(run(args.requests, args.concurrency, hedge=False)))
+    report("hedging at p95", asyncio.run(run(args.requests, args.concurrency, hedge=True)))
+    report("primary 33% errors", asyncio.run(run(args.requests, args.concurrency, hedge=False, primary_errors=0.33)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Measure how many LLM calls near-duplicate reuse saves.
+
+Run from the email-productivity-agent directory:
+
+    python -m benchmarks.near_duplicates [--emails 1000] [--templated 0.7] [--latency 0.3]
+
+Builds a synthetic mailbox in which a share of the emails come from a few
+automated templates (monitoring alerts, receipts, shipping notices,
+password resets, newsletters) with varying names, numbers, dates and
+links, and the rest are one-off messages. Each run processes the mailbox
+with the processing engine against a local fake provider, with
+NEAR_DUPLICATE_ENABLED off and on, and reports the LLM calls made. It also
+counts emails that reused results from a different template, which would
+be wrong.
+"""
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from backend.config import settings
+from backend.database.models import Base, Email
+from benchmarks.fake_llm_server import base_url, make_server
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+REPLY = json.dumps({
+    "category": "Important",
+    "priority": "medium",
+    "action_items": [{"task": "Review the email", "deadline": None}],
+})
+WORDS = ("project budget review meeting schedule client contract proposal deadline team update design launch "
+         "report quarter hiring onboarding feedback roadmap invoice travel conference workshop customer "
+         "migration release security audit vendor partnership strategy training offsite").split()
+_syllables = random.Random(5)
+VOCABULARY = sorted({
+    "".join(_syllables.choice(["ka", "lo", "mi", "ter", "sun", "vel", "dra", "pon", "ish", "ru", "ben", "cor"])
+            for _ in range(_syllables.randint(2, 4)))
+    for _ in range(3000)
+})
+NAMES = ["Alex", "Priya", "Jordan", "Mei", "Sam", "Diego", "Fatima", "Noah", "Lena", "Omar"]
+
+
+def alert(rng):
+    host, pct = f"web-{rng.randint(1, 40)}", rng.randint(81, 99)
+    return (f"[ALERT] CPU usage high on {host}",
+            f"Monitoring alert for host {host} in region us-east-{rng.randint(1, 2)}.\n\n"
+            f"CPU usage has been above {pct}% for the last {rng.randint(5, 30)} minutes "
+            f"(threshold 80%). The alert fired at {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d} UTC.\n\n"
+            f"View the dashboard: https://monitor.example.com/alerts/{rng.getrandbits(32):x}\n"
+            "You are receiving this because you are on call for the web service. To change your "
+            "notification settings visit the monitoring preferences page.")
+
+
+def receipt(rng):
+    order = rng.randint(100000, 999999)
+    return (f"Your receipt for order #{order}",
+            f"Hi {rng.choice(NAMES)},\n\nThank you for your order #{order} placed on "
+            f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}.\n\n"
+            f"Subtotal: ${rng.randint(10, 400)}.{rng.randint(0, 99):02d}\nTax: ${rng.randint(1, 30)}.{rng.randint(0, 99):02d}\n"
+            "Payment method: card on file\n\nYou can view your order history and download invoices from your "
+            "account page at any time. Questions about this order? Reply to this email and our support team "
+            "will get back to you within one business day.")
+
+
+def shipping(rng):
+    tracking = f"1Z{rng.getrandbits(40):X}"
+    return ("Your package is on the way",
+            f"Good news, {rng.choice(NAMES)}! Your package has shipped and is expected to arrive by "
+            f"{rng.choice(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'])}, "
+            f"March {rng.randint(1, 28)}.\n\nTracking number: {tracking}\n"
+            f"Track your shipment: https://ship.example.com/track/{tracking}\n\n"
+            "If you are not home, the carrier will leave a notice with instructions for picking up the package "
+            "at the nearest location. Thank you for shopping with us.")
+
+
+def password_reset(rng):
+    return ("Reset your password",
+            f"Hello {rng.choice(NAMES)},\n\nWe received a request to reset the password for your account "
+            f"{rng.choice(NAMES).lower()}{rng.randint(1, 99)}@example.com. Use the link below to choose a new "
+            f"password. The link expires in {rng.choice([30, 60])} minutes.\n\n"
+            f"https://accounts.example.com/reset?token={rng.getrandbits(64):x}\n\n"
+            "If you did not request a password reset you can safely ignore this email; your password will "
+            "not change.")
+
+
+def newsletter(rng):
+    issue = rng.randint(100, 200)
+    return (f"Weekly Engineering Digest #{issue}",
+            f"This week in engineering, issue {issue}.\n\nTop story: {' '.join(rng.sample(WORDS, 6))}.\n\n"
+            "In this issue you will find highlights from across the engineering organization, upcoming talks, "
+            "open roles and a roundup of the most read posts on the internal blog. Thanks to everyone who "
+            "contributed this week.\n\nUnsubscribe or manage your subscription preferences at "
+            f"https://news.example.com/prefs/{rng.getrandbits(32):x}")
+
+
+def one_off(rng):
+    # Drawn from a vocabulary the size of a real mailbox's, so one-offs share few words
+    words = WORDS + VOCABULARY
+    return (f"{rng.choice(WORDS).title()} {rng.choice(words)}",
+            f"Hi,\n\n{' '.join(rng.choice(words) for _ in range(rng.randint(30, 80)))}.\n\n{rng.choice(NAMES)}")
+
+
+TEMPLATES = [alert, receipt, shipping, password_reset, newsletter]
+
+
+def mailbox(n: int, templated: float):
+    rng = random.Random(11)
+    start = datetime(2025, 3, 1)
+    rows, labels = [], []
+    for i in range(n):
+        maker = rng.choice(TEMPLATES) if rng.random() < templated else one_off
+        subject, body = maker(rng)
+        rows.append({
+            "sender": f"{maker.__name__.replace('_', '-')}@example.com", "recipient": "you@company.com",
+            "subject": subject, "body": body, "timestamp": start + timedelta(minutes=i),
+            "message_id": f"<bench-{i}@example.com>", "processed": False,
+        })
+        labels.append(maker.__name__ if maker is not one_off else f"one_off-{i}")
+    return rows, labels
+
+
+class Prompt:
+    version, name = 1, "bench"
+
+    def __init__(self, id, type, content):
+        self.id, self.type, self.content = id, type, content
+
+
+async def run(rows, labels, enabled: bool):
+    settings.NEAR_DUPLICATE_ENABLED = enabled
+    from backend.services.email_processor import email_processor
+    from backend.services.llm_service import llm_service
+    from backend.services.near_duplicates import near_duplicates
+    from backend.services.processing_engine import ProcessingEngine
+    from backend.services.prompt_registry import PromptTemplate
+
+    prompts = (PromptTemplate(Prompt(1, "categorization", "Categorize this email.")),
+               PromptTemplate(Prompt(2, "action_extraction", "Extract the action items.")))
+    email_processor.get_active_prompts = lambda db: prompts
+
+    calls = 0
+    generate = llm_service.generate
+
+    async def counted(prompt, **kwargs):
+        nonlocal calls
+        calls += 1
+        return await generate(prompt, **kwargs)
+
+    sources = {}
+    find = near_duplicates.find
+
+    def traced(db, email, signature):
+        source = find(db, email, signature)
+        if source is not None:
+            sources[email.id] = source.id
+        return source
+
+    llm_service.generate, near_duplicates.find = counted, traced
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(Email), rows)
+        engine.dispose()
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            emails = (await db.execute(select(Email).order_by(Email.id))).scalars().all()
+
+            started = time.perf_counter()
+            processed = 0
+            for offset in range(0, len(emails), settings.JOB_CHUNK_SIZE):
+                processed += await ProcessingEngine().run(emails[offset:offset + settings.JOB_CHUNK_SIZE], db)
+            elapsed = time.perf_counter() - started
+        await engine.dispose()
+    llm_service.generate, near_duplicates.find = generate, find
+
+    label_of = {i + 1: label for i, label in enumerate(labels)}
+    wrong = sum(label_of[email_id] != label_of[source_id] for email_id, source_id in sources.items())
+    return processed, calls, len(sources), wrong, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--templated", type=float, default=0.7, help="share of emails from automated templates")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake provider seconds per request")
+    args = parser.parse_args()
+
+    server = make_server(latency=args.latency, reply=REPLY)
+    settings.GROQ_API_KEY, settings.GROQ_BASE_URL = "fake", base_url(server)
+    settings.OPENAI_API_KEY = settings.ANTHROPIC_API_KEY = None
+    settings.LLM_ROUTES = {"analysis": ["groq:fake-model"]}
+    settings.LLM_RATE_LIMITS = {}
+    settings.LLM_CACHE_ENABLED = False
+    # Isolate near-duplicate reuse from the other ways of skipping the LLM
+    settings.PRECLASSIFIER_ENABLED = False
+    settings.THREAD_PROCESSING_ENABLED = False
+    settings.EMBEDDING_ENABLED = False
+
+    rows, labels = mailbox(args.emails, args.templated)
+    baseline = None
+    for enabled in (False, True):
+        processed, calls, reused, wrong, elapsed = asyncio.run(run(rows, labels, enabled))
+        baseline = baseline or calls
+        print(
+            f"near-duplicates {'on ' if enabled else 'off'}  processed {processed:5d}  LLM calls {calls:5d} "
+            f"({100 * (1 - calls / baseline):4.1f}% fewer)  reused {reused:5d}  wrong template {wrong:3d}  "
+            f"total {elapsed:5.1f} s"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
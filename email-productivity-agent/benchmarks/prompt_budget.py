@@ -0,0 +1,138 @@
+"""Compare prompt sizes and latency with and without token budgets.
+
+Run from the email-productivity-agent directory:
+
+    python -m benchmarks.prompt_budget [--emails 200] [--latency-per-kb 0.02]
+
+Builds a mailbox mixing the sample emails with the bulky kinds that blow
+up prompts (long quoted reply chains, HTML dumps, forwarded logs, heavy
+signatures) and runs the structured analysis for each against a local
+fake provider whose latency grows with the request size. Reports the
+average prompt tokens and per-email latency with PROMPT_BUDGET_ENABLED
+off and on.
+"""
+from backend.config import settings
+from backend.database.init_db import SAMPLE_EMAILS
+from backend.database.models import Email
+from benchmarks.fake_llm_server import base_url, make_server
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+REPLY = json.dumps({"category": "To-Do", "priority": "medium", "action_items": []})
+
+
+def quoted_chain(rng, depth):
+    body = "Sounds good, let's lock in Thursday and I'll send the agenda."
+    for level in range(depth):
+        quoted = "\n".join("> " + line for line in body.splitlines())
+        body = f"Reply {level}: {rng.choice(['Agreed.', 'Adding Dana.', 'Moving to 3pm?'])}\n\n" \
+               f"On Mon, Mar {level + 1}, 2025 at 9:00 AM Person {level} <p{level}@example.com> wrote:\n{quoted}"
+    return body
+
+
+def html_dump(rng):
+    rows = "".join(
+        f"<tr><td style='padding:4px'>Item {i}</td><td>{rng.randint(1, 999)} units</td></tr>" for i in range(400)
+    )
+    return (f"<html><head><style>td {{ color: #333; }}</style></head><body><div>Please confirm the attached "
+            f"inventory by Friday.</div><table>{rows}</table><p>Regards</p></body></html>")
+
+
+def forwarded_logs(rng):
+    lines = [f"2025-03-0{rng.randint(1, 9)}T12:{i % 60:02d}:00Z ERROR worker-{rng.randint(1, 8)} "
+             f"TimeoutError: upstream took {rng.randint(5, 90)}s at step {i}" for i in range(1500)]
+    return "Can you check why the nightly export failed? Need a fix before Monday.\n\n" + "\n".join(lines)
+
+
+def signature_heavy():
+    return ("Could you send me the signed contract today?\n\nBest regards,\nJordan Lee\nSenior Account Manager | "
+            "ACME Corp\n+1 555 0100 | jordan@acme.example\n" + "This email and any attachments are confidential. " * 40)
+
+
+def mailbox(n: int):
+    rng = random.Random(7)
+    makers = [
+        lambda: rng.choice(SAMPLE_EMAILS)["body"],
+        lambda: quoted_chain(rng, rng.randint(4, 12)),
+        lambda: html_dump(rng),
+        lambda: forwarded_logs(rng),
+        signature_heavy,
+    ]
+    return [
+        Email(id=i, sender=f"user{i}@example.com", recipient="you@company.com", subject=f"Subject {i}",
+              body=makers[i % len(makers)]())
+        for i in range(1, n + 1)
+    ]
+
+
+async def run(emails, budget: bool, latency_per_kb: float, concurrency: int):
+    settings.PROMPT_BUDGET_ENABLED = budget
+    from backend.services.email_processor import email_processor
+    from backend.services.llm_service import llm_service
+    from backend.services.prompt_builder import prompt_builder
+    from backend.services.prompt_registry import PromptTemplate
+
+    class Prompt:
+        id, version, name = 0, 1, "bench"
+
+        def __init__(self, type, content):
+            self.type, self.content = type, content
+
+    categorization = PromptTemplate(Prompt("categorization", "Categorize this email."))
+    extraction = PromptTemplate(Prompt("action_extraction", "Extract the action items."))
+
+    prompt_tokens = []
+    generate = llm_service.generate
+
+    async def measured(prompt, **kwargs):
+        prompt_tokens.append(prompt_builder.count(prompt))
+        return await generate(prompt, **kwargs)
+
+    llm_service.generate = measured
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def analyze(email):
+        async with semaphore:
+            started = time.perf_counter()
+            await email_processor._analyze_structured(email, categorization, extraction)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(analyze(email) for email in emails))
+    elapsed = time.perf_counter() - started
+    llm_service.generate = generate
+    return prompt_tokens, latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-per-kb", type=float, default=0.02, help="fake provider seconds per KB of prompt")
+    args = parser.parse_args()
+
+    server = make_server(latency=0.05, latency_per_kb=args.latency_per_kb, reply=REPLY)
+    settings.GROQ_API_KEY, settings.GROQ_BASE_URL = "fake", base_url(server)
+    settings.OPENAI_API_KEY = settings.ANTHROPIC_API_KEY = None
+    settings.LLM_ROUTES = {"analysis": ["groq:fake-model"]}
+    settings.LLM_RATE_LIMITS = {}
+    settings.LLM_CACHE_ENABLED = False
+
+    emails = mailbox(args.emails)
+    for budget in (False, True):
+        tokens, latencies, elapsed = asyncio.run(run(emails, budget, args.latency_per_kb, args.concurrency))
+        print(
+            f"budgets {'on ' if budget else 'off'}  avg prompt {statistics.mean(tokens):8.0f} tokens  "
+            f"max {max(tokens):7d}  per-email latency p50 {statistics.median(latencies) * 1000:6.0f} ms  "
+            f"mean {statistics.mean(latencies) * 1000:6.0f} ms  total {elapsed:5.1f} s"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Seed large synthetic tables and check the hot lookups use an index.
+
+Run from the email-productivity-agent directory:
+
+    python -m benchmarks.query_plans [--emails 200000]
+
+Exits non-zero if any query plan falls back to a full table scan or a
+temporary sort, so it can be wired into CI.
+"""
+from sqlalchemy import create_engine, insert, select, text
+from backend.database.models import Base, Email, Prompt, ActionItem, Draft, ChatHistory
+from backend.database.migrations import run_migrations
+from datetime import datetime, timedelta
+import argparse
+import random
+import sys
+import tempfile
+import time
+import os
+
+CHUNK = 10000
+
+
+def seed(engine, n_emails: int):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    categories = ["Important", "Newsletter", "Spam", "To-Do"]
+
+    with engine.begin() as conn:
+        for offset in range(0, n_emails, CHUNK):
+            conn.execute(insert(Email), [
+                {
+                    "sender": f"user{rng.randrange(5000)}@example.com",
+                    "recipient": "you@company.com",
+                    "subject": f"Synthetic subject {i}",
+                    "body": "Lorem ipsum dolor sit amet " * 5,
+                    "timestamp": start + timedelta(seconds=i * 37),
+                    "category": rng.choice(categories),
+                    "priority": rng.choice(["high", "medium", "low"]),
+                    # Most of a mature mailbox is already processed
+                    "processed": rng.random() > 0.05,
+                }
+                for i in range(offset, min(offset + CHUNK, n_emails))
+            ])
+
+        conn.execute(insert(Prompt), [
+            {"name": f"Prompt {i}", "type": t, "content": "...", "is_active": i % 10 == 0}
+            for i, t in enumerate(["categorization", "action_extraction", "auto_reply"] * 100)
+        ])
+
+        for offset in range(0, n_emails, CHUNK):
+            conn.execute(insert(ActionItem), [
+                {"email_id": rng.randrange(1, n_emails + 1), "task": "Follow up", "created_at": start + timedelta(seconds=i)}
+                for i in range(offset, min(offset + CHUNK, n_emails))
+            ])
+            conn.execute(insert(Draft), [
+                {"email_id": rng.randrange(1, n_emails + 1), "subject": "Re", "body": "...", "recipient": "x@example.com",
+                 "created_at": start + timedelta(seconds=i)}
+                for i in range(offset, min(offset + CHUNK // 4, n_emails))
+            ])
+            conn.execute(insert(ChatHistory), [
+                {"session_id": f"session-{rng.randrange(2000)}", "role": "user", "content": "hi",
+                 "timestamp": start + timedelta(seconds=i)}
+                for i in range(offset, min(offset + CHUNK, n_emails))
+            ])
+
+        conn.execute(text("ANALYZE"))
+
+
+QUERIES = {
+    "unprocessed emails": select(Email).where(Email.processed == False),
+    "action items by email": select(ActionItem).where(ActionItem.email_id == 123),
+    "active prompt by type": select(Prompt).where(Prompt.type == "categorization", Prompt.is_active == True).limit(1),
+    "drafts by email": select(Draft).where(Draft.email_id == 123),
+    "chat history by session": select(ChatHistory)
+        .where(ChatHistory.session_id == "session-7")
+        .order_by(ChatHistory.timestamp.desc())
+        .limit(20),
+    # The order backend/api/pagination.py uses on SQLite
+    "email page (keyset)": select(Email)
+        .where(Email.timestamp < datetime(2024, 3, 1))
+        .order_by(Email.timestamp.desc().nulls_last(), Email.id.desc())
+        .limit(100),
+    "action item page (keyset)": select(ActionItem)
+        .order_by(ActionItem.created_at.desc().nulls_last(), ActionItem.id.desc())
+        .limit(100),
+}
+
+
+def check_plan(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    details = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    problems = [
+        d for d in details
+        if (d.startswith("SCAN") and "USING" not in d) or "TEMP B-TREE" in d
+    ]
+    return sql, details, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+
+        t0 = time.perf_counter()
+        seed(engine, args.emails)
+        print(f"Seeded {args.emails} emails in {time.perf_counter() - t0:.1f}s\n")
+
+        failures = 0
+        with engine.connect() as conn:
+            for name, stmt in QUERIES.items():
+                sql, details, problems = check_plan(conn, stmt)
+                t0 = time.perf_counter()
+                rows = len(conn.execute(text(sql)).fetchall())
+                elapsed_ms = (time.perf_counter() - t0) * 1000
+
+                status = "FAIL" if problems else "ok"
+                failures += bool(problems)
+                print(f"[{status}] {name}: {rows} rows in {elapsed_ms:.1f} ms")
+                for detail in details:
+                    print(f"       {detail}")
+        engine.dispose()
+
+    if failures:
+        print(f"\n{failures} query plan(s) without a usable index")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Compare mixed read/write throughput of the SQLite profiles.
+
+Run from the email-productivity-agent directory:
+
+    python -m benchmarks.sqlite_concurrency [--emails 20000] [--readers 8] [--writers 2] [--seconds 5]
+
+Readers page through the inbox the way GET /api/emails does while writers
+mark emails processed and commit, which is what the processing engine does
+during a bulk run. Each profile gets a fresh database built through
+create_db_engine, so the pragmas and pools are the ones the app uses.
+"""
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import OperationalError
+from backend.database.connection import SQLITE_PROFILES, create_db_engine
+from backend.database.models import Base, Email
+from backend.database.migrations import run_migrations
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+CHUNK = 10000
+
+
+def seed(engine, n_emails: int):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for offset in range(0, n_emails, CHUNK):
+            conn.execute(insert(Email), [
+                {
+                    "sender": f"user{i % 500}@example.com",
+                    "recipient": "you@company.com",
+                    "subject": f"Synthetic subject {i}",
+                    "body": "Lorem ipsum dolor sit amet " * 20,
+                    "timestamp": start + timedelta(seconds=i * 37),
+                    "priority": "medium",
+                    "processed": False,
+                }
+                for i in range(offset, min(offset + CHUNK, n_emails))
+            ])
+        conn.execute(text("ANALYZE"))
+
+
+def reader(engine, n_emails: int, deadline: float, counts: dict, rng: random.Random):
+    start = datetime(2024, 1, 1)
+    while time.perf_counter() < deadline:
+        before = start + timedelta(seconds=rng.randrange(n_emails) * 37)
+        try:
+            with engine.connect() as conn:
+                conn.execute(
+                    select(Email.id, Email.subject, Email.sender, Email.timestamp)
+                    .where(Email.timestamp < before)
+                    .order_by(Email.timestamp.desc(), Email.id.desc())
+                    .limit(100)
+                ).fetchall()
+            counts["reads"] += 1
+        except OperationalError:
+            counts["read_errors"] += 1
+
+
+def writer(engine, n_emails: int, deadline: float, counts: dict, rng: random.Random):
+    while time.perf_counter() < deadline:
+        ids = [rng.randrange(1, n_emails + 1) for _ in range(25)]
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    update(Email).where(Email.id.in_(ids)).values(processed=True, category="Newsletter")
+                )
+            counts["writes"] += 1
+        except OperationalError:
+            counts["write_errors"] += 1
+
+
+def run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        write_engine = create_db_engine(url, profile=profile)
+        read_engine = create_db_engine(url, read_only=True, profile=profile)
+        Base.metadata.create_all(bind=write_engine)
+        run_migrations(write_engine)
+        seed(write_engine, args.emails)
+
+        counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+        deadline = time.perf_counter() + args.seconds
+        threads = [
+            threading.Thread(target=reader, args=(read_engine, args.emails, deadline, counts, random.Random(i)))
+            for i in range(args.readers)
+        ] + [
+            threading.Thread(target=writer, args=(write_engine, args.emails, deadline, counts, random.Random(100 + i)))
+            for i in range(args.writers)
+        ]
+        # Counters are updated without a lock; under the GIL `+= 1` on a dict
+        # value can drop the odd increment, which is noise at these rates
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        write_engine.dispose()
+        read_engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.emails} emails, {args.readers} readers, {args.writers} writers, {args.seconds:.0f}s per profile\n")
+    for profile in SQLITE_PROFILES:
+        counts = run_profile(profile, args)
+        print(
+            f"{profile:>8}: {counts['reads'] / args.seconds:8.0f} reads/s "
+            f"{counts['writes'] / args.seconds:8.0f} writes/s "
+            f"({counts['read_errors']} read errors, {counts['write_errors']} write errors)"
+        )
+
+
+if __name__ == "__main__":
+    main()
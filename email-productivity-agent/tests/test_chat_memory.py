@@ -0,0 +1,131 @@
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from backend.config import settings
+from backend.database.models import Base, ChatHistory
+from backend.services import chat_memory as chat_memory_module
+from backend.services.chat_memory import SUMMARY_ROLE, ChatMemory
+from backend.services.llm_service import LLMService
+from benchmarks.fake_llm_server import base_url, make_server
+import asyncio
+import pytest
+
+SESSION = "session-1"
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_HISTORY_WINDOW", 6)
+    monkeypatch.setattr(settings, "CHAT_SUMMARY_TRIGGER", 4)
+    monkeypatch.setattr(settings, "CHAT_SUMMARY_MAX_TURNS", 40)
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    yield path, sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    """A fake OpenAI provider that answers every summary request with the same text"""
+    server = make_server(latency=0.01, reply="User is planning the Q3 budget review with Sam.")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "fake")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", base_url(server))
+    monkeypatch.setattr(settings, "LLM_ROUTES", {"summary": ["openai:fake-model"]})
+    monkeypatch.setattr(settings, "LLM_RATE_LIMITS", {})
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(chat_memory_module, "llm_service", LLMService())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def exchange(i: int):
+    return f"Question {i} about the Q3 budget?", f"Answer {i}: the Q3 budget review is on Friday."
+
+
+def converse(database, memory: ChatMemory, turns: range, monkeypatch):
+    """Remember each exchange like the agent route does, waiting for compaction
+    after each; returns the prompt context after every exchange"""
+    path, _ = database
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        # Compaction opens its own session
+        monkeypatch.setattr(chat_memory_module, "AsyncSessionLocal",
+                            async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+        contexts = []
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                for i in turns:
+                    await memory.remember(db, SESSION, *exchange(i))
+                    await asyncio.gather(*memory._tasks)
+                    contexts.append(await db.run_sync(memory.context, SESSION))
+        finally:
+            await chat_memory_module.llm_service.aclose()
+            await engine.dispose()
+        return contexts
+
+    return asyncio.run(run())
+
+
+def test_recent_returns_the_window_oldest_first(database):
+    _, Session = database
+    memory = ChatMemory()
+    db = Session()
+    due = [memory.record(db, SESSION, *exchange(i)) for i in range(6)]
+
+    assert [turn.content for turn in memory.recent(db, SESSION)] == [
+        text for i in range(3, 6) for text in exchange(i)
+    ]
+    assert [turn.role for turn in memory.recent(db, SESSION, limit=3)] == ["assistant", "user", "assistant"]
+    # Compaction is due once more than window + trigger (10) messages are unsummarized
+    assert due == [False] * 5 + [True]
+    assert memory.context(db, "other-session") == ""
+    db.close()
+
+
+def test_errors_are_not_remembered(database):
+    memory = ChatMemory()
+    path, Session = database
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with AsyncSession(engine) as db:
+            await memory.remember(db, SESSION, "Hi?", "Error calling LLM API: 503")
+        await engine.dispose()
+
+    asyncio.run(run())
+    db = Session()
+    assert db.query(ChatHistory).count() == 0
+    db.close()
+
+
+def test_compaction_starts_once_the_trigger_is_passed(database, summarizer, monkeypatch):
+    memory = ChatMemory()
+    contexts = converse(database, memory, range(6), monkeypatch)
+    _, Session = database
+    db = Session()
+
+    assert summarizer.config["requests"] == 1
+    assert "Summary of earlier turns" not in contexts[4]
+    assert "Summary of earlier turns: User is planning the Q3 budget review" in contexts[5]
+    summary = db.query(ChatHistory).filter(ChatHistory.role == SUMMARY_ROLE).one()
+    # The summary covers everything but the window, which stays verbatim
+    assert [turn.content for turn in memory.recent(db, SESSION)] == [text for i in range(3, 6) for text in exchange(i)]
+    assert summary.timestamp < memory.recent(db, SESSION)[0].timestamp
+    db.close()
+
+
+def test_prompt_stays_bounded_however_long_the_session_runs(database, summarizer, monkeypatch):
+    contexts = converse(database, ChatMemory(), range(60), monkeypatch)
+
+    turns = [context.count("\nUser: ") + context.count("\nAssistant: ") for context in contexts]
+    assert max(turns) <= settings.CHAT_HISTORY_WINDOW
+    assert all(context.count("Summary of earlier turns") == 1 for context in contexts[5:])
+    # Only the turn numbers grow, so the prompt stays the size it had after the first summary
+    assert len(contexts[-1]) < len(contexts[5]) + 50
+    # Compaction runs after exchanges 6, 9, 12, ... 60, folding each trigger's worth of turns
+    assert summarizer.config["requests"] == 19
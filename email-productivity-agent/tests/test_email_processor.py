@@ -0,0 +1,132 @@
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from backend.config import settings
+from backend.database.models import Base, Email, MinHashBand
+from backend.services.email_processor import email_processor
+from backend.services.llm_service import llm_service
+from backend.services.prompt_registry import PromptTemplate
+from datetime import datetime
+import asyncio
+import pytest
+
+
+class Prompt:
+    version, name = 1, "test"
+
+    def __init__(self, id, type, content):
+        self.id, self.type, self.content = id, type, content
+
+
+PROMPTS = (PromptTemplate(Prompt(1, "categorization", "Categorize this email.")),
+           PromptTemplate(Prompt(2, "action_extraction", "Extract the action items.")))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_ENABLED", True)
+    monkeypatch.setattr(settings, "PRECLASSIFIER_ENABLED", False)
+    monkeypatch.setattr(settings, "EMBEDDING_ENABLED", False)
+    monkeypatch.setattr(email_processor, "get_active_prompts", lambda db: PROMPTS)
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return path
+
+
+def run(path, test):
+    """Run `test(db)` with an AsyncSession on the test database"""
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                return await test(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def add_email(db) -> Email:
+    email = Email(sender="alerts@example.com", recipient="you@example.com", subject="CPU usage high on web-3",
+                  body="Monitoring alert for host web-3. CPU usage has been above 90% for the last 10 minutes "
+                       "(threshold 80%). View the dashboard to acknowledge the alert and check the service.",
+                  timestamp=datetime(2025, 3, 1), message_id="<1@example.com>")
+    db.add(email)
+    await db.commit()
+    return email
+
+
+async def band_count(db) -> int:
+    return (await db.execute(select(func.count()).select_from(MinHashBand))).scalar()
+
+
+def test_llm_errors_are_failures_and_not_reused(database, monkeypatch):
+    async def error(prompt, **kwargs):
+        return "Error calling LLM API: 503 Service Unavailable"
+
+    async def test(db):
+        email = await email_processor.process_email(await add_email(db), db)
+        items = await db.run_sync(lambda session: list(email.action_items))
+        return email.category, items, await band_count(db)
+
+    monkeypatch.setattr(llm_service, "generate", error)
+    assert run(database, test) == ("Uncategorized", [], 0)
+
+
+def test_successful_analysis_is_recorded_for_reuse(database, monkeypatch):
+    async def reply(prompt, **kwargs):
+        return '{"category": "Important", "priority": "high", "action_items": []}'
+
+    async def test(db):
+        email = await email_processor.process_email(await add_email(db), db)
+        return email.category, await band_count(db)
+
+    monkeypatch.setattr(llm_service, "generate", reply)
+    category, bands = run(database, test)
+    assert category == "Important"
+    assert bands > 0
+
+
+def test_email_without_its_body_stays_unprocessed(database, tmp_path):
+    from backend.services.processing_engine import ProcessingEngine
+
+    async def test(db):
+        email = await add_email(db)
+        email.body, email.body_fetched = "", False
+        email.source, email.source_uid = f"maildir:{tmp_path / 'missing'}", "1"
+        await db.commit()
+        return (await email_processor.process_email(email, db), await ProcessingEngine().run([email], db),
+                email.processed)
+
+    assert run(database, test) == (None, 0, False)
+
+
+def test_email_changed_after_processing_is_stale(database, monkeypatch):
+    from backend.services.mail_sync import apply_bodies
+
+    async def reply(prompt, **kwargs):
+        return '{"category": "Important", "priority": "high", "action_items": []}'
+
+    def stale_ids(session):
+        return [email.id for email in email_processor.find_stale(session)]
+
+    async def test(db):
+        await db.execute(insert(Email), [
+            {"sender": "a@example.com", "recipient": "you@example.com", "subject": f"Note {i}", "body": "Hello",
+             "timestamp": datetime(2025, 3, 1), "message_id": f"<{i}@example.com>"} for i in range(2)
+        ])
+        await db.commit()
+        emails = (await db.execute(select(Email).order_by(Email.id))).scalars().all()
+        for email in emails:
+            await email_processor.process_email(email, db)
+        before = await db.run_sync(stale_ids)
+
+        emails[1].source, emails[1].source_uid = "maildir:inbox", "2"
+        apply_bodies([emails[1]], {("maildir:inbox", "2"): "Hello, the full body arrived later"})
+        await db.commit()
+        return before, await db.run_sync(stale_ids), emails[1].id
+
+    before, after, changed_id = run(database, test)
+    assert before == []
+    assert after == [changed_id]
@@ -0,0 +1,100 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.database.models import Base, Email, Thread
+from backend.services.email_threads import assign_threads, normalize_subject, references, strip_quoted
+from datetime import datetime, timedelta
+import pytest
+
+START = datetime(2025, 3, 1, 9, 0)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def add(db, message_id: str, subject: str, days: float = 0, **headers) -> Email:
+    """Store and thread one email; headers use underscores (In_Reply_To)"""
+    email = Email(sender="sam@example.com", recipient="you@example.com", subject=subject, body="Hello",
+                  timestamp=START + timedelta(days=days), message_id=message_id,
+                  headers={name.replace("_", "-"): value for name, value in headers.items()})
+    db.add(email)
+    db.commit()
+    assign_threads(db)
+    return email
+
+
+def test_normalize_subject_strips_prefixes_and_list_tags():
+    assert normalize_subject("Re: AW: [team] Fwd:  Q3   Budget") == "q3 budget"
+    assert normalize_subject("RE[2]: Q3 budget") == "q3 budget"
+
+
+def test_references_lists_the_nearest_parent_first():
+    email = Email(message_id="<c@x>", headers={"In-Reply-To": "<b@x>", "References": "<a@x> <b@x>"})
+    assert references(email) == ["<b@x>", "<a@x>"]
+
+
+def test_reply_joins_its_parents_thread(db):
+    parent = add(db, "<a@x>", "Q3 budget")
+    reply = add(db, "<b@x>", "Re: Q3 budget", days=1, In_Reply_To="<a@x>", References="<a@x>")
+    assert reply.thread_id == parent.thread_id
+    assert db.get(Thread, parent.thread_id).message_count == 2
+
+
+def test_reply_imported_before_its_parent_shares_a_thread_with_it(db):
+    reply = add(db, "<b@x>", "Re: Q3 budget", days=1, In_Reply_To="<a@x>", References="<a@x>")
+    later_reply = add(db, "<c@x>", "Re: Q3 budget", days=2, References="<a@x> <b@x>")
+    parent = add(db, "<a@x>", "Q3 budget")
+
+    assert parent.thread_id == reply.thread_id == later_reply.thread_id
+    thread = db.get(Thread, parent.thread_id)
+    assert (thread.root_message_id, thread.message_count) == ("<a@x>", 3)
+    assert thread.last_timestamp == later_reply.timestamp
+
+
+def test_references_only_reply_finds_its_ancestor(db):
+    root = add(db, "<a@x>", "Offsite plans")
+    # Some clients send References without In-Reply-To, and change the subject
+    reply = add(db, "<b@x>", "Venue options", days=1, References="<a@x>")
+    assert reply.thread_id == root.thread_id
+
+
+def test_subject_fallback_only_joins_recent_threads(db, monkeypatch):
+    from backend.config import settings
+    monkeypatch.setattr(settings, "THREAD_SUBJECT_WINDOW_DAYS", 30)
+    first = add(db, "<a@x>", "Invoice 443")
+    soon = add(db, "<b@x>", "RE: Invoice 443", days=10)
+    # Not a reply: the same subject alone doesn't join a thread
+    fresh = add(db, "<c@x>", "Invoice 443", days=11)
+    late = add(db, "<d@x>", "Re: Invoice 443", days=60)
+
+    assert soon.thread_id == first.thread_id
+    assert fresh.thread_id != first.thread_id
+    assert late.thread_id not in (first.thread_id, fresh.thread_id)
+
+
+def test_strip_quoted_drops_history_below_an_attribution_line():
+    body = ("Friday works for me.\n\nOn Mon, 3 Mar 2025 at 09:12, Sam Lee\n<sam@example.com> wrote:\n"
+            "> Can we meet this week?\n> Sam")
+    assert strip_quoted(body) == "Friday works for me."
+    body = "Klingt gut.\n\nAm Mo., 3. März 2025 um 09:12 Uhr schrieb Sam Lee <sam@example.com>:\n> Hallo"
+    assert strip_quoted(body) == "Klingt gut."
+
+
+def test_strip_quoted_drops_an_outlook_header_block():
+    body = ("Approved, go ahead.\n\nFrom: Sam Lee <sam@example.com>\nSent: Monday, March 3, 2025 9:12 AM\n"
+            "To: You\nSubject: Q3 budget\n\nPlease approve the attached budget.")
+    assert strip_quoted(body) == "Approved, go ahead."
+    assert strip_quoted("See below.\n-----Original Message-----\nFrom: Sam") == "See below."
+
+
+def test_strip_quoted_keeps_inline_text_and_bodies_that_are_all_quote():
+    assert strip_quoted("> question one\nAnswer one\n> question two\nAnswer two") == "Answer one\nAnswer two"
+    assert strip_quoted("> only a quote") == "> only a quote"
+    # "From:" in running text isn't an Outlook header block
+    assert strip_quoted("From: the team, thanks!\nSee you Friday.") == "From: the team, thanks!\nSee you Friday."
@@ -0,0 +1,54 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.config import settings
+from backend.database.models import Base, Email
+from backend.services.embeddings import EmbeddingIndex
+from datetime import datetime
+import pytest
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_ENABLED", True)
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL", None)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_changed_email_waits_for_committed_body(sessions, tmp_path):
+    index = EmbeddingIndex(str(tmp_path / "index"))
+    writer, reader = sessions(), sessions()
+    email = Email(sender="a@example.com", recipient="you@example.com", subject="Budget", body="", body_fetched=False,
+                  timestamp=datetime(2025, 3, 1), message_id="<1@example.com>")
+    writer.add(email)
+    writer.commit()
+    assert index.update(reader) == 1
+
+    email.body = "Quarterly budget review for the design team"
+    email.body_fetched = True
+    index.mark_changed([email.id])
+    reader.rollback()
+    assert index.update(reader) == 0  # not committed yet
+    assert email.id in index._changed
+
+    writer.commit()
+    reader.rollback()
+    assert index.update(reader) == 1
+    assert not index._changed
+    writer.close()
+    reader.close()
+
+
+def test_search_only_reads_the_index(sessions, tmp_path):
+    index = EmbeddingIndex(str(tmp_path / "index"))
+    db = sessions()
+    db.add(Email(sender="a@example.com", recipient="you@example.com", subject="Budget",
+                 body="Quarterly budget review", timestamp=datetime(2025, 3, 1), message_id="<1@example.com>"))
+    db.commit()
+    assert index.search(db, "budget", 5) == []
+
+    index.update(db)
+    assert [email_id for email_id, _ in index.search(db, "budget review", 5)] == [1]
+    db.close()
@@ -0,0 +1,54 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.config import settings
+from backend.database.models import Base, Email
+from backend.services import ingestion
+from backend.services.ingestion import ingest, iter_jsonl
+from datetime import datetime
+import io
+import json
+
+
+def jsonl_timestamps(*values):
+    lines = "\n".join(json.dumps({"sender": "a@example.com", "timestamp": value}) for value in values)
+    return [row["timestamp"] for row in iter_jsonl(io.BytesIO(lines.encode()))]
+
+
+def test_jsonl_timestamps_with_an_offset_become_naive_utc():
+    assert jsonl_timestamps("2025-03-01T09:30:00+02:00", "2025-03-01T07:30:00Z") == [
+        datetime(2025, 3, 1, 7, 30), datetime(2025, 3, 1, 7, 30)
+    ]
+
+
+def test_naive_jsonl_timestamps_are_kept():
+    assert jsonl_timestamps("2025-03-01T07:30:00", None) == [datetime(2025, 3, 1, 7, 30), None]
+
+
+def test_ingest_threads_once_after_every_batch_is_inserted(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_ENABLED", False)
+    calls = []
+    assign_threads = ingestion.assign_threads
+
+    def counted(db):
+        calls.append(db.query(Email).count())
+        return assign_threads(db)
+
+    monkeypatch.setattr(ingestion, "assign_threads", counted)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    # The reply comes first in the file, in an earlier batch than its parent
+    rows = [{"sender": "b@example.com", "recipient": "you@example.com", "subject": "Re: Budget",
+             "timestamp": "2025-03-02T09:00:00", "message_id": "<b@x>", "headers": {"In-Reply-To": "<a@x>"}}]
+    rows += [{"sender": "a@example.com", "recipient": "you@example.com", "subject": f"Note {i}",
+              "timestamp": "2025-03-01T09:00:00", "message_id": f"<n{i}@x>"} for i in range(3)]
+    rows.append({"sender": "a@example.com", "recipient": "you@example.com", "subject": "Budget",
+                 "timestamp": "2025-03-01T08:00:00", "message_id": "<a@x>"})
+    data = io.BytesIO("\n".join(map(json.dumps, rows)).encode())
+
+    stats = ingest(data, "jsonl", db, batch_size=2)
+    assert (stats["inserted"], calls) == (5, [5])
+    threads = dict(db.query(Email.message_id, Email.thread_id))
+    assert None not in threads.values() and threads["<a@x>"] == threads["<b@x>"]
+    db.close()
+    engine.dispose()
@@ -0,0 +1,87 @@
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from backend.config import settings
+from backend.database.models import Base, Email, Job
+from backend.services import job_queue as job_queue_module
+from backend.services.email_processor import email_processor
+from backend.services.job_queue import JobQueue
+from backend.services.llm_service import llm_service
+from backend.services.prompt_registry import PromptTemplate
+from datetime import datetime
+import asyncio
+import time
+import pytest
+
+
+class Prompt:
+    version, name = 1, "test"
+
+    def __init__(self, id, type, content):
+        self.id, self.type, self.content = id, type, content
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    """Point the job queue at a SQLite database holding five unprocessed emails"""
+    for name, value in (("PRECLASSIFIER_ENABLED", False), ("EMBEDDING_ENABLED", False),
+                        ("NEAR_DUPLICATE_ENABLED", False), ("JOB_CHUNK_SIZE", 2), ("JOB_POLL_INTERVAL", 0.05)):
+        monkeypatch.setattr(settings, name, value)
+    prompts = (PromptTemplate(Prompt(1, "categorization", "Categorize this email.")), None)
+    monkeypatch.setattr(email_processor, "get_active_prompts", lambda db: prompts)
+
+    async def generate(prompt, **kwargs):
+        return "Important"
+
+    monkeypatch.setattr(llm_service, "generate", generate)
+
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Email), [
+            {"sender": "a@example.com", "recipient": "you@example.com", "subject": f"Note {i}", "body": "Hello",
+             "timestamp": datetime(2025, 3, 1), "message_id": f"<{i}@example.com>"} for i in range(1, 6)
+        ])
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(job_queue_module, "SessionLocal", session_local)
+    monkeypatch.setattr(job_queue_module, "AsyncSessionLocal", async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    ))
+    yield session_local
+    engine.dispose()
+
+
+def test_worker_processes_a_job_in_chunks(sessions):
+    queue = JobQueue()
+
+    async def run():
+        queue.start(n_workers=1)
+        db = sessions()
+        try:
+            job_id = queue.enqueue(db, "process_all").id
+        finally:
+            db.close()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            db = sessions()
+            try:
+                job = db.get(Job, job_id)
+                if job.status in ("completed", "failed"):
+                    break
+            finally:
+                db.close()
+        await queue.stop()
+        return job_id
+
+    job_id = asyncio.run(run())
+    db = sessions()
+    try:
+        job = db.get(Job, job_id)
+        assert (job.status, job.total, job.processed, job.payload["last_id"]) == ("completed", 5, 5, 5)
+        assert db.query(Email).filter(Email.processed == False).count() == 0
+        assert {email.category for email in db.query(Email)} == {"Important"}
+    finally:
+        db.close()
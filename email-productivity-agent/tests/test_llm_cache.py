@@ -0,0 +1,39 @@
+from backend.services.llm_cache import LLMCache
+import asyncio
+import threading
+import pytest
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(str(tmp_path / "cache.db"), memory_size=2, disk_size=10, ttl=60)
+
+
+def test_async_lookups_read_the_disk_tier_off_the_event_loop(cache, monkeypatch):
+    threads = []
+    get_disk = cache._get_disk
+
+    def record(key):
+        threads.append(threading.current_thread())
+        return get_disk(key)
+
+    monkeypatch.setattr(cache, "_get_disk", record)
+
+    async def run():
+        for key in "abc":
+            await cache.aset(key, key.upper())
+        # "a" was evicted from memory (size 2), so it comes from SQLite; "c" from memory
+        return await cache.aget("a"), await cache.aget("c"), await cache.aget("missing")
+
+    assert asyncio.run(run()) == ("A", "C", None)
+    assert len(threads) == 2 and threading.main_thread() not in threads
+    assert cache.stats() | {"hit_rate": None} == {
+        "hits": 2, "misses": 1, "hit_rate": None, "memory_entries": 2, "disk_entries": 3
+    }
+
+
+def test_sync_and_async_access_share_entries(cache):
+    cache.set("key", "value")
+    assert asyncio.run(cache.aget("key")) == "value"
+    cache.clear()
+    assert cache.get("key") is None
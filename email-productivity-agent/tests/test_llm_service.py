@@ -0,0 +1,100 @@
+from backend.config import settings
+from backend.services import rate_limiter
+from backend.services.llm_service import LLMService
+from benchmarks.fake_llm_server import base_url, make_server
+import asyncio
+import time
+import pytest
+
+
+@pytest.fixture(scope="module")
+def servers():
+    """Fake Groq, OpenAI and Anthropic servers that answer with their own name"""
+    servers = {name: make_server(latency=0.01, reply=name) for name in ("groq", "openai", "anthropic")}
+    yield servers
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def providers(servers, monkeypatch):
+    for name, server in servers.items():
+        server.config.update(latency=0.01, error_rate=0.0, error_status=500, requests=0)
+        monkeypatch.setattr(settings, f"{name.upper()}_API_KEY", "fake")
+        monkeypatch.setattr(settings, f"{name.upper()}_BASE_URL", base_url(server))
+    monkeypatch.setattr(settings, "LLM_RATE_LIMITS", {})
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_ROUTES", {"test": ["openai:fake-model", "groq:fake-model", "anthropic:fake-model"]})
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    return servers
+
+
+def generate(service: LLMService, times: int = 1):
+    async def run():
+        try:
+            return [await service.generate(f"request {i}", task="test") for i in range(times)]
+        finally:
+            await service.aclose()
+    return asyncio.run(run())
+
+
+def requests(servers):
+    return {name: server.config["requests"] for name, server in servers.items()}
+
+
+def test_routes_to_first_candidate(providers):
+    assert generate(LLMService(), 3) == ["openai"] * 3
+    assert requests(providers) == {"openai": 3, "groq": 0, "anthropic": 0}
+
+
+def test_providers_without_a_key_are_skipped(providers, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    assert generate(LLMService()) == ["groq"]
+    assert requests(providers)["openai"] == 0
+
+
+@pytest.mark.parametrize("status", [500, 429])
+def test_falls_back_to_next_candidate_on_error(providers, status):
+    providers["openai"].config.update(error_rate=1.0, error_status=status)
+    assert generate(LLMService(), 2) == ["groq", "groq"]
+    assert requests(providers) == {"openai": 2, "groq": 2, "anthropic": 0}
+
+
+def test_reports_an_error_when_every_candidate_fails(providers):
+    for server in providers.values():
+        server.config["error_rate"] = 1.0
+    [answer] = generate(LLMService())
+    assert answer.startswith("Error calling LLM API")
+    assert requests(providers) == {"openai": 1, "groq": 1, "anthropic": 1}
+
+
+def test_hedges_after_latency_percentile(providers, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "LLM_HEDGE_PERCENTILE", 80.0)
+    service = LLMService()
+
+    async def slow(latency):
+        providers["openai"].config["latency"] = latency
+        started = time.perf_counter()
+        answer = await service.generate("slow", task="test")
+        providers["openai"].config["latency"] = 0.01
+        return answer, time.perf_counter() - started
+
+    async def run():
+        # Without LLM_HEDGE_MIN_SAMPLES latencies, a slow answer is waited for
+        unhedged = await slow(0.3)
+        for i in range(5):
+            await service.generate(f"warm-up {i}", task="test")
+        hedged = await slow(1.0)
+        await service.aclose()
+        return unhedged, hedged
+
+    (unhedged, unhedged_elapsed), (hedged, hedged_elapsed) = asyncio.run(run())
+    assert unhedged == "openai" and unhedged_elapsed >= 0.3
+    # The p80 latency is that of the fast requests, so the slow one is duplicated to groq
+    assert hedged == "groq" and hedged_elapsed < 0.5
+    assert requests(providers) == {"openai": 7, "groq": 1, "anthropic": 0}
@@ -0,0 +1,154 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.config import settings
+from backend.database.models import Base, Email
+from backend.services import mail_sync
+from backend.services.mail_sync import ImapPool, apply_bodies, fetch_bodies, sync_imap, sync_maildir
+import re
+import pytest
+
+
+def message(number: int) -> bytes:
+    return (f"From: sender{number}@example.com\r\nTo: you@example.com\r\nSubject: Message {number}\r\n"
+            f"Message-ID: <{number}@example.com>\r\nDate: Sat, 01 Mar 2025 10:00:00 +0000\r\n\r\n"
+            f"Body of message {number}\r\n").encode()
+
+
+class FakeImap:
+    """Just enough of imaplib.IMAP4 for a read-only mailbox: {uid: raw message}"""
+
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+
+    def noop(self):
+        return "OK", [b""]
+
+    def logout(self):
+        return "BYE", [b""]
+
+    def select(self, name, readonly=False):
+        return "OK", [str(len(self.mailbox["messages"])).encode()]
+
+    def response(self, code):
+        return code, [str(self.mailbox["uidvalidity"]).encode()]
+
+    def uid(self, command, *args):
+        uids = sorted(self.mailbox["messages"])
+        if command == "SEARCH":
+            start = int(re.match(r"UID (\d+):\*", args[1]).group(1))
+            found = [uid for uid in uids if uid >= start] or uids[-1:]
+            return "OK", [" ".join(map(str, found)).encode()]
+        wanted, spec = args
+        data = []
+        for uid in map(int, wanted.split(",")):
+            raw = self.mailbox["messages"].get(uid)
+            if raw is None:
+                continue
+            if "HEADER.FIELDS" in spec:
+                raw = raw.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"
+            data += [(f"{uid} (UID {uid} BODY[] {{{len(raw)}}}".encode(), raw), b")"]
+        return "OK", data
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    mailbox = {"uidvalidity": 1, "messages": {1: message(1), 2: message(2)}}
+    for name, value in (("IMAP_HOST", "imap.example.com"), ("IMAP_USER", "you"), ("SYNC_LAZY_BODIES", True),
+                        ("EMBEDDING_ENABLED", False)):
+        monkeypatch.setattr(settings, name, value)
+    pool = ImapPool(1)
+    monkeypatch.setattr(pool, "_connect", lambda: FakeImap(mailbox))
+    monkeypatch.setattr(mail_sync, "imap_pool", pool)
+    return mailbox
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def fetch_lazy_bodies(db):
+    emails = db.query(Email).order_by(Email.id).all()
+    apply_bodies(emails, fetch_bodies([(email.source, email.source_uid) for email in emails]))
+    db.commit()
+    return {email.subject: email.body.strip() if email.body_fetched else None for email in emails}
+
+
+def test_lazy_bodies_follow_messages_across_a_uidvalidity_change(mailbox, db):
+    assert sync_imap(db)["inserted"] == 2
+
+    # The server renumbered the mailbox: message 2 is now UID 1, message 1 was
+    # expunged and UID 2 is a new message
+    mailbox["uidvalidity"] = 2
+    mailbox["messages"] = {1: message(2), 2: message(3)}
+    stats = sync_imap(db)
+    assert (stats["inserted"], stats["duplicates"]) == (1, 1)
+
+    assert fetch_lazy_bodies(db) == {
+        "Message 1": None,
+        "Message 2": "Body of message 2",
+        "Message 3": "Body of message 3",
+    }
+
+
+def test_sync_without_a_uidvalidity_change_only_fetches_new_uids(mailbox, db):
+    sync_imap(db)
+    mailbox["messages"][3] = message(3)
+    stats = sync_imap(db)
+    assert (stats["fetched"], stats["inserted"]) == (1, 1)
+    assert fetch_lazy_bodies(db)["Message 1"] == "Body of message 1"
+
+
+@pytest.fixture
+def maildir_root(tmp_path, monkeypatch):
+    root = tmp_path / "Maildir"
+    for folder in (root, root / ".Sent", tmp_path / "elsewhere"):
+        for sub in ("cur", "new", "tmp"):
+            (folder / sub).mkdir(parents=True)
+    (root / "new" / "1700000000.1.host").write_bytes(message(1))
+    (tmp_path / "elsewhere" / "new" / "1700000000.2.host").write_bytes(message(2))
+    monkeypatch.setattr(settings, "MAILDIR_PATH", str(root))
+    monkeypatch.setattr(settings, "EMBEDDING_ENABLED", False)
+    return root
+
+
+def test_maildir_sync_defaults_to_the_configured_root(maildir_root, db):
+    assert sync_maildir(db)["inserted"] == 1
+    assert sync_maildir(db, ".Sent")["source"] == f"maildir:{maildir_root / '.Sent'}"
+
+
+@pytest.mark.parametrize("path", ["../elsewhere", "/etc", "link"])
+def test_maildir_sync_rejects_paths_outside_the_root(maildir_root, db, path):
+    (maildir_root / "link").symlink_to(maildir_root.parent / "elsewhere")
+    with pytest.raises(ValueError):
+        sync_maildir(db, path)
+    assert db.query(Email).count() == 0
+
+
+def test_maildir_bodies_are_opened_by_their_stored_path(maildir_root, db, monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_LAZY_BODIES", True)
+    sync_maildir(db)
+    assert db.query(Email.source_uid).scalar() == "new/1700000000.1.host"
+
+    def no_scan(path):
+        raise AssertionError(f"scanned {path}")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(mail_sync.os, "scandir", no_scan)
+        assert fetch_lazy_bodies(db) == {"Message 1": "Body of message 1"}
+
+
+def test_maildir_bodies_are_found_after_the_mua_moves_them(maildir_root, db, monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_LAZY_BODIES", True)
+    sync_maildir(db)
+    (maildir_root / "new" / "1700000000.1.host").rename(maildir_root / "cur" / "1700000000.1.host:2,S")
+    assert fetch_lazy_bodies(db) == {"Message 1": "Body of message 1"}
+
+    # The next sync sees the renamed file again and stores its new path
+    assert sync_maildir(db)["inserted"] == 0
+    assert db.query(Email.source_uid).scalar() == "cur/1700000000.1.host:2,S"
@@ -0,0 +1,88 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from backend.database.models import ActionItem, Base, Email
+from backend.services.near_duplicates import near_duplicates, sender_domain, template_fits
+from datetime import datetime
+import pytest
+
+SIGNATURE = "categorization=1.1,action_extraction=2.1"
+
+
+def alert(host: str, usage: int, sender: str = "alerts@monitoring.example.com") -> Email:
+    return Email(sender=sender, recipient="you@example.com", subject=f"CPU usage high on {host}",
+                 body=f"Monitoring alert for host {host}. CPU usage has been above {usage}% for the last 10 "
+                      f"minutes (threshold 80%). View the dashboard to acknowledge the alert and check the service.",
+                 timestamp=datetime(2025, 3, 1))
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def add_processed(db, email: Email, tasks=(), signature: str = SIGNATURE) -> Email:
+    email.category, email.processed = "Important", True
+    email.processed_fingerprint = f"hash:{signature}"
+    email.action_items = [ActionItem(task=task) for task in tasks]
+    db.add(email)
+    db.flush()
+    near_duplicates.record(db, email)
+    db.commit()
+    return email
+
+
+def test_sender_domain():
+    assert sender_domain("Alerts <alerts@Monitoring.Example.com>") == "monitoring.example.com"
+    assert sender_domain("unknown") == ""
+
+
+def test_template_fits_requires_the_email_to_contain_every_number():
+    email = alert("web-3", 95)
+    assert template_fits([{"task": "Acknowledge the alert", "deadline": None}], email)
+    assert template_fits([{"task": "Check web-3", "deadline": "within 10 minutes"}], email)
+    assert not template_fits([{"task": "Check web-7", "deadline": None}], email)
+    assert not template_fits([{"task": "Acknowledge the alert", "deadline": "2025-03-02"}], email)
+
+
+def test_split_holds_back_near_duplicates_from_the_same_domain():
+    first, copy = alert("web-3", 95), alert("web-7", 91)
+    other_sender = alert("web-9", 92, sender="ops@another.example.org")
+    short = Email(sender="alerts@monitoring.example.com", subject="Hi", body="Quick note")
+
+    firsts, rest = near_duplicates.split([first, copy, other_sender, short])
+    assert firsts == [first, other_sender, short]
+    assert rest == [copy]
+
+
+def test_find_reuses_a_near_duplicate_processed_with_the_same_prompts(db):
+    source = add_processed(db, alert("web-3", 95), tasks=["Acknowledge the alert"])
+    assert near_duplicates.find(db, alert("web-7", 91), SIGNATURE) is source
+    assert near_duplicates.find(db, alert("web-7", 91), "categorization=1.2,action_extraction=2.1") is None
+
+
+def test_find_ignores_near_duplicates_from_another_sender_domain(db):
+    add_processed(db, alert("web-3", 95))
+    assert near_duplicates.find(db, alert("web-3", 95, sender="it@lookalike.example.net"), SIGNATURE) is None
+
+
+def test_find_skips_sources_whose_action_items_name_other_values(db):
+    add_processed(db, alert("web-3", 95), tasks=["Restart web-3"])
+    fits = add_processed(db, alert("web-4", 97), tasks=["Acknowledge the alert"])
+    assert near_duplicates.find(db, alert("web-7", 91), SIGNATURE) is fits
+
+
+def test_find_loads_candidates_action_items_in_one_query(db):
+    for i in range(5):
+        add_processed(db, alert(f"web-{i}", 90 + i), tasks=[f"Restart server {700 + i}"])
+    db.expire_all()
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    # Every candidate's action items are checked, and none fit
+    assert near_duplicates.find(db, alert("web-9", 99), SIGNATURE) is None
+    assert len(statements) == 3  # bands, emails, action items
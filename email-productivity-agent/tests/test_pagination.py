@@ -0,0 +1,64 @@
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from backend.api.pagination import decode_cursor, encode_cursor, paginate
+from backend.database.models import Base, Email
+from datetime import datetime
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Seven emails, three of them without a timestamp, one sharing another's"""
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    timestamps = [datetime(2025, 3, 1), None, datetime(2025, 3, 3), None, datetime(2025, 3, 3),
+                  datetime(2025, 3, 2), None]
+    with engine.begin() as conn:
+        conn.execute(insert(Email), [
+            {"sender": "a@example.com", "recipient": "you@example.com", "subject": f"Note {i}", "body": "Hello",
+             "timestamp": timestamp, "message_id": f"<{i}@example.com>"} for i, timestamp in enumerate(timestamps)
+        ])
+    engine.dispose()
+    return path
+
+
+def walk(path, limit: int, fields=None):
+    """Every page from the first to the one without a next cursor"""
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        pages, cursor = [], None
+        try:
+            async with AsyncSession(engine) as db:
+                while True:
+                    response = Response()
+                    page = await paginate(db, select(Email), Email, Email.timestamp, response, cursor, limit, fields)
+                    pages.append([item["id"] if fields else item.id for item in page])
+                    cursor = response.headers.get("X-Next-Cursor")
+                    if cursor is None:
+                        return pages
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_cursor_round_trips_null_sort_values():
+    assert decode_cursor(encode_cursor(datetime(2025, 3, 1, 9, 30), 42)) == (datetime(2025, 3, 1, 9, 30), 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+    with pytest.raises(HTTPException):
+        decode_cursor("not a cursor")
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 10])
+def test_pages_cover_rows_without_a_sort_value(database, limit):
+    pages = walk(database, limit)
+    # Newest first, ties broken by id, NULL timestamps last on SQLite
+    assert [email_id for page in pages for email_id in page] == [5, 3, 6, 1, 7, 4, 2]
+    assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_pages_with_fields_use_the_same_cursor(database):
+    assert walk(database, 2, fields="id,subject") == [[5, 3], [6, 1], [7, 4], [2]]
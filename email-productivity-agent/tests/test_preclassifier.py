@@ -0,0 +1,40 @@
+from backend.config import settings
+from backend.database.models import Email
+from backend.services.preclassifier import PreClassifier
+import pytest
+
+
+@pytest.fixture
+def classify(monkeypatch):
+    monkeypatch.setattr(settings, "PRECLASSIFIER_ENABLED", True)
+    monkeypatch.setattr(settings, "PRECLASSIFIER_MODEL_ENABLED", False)
+    return PreClassifier().classify
+
+
+def email(sender="colleague@company.com", subject="", body="", headers=None) -> Email:
+    return Email(sender=sender, subject=subject, body=body, headers=headers)
+
+
+def test_noreply_security_alert_goes_to_the_llm(classify):
+    assert classify(email("no-reply@bank.com", "Suspicious sign-in",
+                          "We noticed a sign-in from a new device. If this wasn't you, secure your account.")) is None
+
+
+def test_urgent_request_from_a_colleague_is_not_spam(classify):
+    assert classify(email(subject="Acme contract", body="We need to act now on the Acme contract.")) is None
+
+
+def test_team_list_thread_is_not_a_newsletter(classify):
+    headers = {"List-Id": "<design.company.com>"}
+    assert classify(email(subject="Re: design review", body="Can you send comments by Friday?",
+                          headers=headers)) is None
+
+
+def test_bulk_headers_mark_newsletters(classify):
+    assert classify(email("news@shop.example", headers={"List-Unsubscribe": "<https://shop.example/u>"})) == "Newsletter"
+    assert classify(email("news@shop.example", headers={"Precedence": "bulk"})) == "Newsletter"
+
+
+def test_rules_still_match(classify):
+    assert classify(email("newsletter@company.com", "This week")) == "Newsletter"
+    assert classify(email("promo@deals.example", "Claim your prize", "You've won a free iPhone")) == "Spam"
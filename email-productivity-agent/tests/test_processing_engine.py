@@ -0,0 +1,109 @@
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from backend.config import settings
+from backend.database.models import Base, Email
+from backend.services.email_processor import email_processor
+from backend.services.llm_service import llm_service
+from backend.services.processing_engine import ProcessingEngine
+from backend.services.prompt_registry import PromptTemplate
+from datetime import datetime
+import asyncio
+import sqlite3
+import threading
+import time
+import pytest
+
+
+class Prompt:
+    version, name = 1, "test"
+
+    def __init__(self, id, type, content):
+        self.id, self.type, self.content = id, type, content
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Path of a SQLite database holding four unprocessed emails"""
+    for name, value in (("PRECLASSIFIER_ENABLED", False), ("EMBEDDING_ENABLED", False),
+                        ("NEAR_DUPLICATE_ENABLED", False), ("CATEGORIZATION_BATCH_SIZE", 2)):
+        monkeypatch.setattr(settings, name, value)
+    prompts = (PromptTemplate(Prompt(1, "categorization", "Categorize this email.")), None)
+    monkeypatch.setattr(email_processor, "get_active_prompts", lambda db: prompts)
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Email), [
+            {"sender": "a@example.com", "recipient": "you@example.com", "subject": f"Note {i}", "body": "Hello",
+             "timestamp": datetime(2025, 3, 1), "message_id": f"<{i}@example.com>"} for i in range(1, 5)
+        ])
+    engine.dispose()
+    return path
+
+
+async def run_engine(path, **options) -> int:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            emails = (await db.execute(select(Email).order_by(Email.id))).scalars().all()
+            return await ProcessingEngine(**options).run(emails, db)
+    finally:
+        await engine.dispose()
+
+
+def test_batch_results_apply_without_waiting_for_other_batches(database, monkeypatch):
+    slow_done = False
+
+    async def generate(prompt, **kwargs):
+        nonlocal slow_done
+        if "[Email id=3]" in prompt:
+            await asyncio.sleep(0.2)
+            slow_done = True
+            return '{"3": "Spam", "4": "Spam"}'
+        return '{"1": "Important", "2": "Important"}'
+
+    applied = []
+    apply_results = email_processor.apply_results
+
+    def record(email, category, *args, **kwargs):
+        applied.append((email.id, category, slow_done))
+        return apply_results(email, category, *args, **kwargs)
+
+    monkeypatch.setattr(llm_service, "generate", generate)
+    monkeypatch.setattr(email_processor, "apply_results", record)
+    assert asyncio.run(run_engine(database, concurrency=4)) == 4
+
+    assert sorted(applied) == [(1, "Important", False), (2, "Important", False), (3, "Spam", True), (4, "Spam", True)]
+
+
+def test_waiting_for_a_write_lock_does_not_block_the_event_loop(database, monkeypatch):
+    async def generate(prompt, **kwargs):
+        return '{"1": "Important", "2": "Important", "3": "Spam", "4": "Spam"}'
+
+    monkeypatch.setattr(llm_service, "generate", generate)
+    locked = threading.Event()
+
+    def hold_write_lock():
+        conn = sqlite3.connect(database)
+        conn.execute("BEGIN IMMEDIATE")
+        locked.set()
+        time.sleep(0.5)
+        conn.commit()
+        conn.close()
+
+    async def run():
+        holder = threading.Thread(target=hold_write_lock)
+        holder.start()
+        locked.wait()
+        processing = asyncio.ensure_future(run_engine(database))
+        longest, last = 0.0, time.perf_counter()
+        while not processing.done():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            longest, last = max(longest, now - last), now
+        holder.join()
+        return await processing, longest
+
+    processed, longest_stall = asyncio.run(run())
+    assert processed == 4
+    assert longest_stall < 0.2
@@ -0,0 +1,45 @@
+from backend.services.prompt_builder import clean_body, strip_signature
+
+
+def test_sign_off_followed_by_request_is_kept():
+    body = "Hi Sam,\n\nThanks!\n\nCould you send the signed contract by Friday?\nAlso book the room for Monday."
+    assert clean_body(body) == body
+
+
+def test_postscript_after_sign_off_is_kept():
+    body = "Hi,\n\nBest,\nP.S. please pay invoice 443 by Oct 30"
+    assert "invoice 443 by Oct 30" in clean_body(body)
+
+
+def test_sign_off_followed_by_sentence_is_kept():
+    body = "Hi,\n\nThanks,\nI also need the slides. Can you share them?"
+    assert strip_signature(body) == body
+
+
+def test_signature_block_after_sign_off_is_dropped():
+    body = ("Please review the draft.\n\nBest regards,\nJordan Lee\nSenior Account Manager | ACME Corp\n"
+            "+1 555 0100 | jordan@acme.example")
+    assert clean_body(body) == "Please review the draft."
+
+
+def test_trailing_sign_off_is_dropped():
+    assert strip_signature("Ship the release today.\n\nThanks!") == "Ship the release today."
+
+
+def test_rfc_3676_delimiter_drops_everything_below():
+    body = "Send it over.\n-- \nJordan\nThis line is part of the signature. Really?"
+    assert strip_signature(body) == "Send it over."
+
+
+def test_bare_double_dash_is_not_a_delimiter():
+    body = "Ship it\n--\nand then update the changelog"
+    assert strip_signature(body) == body
+
+
+def test_mobile_footer_is_dropped():
+    assert strip_signature("Can you call me?\n\nSent from my iPhone") == "Can you call me?"
+
+
+def test_mobile_footer_followed_by_text_is_kept():
+    body = "Quick note\nSent from my phone, sorry for typos.\nPlease approve the budget by Friday."
+    assert strip_signature(body) == body
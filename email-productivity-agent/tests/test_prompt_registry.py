@@ -0,0 +1,122 @@
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from backend.api.routes import prompts
+from backend.database.connection import get_db
+from backend.database.models import Base, Email, Prompt
+from backend.services.email_processor import email_processor
+from backend.services.prompt_registry import PromptRegistry, PromptTemplate
+import asyncio
+import httpx
+import pytest
+
+EMAIL = Email(sender="sam@example.com", recipient="you@example.com", subject="Q3 budget",
+              body="Can we review the budget on Friday?")
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Prompt(name="Categorize", type="categorization", content="Categorize this email.", is_active=True),
+        Prompt(name="Old categorize", type="categorization", content="Old prompt.", is_active=True),
+        Prompt(name="Actions", type="action_extraction", content="List tasks in {subject}: {body}", is_active=True),
+        Prompt(name="Reply", type="auto_reply", content="Draft a reply.", is_active=False),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def count_queries(session):
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_render_fills_only_known_placeholders():
+    template = PromptTemplate(Prompt(content='From {sender} to {recipient}: {subject}\n{body}\nReply as {"tasks": []} {other}'))
+
+    assert template.fields == {"sender", "recipient", "subject", "body"}
+    assert template.render(EMAIL, body="cleaned") == (
+        'From sam@example.com to you@example.com: Q3 budget\ncleaned\nReply as {"tasks": []} {other}'
+    )
+    assert template.render(Email(sender="sam@example.com")) == 'From sam@example.com to : \n\nReply as {"tasks": []} {other}'
+    assert template.instructions == "From"
+
+
+def test_template_without_placeholders_gets_the_email_appended():
+    plain = PromptTemplate(Prompt(content="Categorize this email."))
+    filled = PromptTemplate(Prompt(content="Categorize: {subject}"))
+
+    assert plain.render(EMAIL) == "Categorize this email."
+    prompt = email_processor._with_email(plain, EMAIL, "categorization")
+    assert prompt.startswith("Categorize this email.\n\nEmail Details:") and "Subject: Q3 budget" in prompt
+    assert email_processor._with_email(filled, EMAIL, "categorization") == "Categorize: Q3 budget"
+
+
+def test_registry_loads_active_prompts_once(db):
+    registry = PromptRegistry(ttl=3600)
+    statements = count_queries(db)
+
+    categorization, actions = registry.active_prompts(db)
+    assert registry.active(db, "auto_reply") is None
+    assert registry.active(db, "action_extraction") is actions
+
+    # The first active prompt of a type wins, and the whole set took one query
+    assert categorization.content == "Categorize this email."
+    assert actions.fields == {"subject", "body"}
+    assert len(statements) == 1
+
+
+def test_registry_reloads_after_invalidate_or_ttl(db):
+    registry = PromptRegistry(ttl=3600)
+    first = registry.active(db, "categorization")
+    db.query(Prompt).filter(Prompt.name == "Categorize").update({"content": "Sort this email."})
+    db.commit()
+
+    assert registry.active(db, "categorization") is first
+    registry.invalidate()
+    assert registry.active(db, "categorization").content == "Sort this email."
+
+    expiring = PromptRegistry(ttl=0)
+    statements = count_queries(db)
+    expiring.active(db, "categorization")
+    expiring.active(db, "categorization")
+    assert len(statements) == 2
+
+
+def test_prompt_routes_invalidate_the_registry(db, monkeypatch, tmp_path):
+    registry = PromptRegistry(ttl=3600)
+    monkeypatch.setattr(prompts, "prompt_registry", registry)
+    assert registry.active(db, "auto_reply") is None
+
+    async def run():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        sessions = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+        async def get_test_db():
+            async with sessions() as session:
+                yield session
+
+        app = FastAPI()
+        app.include_router(prompts.router, prefix="/api/prompts")
+        app.dependency_overrides[get_db] = get_test_db
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.put("/api/prompts/4", json={"is_active": True})
+                assert response.status_code == 200
+                active = registry.active(db, "auto_reply")
+                response = await client.delete("/api/prompts/4")
+                assert response.status_code == 200
+                return active
+        finally:
+            await async_engine.dispose()
+
+    active = asyncio.run(run())
+    assert active.content == "Draft a reply." and active.version == 2
+    assert registry.active(db, "auto_reply") is None
@@ -0,0 +1,22 @@
+from sqlalchemy import create_engine
+from backend.database.migrations import run_migrations
+from backend.database.models import Base
+from benchmarks.query_plans import QUERIES, check_plan, seed
+import pytest
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    seed(engine, 3000)
+    with engine.connect() as conn:
+        yield conn
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", list(QUERIES))
+def test_hot_lookup_uses_an_index(conn, name):
+    sql, details, problems = check_plan(conn, QUERIES[name])
+    assert not problems, f"{name}: {details}"
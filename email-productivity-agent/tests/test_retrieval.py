@@ -0,0 +1,32 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.database.models import Base, Email
+from backend.services.retrieval import EmailRetriever
+from datetime import datetime
+import pytest
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_body_downloaded_later_is_reindexed(db):
+    email = Email(sender="ops@example.com", recipient="you@example.com", subject="Quarterly numbers", body="",
+                  body_fetched=False, timestamp=datetime(2025, 3, 1), message_id="<1@example.com>")
+    db.add(email)
+    db.commit()
+    retriever = EmailRetriever()
+    assert retriever.search(db, "invoice overdue", 5) == []
+
+    email.body = "The invoice from the vendor is overdue, please pay it this week."
+    email.body_fetched = True
+    db.commit()
+    assert [email_id for email_id, _ in retriever.search(db, "invoice overdue", 5)] == [email.id]
+    assert [email_id for email_id, _ in retriever.search(db, "quarterly", 5)] == [email.id]
+    assert retriever._total_len == sum(retriever._doc_len.values())
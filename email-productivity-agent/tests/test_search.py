@@ -0,0 +1,86 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.database.migrations import run_migrations
+from backend.database.models import Base, Email
+from backend.services.search import build_match_query, fts_available, rank_email_ids, search_emails
+from datetime import datetime
+import pytest
+
+EMAILS = [
+    ("cfo@example.com", "Q3 budget review", "Please review the attached numbers before Friday."),
+    ("sam@example.com", "Lunch on Friday?", "Also, the budget spreadsheet is in the shared drive."),
+    ("news@example.com", "Weekly digest", "Top stories from engineering this week."),
+]
+
+
+def make_db(tmp_path, migrate: bool):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    if migrate:
+        run_migrations(engine)
+    db = sessionmaker(bind=engine)()
+    for i, (sender, subject, body) in enumerate(EMAILS):
+        db.add(Email(sender=sender, recipient="you@example.com", subject=subject, body=body,
+                     timestamp=datetime(2025, 3, 1 + i), message_id=f"<{i}@example.com>"))
+    db.commit()
+    return engine, db
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine, db = make_db(tmp_path, migrate=True)
+    yield db
+    db.close()
+    engine.dispose()
+
+
+def subjects(results):
+    return [result["subject"] for result in results]
+
+
+def test_match_query_quotes_terms_and_prefix_matches_the_last():
+    assert build_match_query('budget NEAR(q3) "review') == '"budget" "NEAR" "q3" "review"*'
+    assert build_match_query("budget review", match_any=True) == '"budget" OR "review"*'
+    assert build_match_query("-- *") == ""
+
+
+def test_subject_matches_rank_above_body_matches(db):
+    assert fts_available(db)
+    total, results = search_emails(db, "budget")
+    assert total == 2
+    assert subjects(results) == ["Q3 budget review", "Lunch on Friday?"]
+    assert "<mark>budget</mark>" in results[1]["snippet"]
+
+
+def test_partial_last_word_and_fts_syntax_in_input(db):
+    assert search_emails(db, "spreadsh")[0] == 1
+    for query in ['budget"', "budget AND", "NEAR(budget", "body:budget", "*", ""]:
+        search_emails(db, query)  # must not raise an FTS syntax error
+
+
+def test_index_follows_updates_and_deletes(db):
+    email = db.query(Email).filter(Email.subject == "Weekly digest").one()
+    email.body = "This week: the budget freeze explained."
+    db.commit()
+    assert search_emails(db, "freeze")[0] == 1
+
+    db.delete(email)
+    db.commit()
+    assert search_emails(db, "freeze")[0] == 0
+    assert search_emails(db, "budget")[0] == 2
+
+
+def test_rank_email_ids_matches_any_term(db):
+    ids = [email_id for email_id, _ in rank_email_ids(db, "budget digest", 10)]
+    assert sorted(ids) == [1, 2, 3]
+
+
+def test_like_fallback_without_the_fts_index(tmp_path):
+    engine, db = make_db(tmp_path, migrate=False)
+    assert not fts_available(db)
+    total, results = search_emails(db, "Friday budget", limit=1)
+    assert total == 2
+    # Newest first without ranking
+    assert subjects(results) == ["Lunch on Friday?"]
+    db.close()
+    engine.dispose()
@@ -0,0 +1,137 @@
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from backend.api.routes import drafts
+from backend.config import settings
+from backend.database.connection import get_db
+from backend.database.models import Base, Draft, Email
+from backend.services import llm_service as llm_service_module
+from backend.services import rate_limiter
+from backend.services.llm_service import LLMService
+from benchmarks.fake_llm_server import base_url, make_server
+from datetime import datetime
+import asyncio
+import httpx
+import json
+import pytest
+
+REPLY = '{"subject": "Re: Q3 budget", "body": "Friday works for me.\\nThanks, Alex"}'
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """Fake OpenAI and Groq providers, tried in that order, streaming REPLY word by word"""
+    servers = {name: make_server(latency=0.01, reply=REPLY) for name in ("openai", "groq")}
+    for name, server in servers.items():
+        monkeypatch.setattr(settings, f"{name.upper()}_API_KEY", "fake")
+        monkeypatch.setattr(settings, f"{name.upper()}_BASE_URL", base_url(server))
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", None)
+    monkeypatch.setattr(settings, "LLM_ROUTES", {name: ["openai:fake-model", "groq:fake-model"]
+                                                 for name in ("test", "draft")})
+    monkeypatch.setattr(settings, "LLM_RATE_LIMITS", {})
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    yield servers
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+
+
+def collect(prompt: str = "Reply to this email", **kwargs):
+    async def run():
+        service = LLMService()
+        try:
+            return [chunk async for chunk in service.stream(prompt, task="test", **kwargs)]
+        finally:
+            await service.aclose()
+
+    return asyncio.run(run())
+
+
+def test_stream_yields_the_completion_in_pieces(servers):
+    chunks = collect()
+    assert len(chunks) == len(REPLY.split(" "))
+    assert "".join(chunks).strip() == REPLY
+    assert servers["groq"].config["requests"] == 0
+
+
+def test_stream_falls_back_before_the_first_chunk(servers):
+    servers["openai"].config["error_rate"] = 1.0
+    assert "".join(collect()).strip() == REPLY
+    assert (servers["openai"].config["requests"], servers["groq"].config["requests"]) == (1, 1)
+
+
+def test_stream_reports_an_error_when_every_provider_fails(servers):
+    for server in servers.values():
+        server.config["error_rate"] = 1.0
+    [chunk] = collect()
+    assert chunk.startswith("Error calling LLM API")
+
+
+def test_streamed_completion_is_cached_whole(servers, monkeypatch, tmp_path):
+    from backend.services import llm_cache as llm_cache_module
+    from backend.services.llm_cache import LLMCache
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_service_module, "llm_cache", LLMCache(str(tmp_path / "cache.db"), 10, 10, 60))
+
+    first, second = collect(), collect()
+    assert second == ["".join(first)]
+    assert servers["openai"].config["requests"] == 1
+
+
+def parse_events(raw: str):
+    events = []
+    for block in raw.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_draft_stream_sends_decoded_fields_then_the_saved_draft(servers, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "EMBEDDING_ENABLED", False)
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Email(sender="sam@example.com", recipient="you@example.com", subject="Q3 budget",
+                 body="Can we review the budget on Friday?", timestamp=datetime(2025, 3, 1),
+                 message_id="<1@example.com>"))
+    db.commit()
+
+    async def run():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        sessions = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+        monkeypatch.setattr(drafts, "AsyncSessionLocal", sessions)
+        monkeypatch.setattr(llm_service_module, "llm_service", LLMService())
+
+        async def get_test_db():
+            async with sessions() as session:
+                yield session
+
+        app = FastAPI()
+        app.include_router(drafts.router, prefix="/api/drafts")
+        app.dependency_overrides[get_db] = get_test_db
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                response = await client.post("/api/drafts/generate/stream", params={"email_id": 1})
+                return response.headers["content-type"], response.text
+        finally:
+            await llm_service_module.llm_service.aclose()
+            await async_engine.dispose()
+
+    content_type, raw = asyncio.run(run())
+    events = parse_events(raw)
+
+    assert content_type.startswith("text/event-stream")
+    tokens = [data for event, data in events if event == "token"]
+    assert len(tokens) > 2
+    text = {field: "".join(data["text"] for data in tokens if data["field"] == field) for field in ("subject", "body")}
+    assert text == {"subject": "Re: Q3 budget", "body": "Friday works for me.\nThanks, Alex"}
+    event, data = events[-1]
+    assert event == "done" and data["draft"]["body"] == "Friday works for me.\nThanks, Alex"
+    assert db.query(Draft).one().subject == "Re: Q3 budget"
+    db.close()
+    engine.dispose()
@@ -0,0 +1,85 @@
+from backend.services.structured_output import EmailAnalysis, JSONStreamParser, parse_json, parse_model
+import json
+import pytest
+
+
+def feed_by_char(text: str):
+    """The parser after feeding `text` one character at a time, and every delta it returned"""
+    parser = JSONStreamParser()
+    deltas = []
+    for char in text:
+        deltas += parser.feed(char)
+    return parser, deltas
+
+
+def test_stream_parser_decodes_fields_fed_one_character_at_a_time():
+    reply = {"subject": "Re: Budget", "body": "Hi Sam,\n\nSounds \"good\" \\ see C:/tmp.\tThanks"}
+    parser, deltas = feed_by_char(json.dumps(reply))
+
+    assert parser.fields == reply
+    assert "".join(text for field, text in deltas if field == "body") == reply["body"]
+    assert parser.finished and json.loads(parser.text()) == reply
+
+
+@pytest.mark.parametrize("text", ["caf\u00e9 \u2014 ok", "launch \U0001F680 today", "\u00e9\U0001F600\u00e9"])
+def test_stream_parser_decodes_unicode_escapes_split_across_chunks(text):
+    # ensure_ascii writes \uXXXX escapes, and surrogate pairs for characters outside the BMP
+    raw = json.dumps({"body": text})
+    assert "\\u" in raw
+    assert feed_by_char(raw)[0].fields["body"] == text
+
+
+def test_stream_parser_only_reports_top_level_string_fields():
+    raw = json.dumps({"subject": "Hi", "meta": {"subject": "nested", "tags": ["a", "b"]},
+                      "count": 3, "items": [{"body": "no"}], "body": "yes"})
+    parser = JSONStreamParser()
+    deltas = parser.feed(raw)
+
+    assert {field: text for field, text in deltas} == {"subject": "Hi", "body": "yes"}
+    assert parser.fields == {"subject": "Hi", "meta": "", "count": "", "items": "", "body": "yes"}
+    assert parser.finished
+
+
+def test_stream_parser_skips_preamble_and_code_fences():
+    raw = 'Here is the draft:\n```json\n{"subject": "Re: Q3", "body": "Done."}\n```\nLet me know!'
+    parser = JSONStreamParser()
+    for i in range(0, len(raw), 7):
+        parser.feed(raw[i:i + 7])
+
+    assert parser.fields == {"subject": "Re: Q3", "body": "Done."}
+    assert parser.text() == '{"subject": "Re: Q3", "body": "Done."}'
+
+
+def test_stream_parser_waits_for_the_closing_brace():
+    parser = JSONStreamParser()
+    parser.feed('{"body": "half')
+    assert not parser.finished and parser.text() is None
+    assert not JSONStreamParser().feed("Error calling LLM API: 503") and not JSONStreamParser().started
+
+
+def test_parse_json_tolerates_fences_and_prose():
+    assert parse_json('```json\n{"category": "Spam"}\n```') == {"category": "Spam"}
+    assert parse_json('Sure! {"a": [1, 2]} hope that helps') == {"a": [1, 2]}
+    assert parse_json("no json here") is None
+
+
+@pytest.mark.parametrize("category, expected", [("Important", "Important"), ("to-do", "To-Do"),
+                                                ("Todo", "To-Do"), ("newsletter", "Newsletter")])
+def test_email_analysis_normalizes_known_categories(category, expected):
+    analysis = parse_model(EmailAnalysis, json.dumps({"category": category, "priority": "HIGH"}))
+    assert (analysis.category, analysis.priority) == (expected, "high")
+
+
+@pytest.mark.parametrize("category", ["Urgent", "", None, "Marketing"])
+def test_email_analysis_rejects_unknown_categories(category):
+    assert parse_model(EmailAnalysis, json.dumps({"category": category, "action_items": []})) is None
+
+
+def test_email_analysis_drops_placeholder_deadlines():
+    analysis = parse_model(EmailAnalysis, '{"category": "To-Do", "priority": "urgent", "action_items": '
+                                          '[{"task": "Send slides", "deadline": "N/A"}, '
+                                          '{"task": "Pay invoice", "deadline": "Friday"}]}')
+    assert analysis.priority is None
+    assert [(item.task, item.deadline) for item in analysis.action_items] == [
+        ("Send slides", None), ("Pay invoice", "Friday")
+    ]
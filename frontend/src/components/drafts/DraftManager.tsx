@@ -17,14 +17,17 @@ import {
 
 export function DraftManager() {
   const [drafts, setDrafts] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [deleteId, setDeleteId] = useState<number | null>(null);
 
   const fetchDrafts = async () => {
     setLoading(true);
     try {
-      const response = await getDrafts();
-      setDrafts(response || []);
+      const page = await getDrafts();
+      setDrafts(page.items);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error('Fetch drafts error:', error);
       toast({
@@ -33,11 +36,30 @@ export function DraftManager() {
         variant: 'destructive',
       });
       setDrafts([]);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMoreDrafts = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await getDrafts(nextCursor);
+      setDrafts((current) => [...current, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Fetch drafts error:', error);
+      toast({
+        title: 'Error',
+        description: 'Failed to load more drafts.',
+        variant: 'destructive',
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchDrafts();
   }, []);
@@ -109,6 +131,12 @@ export function DraftManager() {
               onDelete={(id) => setDeleteId(id)}
             />
           ))}
+          {nextCursor && (
+            <Button onClick={loadMoreDrafts} variant="outline" disabled={loadingMore}>
+              {loadingMore && <Loader2 className="w-4 h-4 animate-spin" />}
+              Load more drafts
+            </Button>
+          )}
         </div>
       ) : (
         <div className="bg-card rounded-xl p-12 shadow-card border border-border text-center">
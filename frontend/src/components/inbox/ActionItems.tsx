@@ -1,12 +1,15 @@
 import { CheckCircle2, Circle, Calendar, ListTodo } from 'lucide-react';
 import { ActionItem } from '@/types';
 import { cn } from '@/lib/utils';
+import { Button } from '@/components/ui/button';
 
 interface ActionItemsProps {
   items: ActionItem[];
+  onLoadMore?: () => void;
+  loadingMore?: boolean;
 }
 
-export function ActionItems({ items }: ActionItemsProps) {
+export function ActionItems({ items, onLoadMore, loadingMore }: ActionItemsProps) {
   if (items.length === 0) {
     return (
       <div className="bg-card rounded-xl p-8 shadow-card border border-border text-center">
@@ -23,7 +26,7 @@ export function ActionItems({ items }: ActionItemsProps) {
         <ListTodo className="w-5 h-5 text-primary" />
         <h3 className="font-semibold text-card-foreground">Action Items</h3>
         <span className="ml-auto bg-primary/10 text-primary text-xs font-medium px-2 py-1 rounded-full">
-          {items.length} items
+          {items.length}{onLoadMore ? '+' : ''} items
         </span>
       </div>
 
@@ -59,6 +62,12 @@ export function ActionItems({ items }: ActionItemsProps) {
           </div>
         ))}
       </div>
+
+      {onLoadMore && (
+        <Button variant="outline" size="sm" className="w-full mt-4" onClick={onLoadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading...' : 'Load more'}
+        </Button>
+      )}
     </div>
   );
 }
@@ -2,7 +2,7 @@ import { Mail, Clock, FileEdit, CheckCircle } from 'lucide-react';
 import { Email } from '@/types';
 import { cn } from '@/lib/utils';
 import { Button } from '@/components/ui/button';
-import { generateDraft, getDrafts } from '@/lib/api';
+import { generateDraft, emailHasDraft } from '@/lib/api';
 import { toast } from '@/hooks/use-toast';
 import { useState, useEffect } from 'react';
 
@@ -30,9 +30,7 @@ export function EmailCard({ email }: EmailCardProps) {
   useEffect(() => {
     const checkDraft = async () => {
       try {
-        const drafts = await getDrafts();
-        const exists = drafts.some((draft: any) => draft.email_id === email.id);
-        setHasDraft(exists);
+        setHasDraft(await emailHasDraft(email.id));
       } catch (error) {
         console.error('Check draft error:', error);
       }
@@ -11,7 +11,10 @@ import { toast } from '@/hooks/use-toast';
 export function InboxView() {
   const [emails, setEmails] = useState<Email[]>([]);
   const [actionItems, setActionItems] = useState<ActionItem[]>([]);
+  const [emailsCursor, setEmailsCursor] = useState<string | null>(null);
+  const [actionsCursor, setActionsCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState<'emails' | 'actions' | null>(null);
   const [processing, setProcessing] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
   const [priorityFilter, setPriorityFilter] = useState<string>('all');
@@ -23,8 +26,10 @@ export function InboxView() {
         getEmails(),
         getActionItems(),
       ]);
-      setEmails(emailsRes || []);
-      setActionItems(actionsRes || []);
+      setEmails(emailsRes.items);
+      setEmailsCursor(emailsRes.nextCursor);
+      setActionItems(actionsRes.items);
+      setActionsCursor(actionsRes.nextCursor);
     } catch (error) {
       console.error('Fetch error:', error);
       toast({
@@ -34,11 +39,50 @@ export function InboxView() {
       });
       setEmails([]);
       setActionItems([]);
+      setEmailsCursor(null);
+      setActionsCursor(null);
     } finally {
       setLoading(false);
     }
   };
 
+  // Pages are fetched on demand rather than walking the whole mailbox up front
+  const loadMoreEmails = async () => {
+    setLoadingMore('emails');
+    try {
+      const page = await getEmails(emailsCursor);
+      setEmails((current) => [...current, ...page.items]);
+      setEmailsCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Fetch error:', error);
+      toast({
+        title: 'Error',
+        description: 'Failed to load more emails.',
+        variant: 'destructive',
+      });
+    } finally {
+      setLoadingMore(null);
+    }
+  };
+
+  const loadMoreActionItems = async () => {
+    setLoadingMore('actions');
+    try {
+      const page = await getActionItems(actionsCursor);
+      setActionItems((current) => [...current, ...page.items]);
+      setActionsCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Fetch error:', error);
+      toast({
+        title: 'Error',
+        description: 'Failed to load more action items.',
+        variant: 'destructive',
+      });
+    } finally {
+      setLoadingMore(null);
+    }
+  };
+
   useEffect(() => {
     fetchData();
   }, []);
@@ -145,11 +189,26 @@ export function InboxView() {
                 </p>
               </div>
             )}
+            {emailsCursor && (
+              <Button
+                variant="outline"
+                className="w-full"
+                onClick={loadMoreEmails}
+                disabled={loadingMore === 'emails'}
+              >
+                {loadingMore === 'emails' && <Loader2 className="w-4 h-4 animate-spin" />}
+                Load more emails
+              </Button>
+            )}
           </div>
 
           {/* Action Items Sidebar */}
           <div className="lg:col-span-1">
-            <ActionItems items={actionItems} />
+            <ActionItems
+              items={actionItems}
+              onLoadMore={actionsCursor ? loadMoreActionItems : undefined}
+              loadingMore={loadingMore === 'actions'}
+            />
           </div>
         </div>
       )}
@@ -1,16 +1,37 @@
 const API_BASE_URL = 'https://mailflow-backend-yod9.onrender.com';
+const PAGE_SIZE = 50;
 
-// Email functions
-export const getEmails = async () => {
-  const response = await fetch(`${API_BASE_URL}/api/emails`);
-  return response.json();
-};
+// Columns the inbox list shows; the rest of an email (headers, sync state) stays on the server
+const EMAIL_LIST_FIELDS = 'id,sender,subject,body,priority,category,timestamp';
+const ACTION_ITEM_FIELDS = 'id,task,deadline,email_id,status';
 
-export const getActionItems = async () => {
-  const response = await fetch(`${API_BASE_URL}/api/emails/actions/all`);
-  return response.json();
+export interface Page<T = any> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+// List endpoints return one page at a time; pass nextCursor back to load the following one
+const getPage = async (path: string, cursor?: string | null, params: Record<string, string | number> = {}): Promise<Page> => {
+  const query = new URLSearchParams({ limit: String(PAGE_SIZE) });
+  Object.entries(params).forEach(([key, value]) => query.set(key, String(value)));
+  if (cursor) {
+    query.set('cursor', cursor);
+  }
+  const response = await fetch(`${API_BASE_URL}${path}?${query}`);
+  const page = await response.json();
+  if (!Array.isArray(page)) {
+    throw new Error(page?.detail || `Failed to load ${path}`);
+  }
+  return { items: page, nextCursor: response.headers.get('X-Next-Cursor') };
 };
 
+// Email functions
+export const getEmails = async (cursor?: string | null) =>
+  getPage('/api/emails', cursor, { fields: EMAIL_LIST_FIELDS });
+
+export const getActionItems = async (cursor?: string | null) =>
+  getPage('/api/emails/actions/all', cursor, { fields: ACTION_ITEM_FIELDS });
+
 export const processAllEmails = async () => {
   const response = await fetch(`${API_BASE_URL}/api/processing/process-all`, {
     method: 'POST'
@@ -59,9 +80,11 @@ export const sendChatMessage = async (query: string) => {
   return response.json();
 };
 // Draft functions
-export const getDrafts = async () => {
-  const response = await fetch(`${API_BASE_URL}/api/drafts`);
-  return response.json();
+export const getDrafts = async (cursor?: string | null) => getPage('/api/drafts', cursor);
+
+export const emailHasDraft = async (emailId: number | string) => {
+  const { items } = await getPage('/api/drafts', null, { email_id: emailId, limit: 1, fields: 'id' });
+  return items.length > 0;
 };
 
 export const getDraft = async (id: number) => {